@@ -0,0 +1,81 @@
+""" Regex validators benchmark
+
+Measures construction of ``Regex``/``Email`` validators with shared
+compiled patterns and validation of 10k values with separate
+``Regex`` validators and ``All`` combined matcher.
+
+  $ python benchmarks/regex.py
+"""
+import re
+import timeit
+
+import pform
+from pform.interfaces import _
+from pform.validator import check_validator
+
+COUNT = 10000
+
+PATTERNS = ('^[a-z0-9_]+$', '^.{3,30}$', '^[a-z]', '.*[0-9]$')
+EMAIL = r'(?i)^[A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,4}$'
+
+values = ['user%d' % i if i % 2 else 'User-%d!' % i for i in range(COUNT)]
+emails = ['user%d@example.com' % i if i % 2 else 'user%d' % i
+          for i in range(COUNT)]
+
+
+def construct_compile():
+    # compile pattern per validator instance
+    for i in range(COUNT):
+        pform.Regex(re.compile(PATTERNS[i % len(PATTERNS)]))
+        pform.Regex(re.compile(EMAIL), _('Invalid email address'))
+
+
+def construct_cached():
+    for i in range(COUNT):
+        pform.Regex(PATTERNS[i % len(PATTERNS)])
+        pform.Email()
+
+
+def separate(validators):
+    def run():
+        for value in values:
+            for validator in validators:
+                check_validator(validator, None, value)
+    return run
+
+
+def combined(validator):
+    def run():
+        for value in values:
+            validator.check(None, value)
+    return run
+
+
+def email(validator):
+    def run():
+        for value in emails:
+            validator.check(None, value)
+    return run
+
+
+def bench(func):
+    return min(timeit.repeat(func, number=1, repeat=3))
+
+
+def main():
+    validators = [pform.Regex(p) for p in PATTERNS]
+
+    print('%-32s %10s' % ('%d values' % COUNT, 'time'))
+    print('%-32s %9.3fs' % ('construct, compile per instance',
+                            bench(construct_compile)))
+    print('%-32s %9.3fs' % ('construct, shared patterns',
+                            bench(construct_cached)))
+    print('%-32s %9.3fs' % ('Email', bench(email(pform.Email()))))
+    print('%-32s %9.3fs' % ('%d separate Regex' % len(PATTERNS),
+                            bench(separate(validators))))
+    print('%-32s %9.3fs' % ('All(), combined matcher',
+                            bench(combined(pform.All(*validators)))))
+
+
+if __name__ == '__main__':
+    main()
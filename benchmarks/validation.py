@@ -0,0 +1,84 @@
+""" Fieldset validation benchmark
+
+Measures validation for 0%, 50% and 100% invalid submissions with
+non-exception ``check()`` protocol, exception based ``validate()``
+and full ``Fieldset.extract()``.
+
+  $ python benchmarks/validation.py
+"""
+import timeit
+from pyramid import testing
+
+import pform
+from pform.field import check_field
+
+NUMBER = 2000
+
+
+def make_fieldset():
+    return pform.Fieldset(
+        pform.TextField('name', validator=pform.Length(min=3, max=30)),
+        pform.TextField('email', validator=pform.Email()),
+        pform.IntegerField('age', validator=pform.Range(min=18, max=120)),
+        pform.TextField('lang', validator=pform.OneOf(('en', 'de', 'ru'))),
+        pform.TextField('nick', validator=pform.All(
+            pform.Length(min=3), pform.Regex('^[a-z]+$'))),
+    )
+
+
+valid = {'name': 'Nikolay', 'email': 'fafhrd@example.com',
+         'age': 35, 'lang': 'en', 'nick': 'fafhrd'}
+invalid = {'name': 'N', 'email': 'fafhrd',
+           'age': 5, 'lang': 'xx', 'nick': 'F!'}
+
+
+def check(fieldset, data):
+    for field in fieldset.fields():
+        check_field(field, data[field.name])
+
+
+def validate(fieldset, data):
+    for field in fieldset.fields():
+        try:
+            field.validate(data[field.name])
+        except pform.Invalid:
+            pass
+
+
+def extract(fieldset, data):
+    fieldset.extract()
+
+
+def run(func, ratio, request):
+    count = int(10 * ratio)
+    submissions = [invalid] * count + [valid] * (10 - count)
+    bound = [(make_fieldset().bind(
+        request, params=dict((k, str(v)) for k, v in data.items())), data)
+             for data in submissions]
+
+    def bench():
+        for fieldset, data in bound:
+            func(fieldset, data)
+
+    return min(timeit.repeat(bench, number=NUMBER // 10, repeat=3))
+
+
+def main():
+    config = testing.setUp()
+    config.include('pform')
+    request = testing.DummyRequest()
+
+    print('%-10s %12s %12s %12s' % (
+        'invalid', 'check()', 'validate()', 'extract()'))
+    for ratio in (0.0, 0.5, 1.0):
+        print('%-10s %11.3fs %11.3fs %11.3fs' % (
+            '%d%%' % (ratio * 100),
+            run(check, ratio, request),
+            run(validate, ratio, request),
+            run(extract, ratio, request)))
+
+    testing.tearDown()
+
+
+if __name__ == '__main__':
+    main()
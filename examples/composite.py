@@ -14,6 +14,21 @@ with open(os.path.join(os.path.split(__file__)[0], 'countries.txt'), 'r') as f:
                  key=lambda item: item[1])])
 
 
+# states vocabulary provider for dependent choice field
+states = {
+    'US': (('TX', 'TX', 'Texas'),
+           ('CA', 'CA', 'California'),
+           ('NY', 'NY', 'New York')),
+    'CA': (('ON', 'ON', 'Ontario'),
+           ('QC', 'QC', 'Quebec')),
+}
+
+
+def states_provider(country):
+    # state is required, countries without listed states get one term
+    return states.get(country, (('other', 'other', 'Other'),))
+
+
 # custom composit field
 
 class AddressField(pform.CompositeField):
@@ -32,9 +47,10 @@ class AddressField(pform.CompositeField):
         pform.TextField(
             'city',
             title='City'),
-        pform.TextField(
+        pform.DependentChoiceField(
             'state',
-            title='State', required=True),
+            title='State', required=True,
+            parent='country', voc_provider=states_provider),
         pform.TextField(
             'zip', title='Zip', required=True)
     )
@@ -100,6 +116,8 @@ if __name__ == '__main__':
     config.add_route('root', '/')
 
     config.include('pform')
+    config.include('pform.views')
+    config.provide_form('address', MyForm)
     config.scan(__name__)
 
     wsgiref_server_runner(config.make_wsgi_app(), {})
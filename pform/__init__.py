@@ -4,10 +4,11 @@ __all__ = [
     'null', 'Invalid', 'FieldsetErrors',
     'Field', 'FieldFactory', 'Fieldset',
     'field', 'fieldpreview', 'get_field_factory', 'get_field_preview',
+    'get_form_factory',
 
-    'Term', 'Vocabulary',
+    'Term', 'Vocabulary', 'LRUCache', 'FileStore',
 
-    'All','Function','Regex','Email','Range', 'Length','OneOf',
+    'All','Function','Regex','Email','Range', 'Length','OneOf','Memoize',
 
     'CompositeField', 'CompositeError',
 
@@ -18,6 +19,7 @@ __all__ = [
     'DecimalField','TextAreaField','FileField','LinesField','PasswordField',
     'DateField','DateTimeField','RadioField','BoolField','ChoiceField',
     'MultiChoiceField','MultiSelectField','TimezoneField',
+    'DependentChoiceField',
 
     'Form','FormWidgets',
     'button','button2','Button','Buttons',
@@ -54,11 +56,18 @@ from pform.directives import field
 from pform.directives import fieldpreview
 from pform.directives import get_field_factory
 from pform.directives import get_field_preview
+from pform.directives import get_form_factory
 
 # vocabulary
 from pform.vocabulary import Term
 from pform.vocabulary import Vocabulary
 
+# cache
+from pform.cache import LRUCache
+
+# file storage
+from pform.storage import FileStore
+
 # validators
 from pform.validator import All
 from pform.validator import Function
@@ -67,6 +76,7 @@ from pform.validator import Email
 from pform.validator import Range
 from pform.validator import Length
 from pform.validator import OneOf
+from pform.validator import Memoize
 
 # helper class
 from pform.field import InputField
@@ -93,6 +103,7 @@ from pform.fields import ChoiceField
 from pform.fields import MultiChoiceField
 from pform.fields import MultiSelectField
 from pform.fields import TimezoneField
+from pform.fields import DependentChoiceField
 from pform.fields import OptionsField
 
 # composite fields
@@ -127,6 +138,10 @@ def includeme(cfg):
     from pform.directives import add_field
     cfg.add_directive('provide_form_field', add_field)
 
+    # form
+    from pform.directives import add_form
+    cfg.add_directive('provide_form', add_form)
+
     # layers
     cfg.add_layer('form', path='pform:templates/')
 
@@ -0,0 +1,121 @@
+""" Simple thread-safe cache """
+import time
+import threading
+from collections import OrderedDict
+
+_marker = object()
+
+
+class LRUCache(object):
+    """ Bounded least-recently-used cache with optional time-to-live.
+
+    ``maxsize``: Maximum number of entries, ``None`` means unbounded.
+
+    ``ttl``: Entry time-to-live in seconds, ``None`` means entries
+      never expire.
+
+    ``hits``, ``misses``: Lookup counters, see :py:meth:`stats`.
+
+    .. code-block:: python
+
+      cache = LRUCache(maxsize=100, ttl=300)
+
+      value = cache.get_or_create('key', expensive_function)
+    """
+
+    def __init__(self, maxsize=128, ttl=None, timer=time.time):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+
+        self.hits = 0
+        self.misses = 0
+
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key, default=None):
+        """ Return cached value for ``key`` or ``default`` """
+        with self._lock:
+            try:
+                expires, value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+
+            if expires is not None and expires <= self.timer():
+                self.misses += 1
+                return default
+
+            # move to the end of queue
+            self._data[key] = (expires, value)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """ Store ``value`` for ``key`` """
+        expires = self.timer() + self.ttl if self.ttl is not None else None
+
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (expires, value)
+
+            if self.maxsize is not None:
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+
+    def get_or_create(self, key, creator):
+        """ Return cached value for ``key``, call ``creator`` on cache miss
+        and cache its result """
+        value = self.get(key, _marker)
+        if value is _marker:
+            value = creator()
+            self.set(key, value)
+
+        return value
+
+    def invalidate(self, *keys):
+        """ Drop cached entries for ``keys``, drop all entries
+        if keys are not specified """
+        with self._lock:
+            if not keys:
+                self._data.clear()
+            for key in keys:
+                self._data.pop(key, None)
+
+    clear = invalidate
+
+    def stats(self):
+        """ Return cache statistics """
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'size': len(self._data),
+                    'maxsize': self.maxsize}
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return 'LRUCache<hits=%s misses=%s size=%s>' % (
+            self.hits, self.misses, len(self._data))
+
+
+def request_cache(request, name, factory=dict):
+    """ Return per-request storage ``name``, storage is created
+    with ``factory`` on first access. Return ``None`` if request can not
+    hold storage. """
+    try:
+        storages = request._pform_cache
+    except AttributeError:
+        storages = {}
+        try:
+            request._pform_cache = storages
+        except AttributeError:
+            return None
+
+    storage = storages.get(name)
+    if storage is None:
+        storage = storages[name] = factory()
+
+    return storage
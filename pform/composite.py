@@ -3,8 +3,9 @@ import copy
 import pprint
 from pyramid.decorator import reify
 
-from pform.field import Field
+from pform.field import Field, check_field
 from pform.fieldset import Fieldset
+from pform.validator import Pending, check_validator
 from pform.interfaces import null, Invalid
 
 
@@ -71,6 +72,10 @@ class CompositeField(Field):
         for field in self.fields.values():
             field.update()
 
+    def is_changed(self, value=None):
+        """ Check if any subfield is changed """
+        return any(field.is_changed() for field in self.fields.values())
+
     def to_field(self, value):
         """ convert form value to field value """
         result = {}
@@ -93,27 +98,47 @@ class CompositeField(Field):
 
         return result
 
-    def validate(self, value):
-        """ validate value """
+    def check(self, value):
+        """ validate value, return error or ``None`` """
         errors = []
+        pendings = []
         for name, val in value.items():
             field = self.fields[name]
-            try:
-                field.validate(val)
-            except Invalid as error:
-                error.name = name
+            error = check_field(field, val)
+            if isinstance(error, Pending):
+                pendings.append(Pending.combine(
+                    [error], self._suberror_finish(name, field)))
+            elif error is not None:
+                self._set_suberror(name, field, error)
                 errors.append(error)
-                if field.error is None:
-                    field.error = error
 
+        if pendings:
+            return Pending.combine(
+                pendings, lambda errors: self._finish(errors, value), errors)
+
+        return self._finish(errors, value)
+
+    def _set_suberror(self, name, field, error):
+        error.name = name
+        if field.error is None:
+            field.error = error
+
+    def _suberror_finish(self, name, field):
+        def finish(errors):
+            for error in errors:
+                self._set_suberror(name, field, error)
+            return errors[0] if errors else None
+        return finish
+
+    def _finish(self, errors, value):
         if errors:
             if self.consolidate_errors:
-                raise CompositeError(errors[0].msg, field=self)
+                return CompositeError(errors[0].msg, field=self)
             else:
-                raise CompositeError(field=self, errors=errors)
+                return CompositeError(field=self, errors=errors)
 
         if self.validator is not None:
-            self.validator(self, value)
+            return check_validator(self.validator, self, value)
 
     def extract(self):
         value = {}
@@ -0,0 +1,282 @@
+""" Concurrent execution helpers """
+import threading
+from pyramid.threadlocal import manager
+
+try:
+    from concurrent.futures import Future, ThreadPoolExecutor
+except ImportError: # pragma: no cover
+    Future = ThreadPoolExecutor = None
+
+try:
+    import asyncio
+except ImportError: # pragma: no cover
+    asyncio = None
+
+MAX_WORKERS = 8
+
+# default number of blocking calls of one form running at a time
+MAX_CONCURRENCY = 4
+
+_executor = None
+_executor_lock = threading.Lock()
+_local = threading.local()
+
+
+def get_executor():
+    """ Return shared thread pool executor. Return ``None`` if
+    ``concurrent.futures`` is not available. """
+    global _executor
+
+    if _executor is None and ThreadPoolExecutor is not None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+
+    return _executor
+
+
+def set_executor(executor):
+    """ Replace shared thread pool executor """
+    global _executor
+    _executor = executor
+
+
+def with_threadlocals(func):
+    """ Return wrapper of ``func`` that runs it with pyramid
+    threadlocals of calling thread, i.e. on thread pool worker,
+    so ``get_current_request()`` works in worker thread """
+    info = manager.get()
+
+    def wrapper():
+        manager.push(info)
+        try:
+            return func()
+        finally:
+            manager.pop()
+
+    return wrapper
+
+
+def iscoroutine(ob):
+    return asyncio is not None and asyncio.iscoroutine(ob)
+
+
+def run_coroutines(coros):
+    """ Run coroutines concurrently on event loop in worker thread.
+    Return list of results, exceptions are returned as results. """
+    result = []
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            result.extend(loop.run_until_complete(
+                asyncio.gather(*coros, return_exceptions=True)))
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+    # caller thread could have running event loop
+    thread = threading.Thread(target=with_threadlocals(run))
+    thread.start()
+    thread.join()
+    return result
+
+
+class Blocking(object):
+    """ Blocking call, it is executed on thread pool """
+
+    def __init__(self, func):
+        self.func = func
+
+
+class LimitedExecutor(object):
+    """ Executor wrapper, submits at most ``limit`` calls to
+    ``executor`` at a time, other calls are queued. Used for limiting
+    number of shared thread pool workers used by one form. """
+
+    def __init__(self, executor, limit):
+        self.executor = executor
+        self.limit = limit
+
+        self.running = 0
+        self.queue = []
+        self._lock = threading.Lock()
+
+    def submit(self, func):
+        func = with_threadlocals(func)
+        future = Future()
+
+        with self._lock:
+            if self.running < self.limit:
+                self.running += 1
+            else:
+                self.queue.append((func, future))
+                return future
+
+        self._start(func, future)
+        return future
+
+    def _start(self, func, future):
+        def done(inner):
+            if inner.exception() is not None:
+                future.set_exception(inner.exception())
+            else:
+                future.set_result(inner.result())
+
+            with self._lock:
+                if self.queue:
+                    item = self.queue.pop(0)
+                else:
+                    item = None
+                    self.running -= 1
+
+            if item is not None:
+                self._start(*item)
+
+        self.executor.submit(func).add_done_callback(done)
+
+
+def get_limited_executor(executor=None, limit=None):
+    """ Return :py:class:`LimitedExecutor` for ``executor`` or shared
+    executor, return ``None`` if thread pool is not available """
+    executor = executor or get_executor()
+    if executor is None:
+        return None
+
+    return LimitedExecutor(executor, limit or MAX_CONCURRENCY)
+
+
+def run_tasks(tasks, executor=None):
+    """ Run coroutines and :py:class:`Blocking` calls concurrently,
+    blocking calls are submitted to ``executor``. Return list of
+    results, exceptions are returned as results. """
+    if executor is None:
+        executor = get_limited_executor()
+
+    futures = {}
+    results = [None] * len(tasks)
+    for idx, task in enumerate(tasks):
+        if isinstance(task, Blocking):
+            if executor is None:
+                try:
+                    results[idx] = task.func()
+                except Exception as e:
+                    results[idx] = e
+            else:
+                futures[idx] = executor.submit(task.func)
+
+    coros = [(idx, task) for idx, task in enumerate(tasks)
+             if not isinstance(task, Blocking)]
+    if coros:
+        for (idx, coro), value in zip(
+                coros, run_coroutines([coro for idx, coro in coros])):
+            results[idx] = value
+
+    for idx, future in futures.items():
+        try:
+            results[idx] = future.result()
+        except Exception as e:
+            results[idx] = e
+
+    return results
+
+
+def wrap_task(task, loop, executor=None):
+    """ Return asyncio future for coroutine or :py:class:`Blocking`
+    call """
+    if isinstance(task, Blocking):
+        if executor is None:
+            executor = get_limited_executor()
+        if executor is None:
+            future = loop.create_future()
+            try:
+                future.set_result(task.func())
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        return asyncio.wrap_future(executor.submit(task.func), loop=loop)
+
+    return asyncio.ensure_future(task, loop=loop)
+
+
+def current():
+    """ Return active :py:class:`Deferred` or ``None`` """
+    stack = getattr(_local, 'stack', None)
+    if stack:
+        return stack[-1]
+
+
+class Deferred(object):
+    """ Collects calls and runs them concurrently on exit from
+    ``with`` block. Each call result is passed to its callback,
+    coroutine results are awaited on one event loop. Calls run with
+    pyramid threadlocals of thread that runs deferred.
+
+    ``executor``: ``concurrent.futures`` executor, shared executor
+      is used by default.
+
+    .. code-block:: python
+
+      with Deferred() as deferred:
+          deferred.add(load_countries, set_countries)
+          deferred.add(load_currencies, set_currencies)
+    """
+
+    def __init__(self, executor=None):
+        self.executor = executor
+        self.calls = []
+
+    def add(self, func, callback, key=None):
+        """ Add call, ``callback`` receives result of ``func()``.
+        Calls with same ``key`` are executed once, result is passed
+        to callbacks of all these calls. """
+        self.calls.append((func, callback, key))
+
+    def run(self):
+        calls, self.calls = self.calls, []
+
+        funcs = []
+        indexes = []
+        keys = {}
+        for func, cb, key in calls:
+            if key is None or key not in keys:
+                if key is not None:
+                    keys[key] = len(funcs)
+                indexes.append(len(funcs))
+                funcs.append(func)
+            else:
+                indexes.append(keys[key])
+
+        executor = self.executor or get_executor()
+        if executor is None or len(funcs) < 2:
+            results = [func() for func in funcs]
+        else:
+            results = [f.result() for f in
+                       [executor.submit(with_threadlocals(func))
+                        for func in funcs]]
+
+        coros = [(idx, res) for idx, res in enumerate(results)
+                 if iscoroutine(res)]
+        if coros:
+            values = run_coroutines([coro for idx, coro in coros])
+            for (idx, coro), value in zip(coros, values):
+                if isinstance(value, BaseException):
+                    raise value
+                results[idx] = value
+
+        for (func, callback, key), idx in zip(calls, indexes):
+            callback(results[idx])
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        stack.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        _local.stack.pop()
+        if exc_type is None:
+            self.run()
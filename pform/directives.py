@@ -6,6 +6,7 @@ from pyramid.registry import Introspectable
 
 ID_FIELD = 'pform:field'
 ID_PREVIEW = 'pform:field-preview'
+ID_FORM = 'pform:form'
 
 
 def add_field(cfg, name, cls):
@@ -107,6 +108,34 @@ class fieldpreview(object):
         return wrapped
 
 
+def add_form(cfg, name, factory):
+    """ Form registration directive. Registered forms are available
+    for pform endpoints (i.e. partial field rendering).
+
+    .. code-block:: python
+
+      config = Configurator(...)
+      config.include('pform')
+
+      config.provide_form('address', AddressForm)
+
+    """
+    discr = (ID_FORM, name)
+
+    intr = Introspectable(ID_FORM, discr, name, 'pform-form')
+    intr['name'] = name
+    intr['form'] = factory
+
+    def action():
+        storage = cfg.registry.get(ID_FORM)
+        if storage is None:
+            storage = cfg.registry[ID_FORM] = {}
+
+        storage[name] = factory
+
+    cfg.action(discr, action, introspectables=(intr,))
+
+
 def get_field_factory(request, name):
     """Return field factory by name."""
     return request.registry[ID_FIELD][name]
@@ -115,3 +144,8 @@ def get_field_factory(request, name):
 def get_field_preview(request, cls):
     """Return field preview factory for field class."""
     return request.registry[ID_PREVIEW][cls]
+
+
+def get_form_factory(request, name):
+    """Return form factory by name."""
+    return request.registry[ID_FORM][name]
@@ -2,9 +2,12 @@ import logging
 from collections import OrderedDict
 from player import render
 from pform.interfaces import _, null, Invalid
+from pform.validator import overrides, check_validator, resolve
 
 log = logging.getLogger('pform')
 
+_marker = object()
+
 
 class _Field(object):
     """Base class for all fields.
@@ -38,6 +41,15 @@ class _Field(object):
 
     ``tmpl_widget``: Widget renderer.
 
+    ``fieldset``: Bound fieldset that contains this field.
+
+    ``bound_form_value``: Form representation of bound value,
+      see :py:meth:`get_bound_form_value`.
+
+    ``omit_empty``: Widget does not submit param for empty value,
+      i.e. checkboxes. Missing param is cleared value for
+      :py:meth:`is_changed`.
+
     """
 
     __field__ = ''
@@ -63,7 +75,10 @@ class _Field(object):
     params = {}
     value = null
     form_value = None
+    bound_form_value = _marker
+    omit_empty = False
     context = None
+    fieldset = None
 
     id = None
     typ = None
@@ -101,6 +116,15 @@ class _Field(object):
             self.form_value = widget_value
             return
 
+        self.form_value = self.get_bound_form_value()
+
+    def get_bound_form_value(self):
+        """ Return form representation of bound value or default,
+        it is computed once """
+        value = self.bound_form_value
+        if value is not _marker:
+            return value
+
         # get from value
         if self.value is null:
             value = self.default
@@ -115,7 +139,21 @@ class _Field(object):
                 value = null
                 log.error("Field(%s): %s", self.name, err)
 
-        self.form_value = value if value is not null else None
+        value = self.bound_form_value = value if value is not null else None
+        return value
+
+    def is_changed(self, value=_marker):
+        """ Check if submitted ``value`` differs from bound value,
+        field without submitted value is not changed unless widget
+        omits empty value (``omit_empty``) """
+        if value is _marker:
+            value = self.extract()
+        if value is null:
+            if not self.omit_empty:
+                return False
+            value = None
+
+        return (value or None) != (self.get_bound_form_value() or None)
 
     def to_form(self, value):
         """ return value representation siutable for html widget """
@@ -132,16 +170,30 @@ class _Field(object):
         if self.error is not None:
             return self.error.get(name)
 
-    def validate(self, value):
-        """ validate value """
+    def check_required(self, value):
+        """ check required value, return :py:class:`pform.Invalid`
+        error or ``None`` """
         if self.required and (value == self.missing or value is null):
-            raise Invalid(self.error_required, self)
+            return Invalid(self.error_required, self)
+
+    def check(self, value):
+        """ validate value, return :py:class:`pform.Invalid` error
+        or ``None`` """
+        error = self.check_required(value)
+        if error is not None:
+            return error
 
         if self.typ is not None and not isinstance(value, self.typ):
-            raise Invalid(self.error_wrong_type, self)
+            return Invalid(self.error_wrong_type, self)
 
         if self.validator is not None:
-            self.validator(self, value)
+            return check_validator(self.validator, self, value)
+
+    def validate(self, value):
+        """ validate value, raise :py:class:`pform.Invalid` error """
+        error = resolve(self.check(value))
+        if error is not None:
+            raise error
 
     def extract(self):
         """ extract value from params """
@@ -166,6 +218,24 @@ class _Field(object):
         return '%s<%s>' % (self.__class__.__name__, self.name)
 
 
+def check_field(field, value):
+    """ Validate value of field or fieldset, return
+    :py:class:`pform.Invalid` error or ``None``. Objects that override
+    ``validate()`` without ``check()`` are validated with ``validate()``.
+    """
+    override = getattr(field, '__validate_override__', None)
+    if override is None:
+        override = overrides(type(field), 'validate', 'check')
+
+    if override:
+        try:
+            field.validate(value)
+        except Invalid as error:
+            return error
+    else:
+        return field.check(value)
+
+
 # Field metaclass
 def _stub_init(self, **kw):
     self.__dict__.update(kw)
@@ -183,6 +253,7 @@ class _FieldMeta(type):
         field.cls = type(cls.__name__, (cls,), field.__dict__)
         field.cls.__init__ = _stub_init
         field.cls.bind = _stub_bind
+        field.cls.__validate_override__ = overrides(cls, 'validate', 'check')
 
         for name in field.__staticfuncs__:
             val = getattr(field, name, None)
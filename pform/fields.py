@@ -3,10 +3,17 @@ import pytz
 import inspect
 import datetime
 import decimal
-from pyramid.compat import NativeIO, text_type, PY3
+import numbers
+from pyramid.compat import NativeIO, string_types, text_type, PY3
 
 from pform import iso8601
 from pform import vocabulary
+from pform import storage
+from pform import concurrency
+from pform.cache import LRUCache
+from pform.validator import Pending
+from pform.sniff import sniff_mimetype, resolve_mimetype
+from pform.upload import get_upload_staging
 from pform.field import InputField
 from pform.fieldset import Fieldset
 from pform.directives import field
@@ -31,30 +38,66 @@ def takes_one_arg(fn, name):
 def voc_factory_mapper(factory):
 
     if takes_one_arg(factory, 'request'):
-        def _wrapper_request(form):
-            return factory(getattr(form, 'request', None))
-        return _wrapper_request
+        def _argument(form):
+            return getattr(form, 'request', None)
 
     elif takes_one_arg(factory, 'context'):
-        def _wrapper_context(form):
-            return factory(getattr(form, 'context', None))
-        return _wrapper_context
+        def _argument(form):
+            return getattr(form, 'context', None)
 
     elif takes_one_arg(factory, 'content'):
-        def _wrapper_content(form):
-            return factory(getattr(form, 'content', None))
-        return _wrapper_content
+        def _argument(form):
+            return getattr(form, 'content', None)
 
     else:
-        def _wrapper(form):
-            return factory(form)
-        return _wrapper
+        def _argument(form):
+            return form
+
+    def _wrapper(form):
+        return factory(_argument(form))
+
+    _wrapper.factory = factory
+    _wrapper.argument = _argument
+    return _wrapper
 
 
 class VocabularyField(InputField):
+    """ Base class for vocabulary based fields
+
+    ``vocabulary``: Vocabulary instance or sequence of vocabulary items.
+
+    ``voc_factory``: Vocabulary factory, called during field binding.
+      Factory is resolved concurrently with other fields factories if
+      fieldset is bound in concurrent mode, coroutine factories
+      are supported in this mode. Fields that share cached vocabulary
+      call factory once.
+
+    ``voc_cache``: Cache for ``voc_factory`` results. It can be
+      :py:class:`pform.LRUCache` instance (per-process cache) or
+      ``'request'``, in this case vocabulary is resolved with request
+      :py:class:`pform.vocabulary.VocabularyRegistry` and shared with
+      all fields that use same factory with same argument.
+      By default vocabulary factory is called on each bind.
+
+    ``voc_cache_key``: Function that returns cache key for vocabulary,
+      i.e. tenant id. It accepts same argument as ``voc_factory``.
+      It is not used for per-request cache.
+
+    ``sort_items``: Sort items by translated term title.
+
+    ``sort_key``: Sort key function for translated titles.
+    """
+
+    __staticfuncs__ = InputField.__staticfuncs__ + (
+        'voc_factory', 'voc_cache_key', 'sort_key')
 
     vocabulary = None
     voc_factory = None
+    voc_cache = None
+    voc_cache_key = None
+
+    sort_items = False
+    sort_key = None
 
     no_value_token = '--NOVALUE--'
 
@@ -75,24 +118,115 @@ class VocabularyField(InputField):
         if self.voc_factory is not None:
             self.voc_factory = voc_factory_mapper(self.voc_factory)
 
+        if self.voc_cache_key is not None:
+            self.voc_cache_key = voc_factory_mapper(self.voc_cache_key)
+
     def bind(self, request, prefix, value, params, context=None):
         clone = super(VocabularyField, self).bind(
             request, prefix, value, params, context)
 
         if clone.vocabulary is None:
-            clone.vocabulary = self.voc_factory(context)
+            deferred = concurrency.current()
+            if deferred is not None:
+                self.defer_vocabulary(deferred, clone, request, context)
+            else:
+                clone.vocabulary = self.get_vocabulary(request, context)
 
         return clone
 
+    def defer_vocabulary(self, deferred, clone, request, context):
+        """ Add vocabulary factory call to ``deferred``. Factory is
+        called once for fields that share cached vocabulary, vocabulary
+        is cached after coroutine result is awaited. """
+        cache = self.get_voc_cache(request)
+        if cache is None:
+            deferred.add(lambda: self.voc_factory(context),
+                         lambda voc: setattr(clone, 'vocabulary', voc))
+            return
+
+        if self.voc_cache == 'request':
+            factory = self.voc_factory.factory
+            arg = self.voc_factory.argument(context)
+            key = cache.key(factory, arg)
+            voc = cache.lookup(factory, arg)
+            store = lambda voc: cache.register(factory, voc, arg)
+        else:
+            key = self.voc_cache_id(
+                self.voc_cache_key(context)
+                if self.voc_cache_key is not None else None)
+            voc = cache.get(key)
+            store = lambda voc: cache.set(key, voc)
+
+        if voc is not None:
+            clone.vocabulary = voc
+            return
+
+        def callback(voc):
+            store(voc)
+            clone.vocabulary = voc
+
+        deferred.add(lambda: self.voc_factory(context), callback,
+                     (id(cache), key))
+
+    def get_voc_cache(self, request):
+        """ Return vocabulary cache """
+        if self.voc_cache == 'request':
+            return vocabulary.get_vocabulary_registry(request)
+
+        return self.voc_cache
+
+    def get_vocabulary(self, request, context):
+        """ Create vocabulary with vocabulary factory """
+        cache = self.get_voc_cache(request)
+        if cache is None:
+            return self.voc_factory(context)
+
+        if self.voc_cache == 'request':
+            return cache.resolve(self.voc_factory.factory,
+                                 self.voc_factory.argument(context))
+
+        key = None
+        if self.voc_cache_key is not None:
+            key = self.voc_cache_key(context)
+
+        return cache.get_or_create(
+            self.voc_cache_id(key), lambda: self.voc_factory(context))
+
+    def voc_cache_id(self, key):
+        """ Return per-process cache key, it includes factory, cache
+        could be shared between fields with same name """
+        return (self.name.split('.')[-1], self.voc_factory.factory, key)
+
+    def invalidate_vocabulary(self, *keys):
+        """ Drop cached vocabularies for cache ``keys``,
+        clear vocabulary cache if keys are not specified """
+        cache = self.get_voc_cache(self.request)
+        if cache is None:
+            return
+
+        if self.voc_cache == 'request':
+            cache.forget(self.voc_factory.factory)
+        elif not keys:
+            cache.clear()
+        else:
+            cache.invalidate(*[self.voc_cache_id(key) for key in keys])
+
     def is_checked(self, term):
         raise NotImplementedError()
 
+    def get_titles(self):
+        """ Return list of ``(term, title)`` tuples """
+        get_titles = getattr(self.vocabulary, 'get_titles', None)
+        if get_titles is not None:
+            return get_titles(self.request, self.sort_items, self.sort_key)
+
+        return [(term, term.title if term.title is not None else term.token)
+                for term in self.vocabulary]
+
     def update_items(self):
         self.items = []
 
-        for count, term in enumerate(self.vocabulary):
-            label = term.title if term.title is not None else term.token
-
+        for count, (term, label) in enumerate(self.get_titles()):
             self.items.append(
                 {'id': '%s-%i' % (self.id, count), 'name': self.name,
                  'value': term.token, 'label': label,
@@ -115,6 +249,10 @@ class BaseChoiceField(VocabularyField):
         if not value:
             return null
 
+        # typed value, i.e. JSON object
+        if not isinstance(value, string_types):
+            raise Invalid(self.error_wrong_type, self)
+
         try:
             return self.vocabulary.get_term_bytoken(value).value
         except LookupError:
@@ -140,6 +278,7 @@ class BaseMultiChoiceField(VocabularyField):
     """ multi choice field """
 
     missing = []
+    omit_empty = True
     error_msg = _('"${val}" is not in vocabulary')
 
     def to_form(self, value):
@@ -156,6 +295,10 @@ class BaseMultiChoiceField(VocabularyField):
         if not value:
             return null
 
+        if not isinstance(value, (list, tuple)) or \
+                not all(isinstance(val, string_types) for val in value):
+            raise Invalid(self.error_wrong_type, self)
+
         val = value
         try:
             res = []
@@ -199,6 +342,12 @@ class TextField(InputField):
     value = ''
     missing = ''
 
+    def to_field(self, value):
+        # typed value, i.e. JSON number or object
+        if not isinstance(value, string_types):
+            raise Invalid(self.error_wrong_type, self)
+        return value
+
 
 class Number(object):
 
@@ -211,6 +360,15 @@ class Number(object):
             raise Invalid(self.error_msg, self)
 
     def to_field(self, value):
+        # typed value, i.e. JSON number
+        if isinstance(value, numbers.Number):
+            if isinstance(value, bool):
+                raise Invalid(self.error_msg, self, mapping={'val': value})
+            try:
+                return self.from_number(value)
+            except Exception:
+                raise Invalid(self.error_msg, self, mapping={'val': value})
+
         if not value:
             return null
 
@@ -219,6 +377,10 @@ class Number(object):
         except Exception:
             raise Invalid(self.error_msg, self, mapping={'val': value})
 
+    def from_number(self, value):
+        """ Convert typed number """
+        return self.typ(value)
+
 
 @field('int')
 class IntegerField(Number, TextField):
@@ -228,6 +390,12 @@ class IntegerField(Number, TextField):
     value = 0
     klass = 'form-control int-widget'
 
+    def from_number(self, value):
+        result = int(value)
+        if result != value:
+            raise ValueError(value)
+        return result
+
 
 @field('float')
 class FloatField(Number, TextField):
@@ -244,6 +412,11 @@ class DecimalField(Number, TextField):
     typ = decimal.Decimal
     klass = 'form-control decimal-widget'
 
+    def from_number(self, value):
+        if isinstance(value, float):
+            value = repr(value)
+        return decimal.Decimal(value)
+
 
 @field('textarea')
 class TextAreaField(TextField):
@@ -262,7 +435,32 @@ class TextAreaField(TextField):
 
 @field('file')
 class FileField(InputField):
-    """HTML File input widget. Field name is ``file``."""
+    """HTML File input widget. Field name is ``file``.
+
+    ``max_size``: Maximum file size.
+
+    ``allowed_types``: Allowed file mimetypes.
+
+    ``store``: :py:class:`pform.FileStore` instance. Uploaded file is
+      staged in store while its digests are computed, field value is
+      :py:class:`pform.storage.StagedFile` with ``digest``, ``digests``,
+      ``size``, ``mimetype``, ``filename`` and ``path`` keys. Form
+      commits staged files to store after successful validation and
+      removes them otherwise. If fieldset is extracted directly, staged
+      files are removed on errors, call ``commit()`` of value to
+      store the file.
+
+    ``digests``: Names of additional hash algorithms for ``store``.
+
+    ``chunked``: File is uploaded in chunks with ``pform:upload``
+      endpoint, field param is upload id. Size and mimetype are
+      validated from staged upload metadata. Upload is removed from
+      staging when it is committed to ``store``, otherwise it expires.
+
+    ``sniff_content``: Detect mimetype for ``allowed_types`` check
+      from first bytes of file content instead of trusting client
+      mimetype, see :py:mod:`pform.sniff`. It is disabled by default.
+    """
 
     klass = 'input-file'
     html_type = 'file'
@@ -270,34 +468,97 @@ class FileField(InputField):
     max_size = 0
     allowed_types = ()
 
+    store = None
+    digests = ()
+
+    chunked = False
+    sniff_content = False
+
     error_max_size = "Maximum file size exceeded."
     error_unknown_type = "Unknown file type."
+    error_incomplete = "File upload is not complete."
 
     tmpl_input = 'form:input-file'
 
-    def validate(self, value):
+    def to_field(self, value):
+        if value is null:
+            return value
+
+        if value.get('incomplete'):
+            raise Invalid(self.error_incomplete, self)
+
+        if self.chunked:
+            staging = get_upload_staging(self.request)
+            try:
+                value['fp'] = staging.open(value['upload_id'])
+            except (KeyError, IOError, OSError):
+                raise Invalid(self.error_incomplete, self)
+
+        if self.store is None:
+            return value
+
+        try:
+            mimetype = self.get_mimetype(value)
+            result = self.store.stage(value['fp'], self.digests, self.max_size)
+        except storage.SizeExceeded:
+            raise Invalid(self.error_max_size, self)
+        finally:
+            if self.chunked:
+                value['fp'].close()
+
+        result['filename'] = value['filename']
+        result['mimetype'] = mimetype
+
+        # staged upload is consumed
+        if self.chunked:
+            result.callbacks.append(
+                lambda: staging.remove(value['upload_id']))
+        return result
+
+    def get_mimetype(self, value):
+        """ Return file mimetype, content is sniffed once and result
+        is cached on value as ``sniffed_mimetype`` """
+        if not self.sniff_content or 'fp' not in value:
+            return value.get('mimetype')
+
+        mimetype = value.get('sniffed_mimetype')
+        if mimetype is None:
+            mimetype = value['sniffed_mimetype'] = resolve_mimetype(
+                sniff_mimetype(value['fp']), value.get('mimetype'))
+
+        return mimetype
+
+    def check(self, value):
         if value is null and self.form_value:
             value = self.form_value
 
-        super(FileField, self).validate(value)
-
-        if value is null:
-            return
+        error = super(FileField, self).check(value)
+        if (error is not None and not isinstance(error, Pending)) or \
+                value is null:
+            return error
 
         if self.max_size:
-            value['fp'].seek(0, 2)
-            size = value['fp'].tell()
-            value['fp'].seek(0)
+            size = value.get('size')
+            if size is None or size < 0:
+                value['fp'].seek(0, 2)
+                size = value['fp'].tell()
+                value['fp'].seek(0)
 
             if size > self.max_size:
-                raise Invalid(self.error_max_size, self)
+                return Invalid(self.error_max_size, self)
+
+        if self.allowed_types and \
+                self.get_mimetype(value) not in self.allowed_types:
+            return Invalid(self.error_unknown_type, self)
 
-        if self.allowed_types and value['mimetype'] not in self.allowed_types:
-            raise Invalid(self.error_unknown_type, self)
+        return error
 
     def extract(self):
         value = self.params.get(self.name, null)
 
+        if self.chunked:
+            return self.extract_upload(value)
+
         if hasattr(value, 'file'):
             value.file.seek(0)
             return {
@@ -319,6 +580,27 @@ class FileField(InputField):
 
         return null
 
+    def extract_upload(self, upload_id):
+        """ Extract staged chunked upload, upload data is opened
+        during conversion """
+        if not upload_id or upload_id is null:
+            return null
+
+        staging = get_upload_staging(self.request)
+        try:
+            meta = staging.get(upload_id)
+        except (KeyError, AttributeError):
+            meta = None
+
+        if meta is None or not meta['complete']:
+            return {'upload_id': upload_id, 'incomplete': True}
+
+        return {
+            'filename': meta['filename'],
+            'mimetype': meta['mimetype'],
+            'size': meta['size'],
+            'upload_id': upload_id}
+
 
 @field('lines')
 class LinesField(TextAreaField):
@@ -383,6 +665,11 @@ class DateField(TextField):
         return value.isoformat()
 
     def to_field(self, value):
+        if isinstance(value, datetime.datetime):
+            return value.date()
+        if isinstance(value, datetime.date):
+            return value
+
         if not value:
             return null
 
@@ -423,6 +710,11 @@ class DateTimeField(TextField):
         return value.isoformat()
 
     def to_field(self, value):
+        if isinstance(value, datetime.datetime):
+            if value.tzinfo is None:
+                value = value.replace(tzinfo=self.default_tzinfo)
+            return value
+
         if not value:
             return null
 
@@ -460,6 +752,21 @@ class BoolField(RadioField):
         (False, 'false',  'no'))
 
     inline = True
+    omit_empty = True
+
+    def extract(self):
+        value = self.params.get(self.name, null)
+        if isinstance(value, bool):
+            return value
+
+        return super(BoolField, self).extract()
+
+    def to_field(self, value):
+        # JSON boolean
+        if isinstance(value, bool):
+            return value
+
+        return super(BoolField, self).to_field(value)
 
 
 @field('choice')
@@ -533,6 +840,95 @@ class TimezoneField(ChoiceField):
             raise Invalid(self.error_msg, self, {'val': value})
 
 
+@field('dependentchoice')
+class DependentChoiceField(ChoiceField):
+    """ HTML Select input widget, vocabulary depends on value of other
+    field. Field name is ``dependentchoice``.
+
+    ``parent``: Name of parent field, it should be in same fieldset.
+
+    ``voc_provider``: Function that accepts parent field value and returns
+      vocabulary instance or sequence of vocabulary items.
+
+    ``voc_cache``: Cache for child vocabularies, keyed by parent value.
+      By default each field has its own :py:class:`pform.LRUCache`.
+
+    Field can be rendered separately with ``pform:field`` endpoint,
+    i.e. ``/_pform/{form}/field/{field}?{parent param}={parent token}``,
+    endpoints are registered with ``config.include('pform.views')``.
+    """
+
+    __staticfuncs__ = ChoiceField.__staticfuncs__ + ('voc_provider',)
+
+    parent = ''
+    voc_provider = None
+
+    def __init__(self, *args, **kw):
+        kw.setdefault('vocabulary', ())
+        super(DependentChoiceField, self).__init__(*args, **kw)
+
+        if not self.parent or self.voc_provider is None:
+            raise ValueError("Parent field and vocabulary provider "
+                             "are required.")
+
+        if self.voc_cache is None:
+            self.voc_cache = LRUCache()
+
+    def get_parent_value(self):
+        """ Return parent field value, submitted value is preferred.
+        Return ``null`` if field is bound outside of fieldset. """
+        if self.fieldset is None:
+            return null
+
+        if self.parent not in self.fieldset:
+            raise ValueError(
+                "Parent field '%s' is not found in fieldset." % self.parent)
+
+        parent = self.fieldset[self.parent]
+
+        value = parent.extract()
+        if value is not null:
+            try:
+                return parent.to_field(value)
+            except Invalid:
+                return null
+
+        if parent.value is not null:
+            return parent.value
+        return parent.default
+
+    def get_child_vocabulary(self, value):
+        """ Return vocabulary for parent ``value`` """
+        def create():
+            voc = self.voc_provider(value)
+            if not IVocabulary.providedBy(voc):
+                voc = vocabulary.Vocabulary(*voc)
+            return voc
+
+        try:
+            hash(value)
+        except TypeError:
+            return create()
+
+        return self.voc_cache.get_or_create(value, create)
+
+    def update_vocabulary(self):
+        self.vocabulary = self.get_child_vocabulary(self.get_parent_value())
+
+    def invalidate_vocabulary(self, *values):
+        """ Drop cached vocabularies for parent ``values``,
+        clear vocabulary cache if values are not specified """
+        self.voc_cache.invalidate(*values)
+
+    def to_field(self, value):
+        self.update_vocabulary()
+        return super(DependentChoiceField, self).to_field(value)
+
+    def update(self):
+        self.update_vocabulary()
+        super(DependentChoiceField, self).update()
+
+
 class OptionsField(CompositeField):
     """ Options field
 
@@ -578,13 +974,13 @@ class OptionsField(CompositeField):
 
         return value
 
-    def validate(self, value):
+    def check(self, value):
         key = value.get(self.key)
 
         if key not in self.fields:
             key = self.fields[self.key].default
 
-        super(OptionsField, self).validate(
+        return super(OptionsField, self).check(
             {key: value.get(key, self.fields[key].missing)})
 
     def extract(self):
@@ -3,13 +3,31 @@ import copy
 from collections import OrderedDict
 from pyramid.compat import text_type, string_types
 
-from pform.field import Field
-from pform.validator import All
-from pform.interfaces import null, Invalid
+from pform import concurrency, storage
+from pform.field import Field, check_field
+from pform.validator import All, Pending, check_validator, resolve
+from pform.interfaces import _, null, Invalid
 
 
 class Fieldset(OrderedDict):
-    """ Fieldset holds fields """
+    """ Fieldset holds fields
+
+    ``concurrent``: Resolve vocabulary factories of all fields
+      concurrently during bind. It can be ``True`` (shared thread pool)
+      or ``concurrent.futures`` executor instance.
+
+    ``max_errors``: Stop extraction after number of errors, remaining
+      fields are not converted and validated, summary error is added.
+
+    ``max_concurrency``: Maximum number of blocking validators running
+      on thread pool at a time during one extraction.
+
+    ``validator``: Fieldset validator, list of validators or
+      :py:class:`pform.All` instance, i.e. ``All(..., fail_fast=True)``.
+    """
+
+    error_max_errors = _('Too many errors, validation stopped '
+                         'after ${max} errors.')
 
     def __init__(self, *args, **kwargs):
         super(Fieldset, self).__init__()
@@ -21,9 +39,14 @@ class Fieldset(OrderedDict):
         self.prefix = '%s.' % self.name if self.name else ''
         self.lprefix = len(self.prefix)
         self.filter = kwargs.pop('filter', None)
+        self.concurrent = kwargs.pop('concurrent', False)
+        self.max_errors = kwargs.pop('max_errors', None)
+        self.max_concurrency = kwargs.pop('max_concurrency', None)
 
         validator = kwargs.pop('validator', None)
-        if isinstance(validator, (tuple, list)):
+        if isinstance(validator, All):
+            self.validator = validator
+        elif isinstance(validator, (tuple, list)):
             self.validator = All(*validator)
         else:
             self.validator = All()
@@ -71,16 +94,35 @@ class Fieldset(OrderedDict):
         return self.__class__(*[field for name, field in self.items()
                                 if name not in names])
 
+    def check(self, data):
+        """ validate data, return :py:class:`pform.Invalid` error
+        or ``None`` """
+        return check_validator(self.validator, self, data)
+
     def validate(self, data):
-        self.validator(self, data)
+        """ validate data, raise :py:class:`pform.Invalid` error """
+        error = resolve(self.check(data))
+        if error is not None:
+            raise error
 
     def bind(self, request, data=None, params={}, prefix='', context=None):
+        if self.concurrent and concurrency.current() is None:
+            executor = self.concurrent if self.concurrent is not True else None
+            with concurrency.Deferred(executor):
+                return self._bind(request, data, params, prefix, context)
+
+        return self._bind(request, data, params, prefix, context)
+
+    def _bind(self, request, data, params, prefix, context):
         clone = Fieldset(
             name=self.name,
             title=self.title,
             prefix=self.prefix,
             flat=self.flat,
-            validator=self.validator.validators)
+            concurrent=self.concurrent,
+            max_errors=self.max_errors,
+            max_concurrency=self.max_concurrency,
+            validator=self.validator)
 
         if data is None or data is null:
             data = {}
@@ -100,27 +142,260 @@ class Fieldset(OrderedDict):
                 clone[name] = field.bind(
                     request, self.prefix, value, params, context)
                 clone[name].set_id_prefix(idprefix)
+                clone[name].fieldset = clone
 
         return clone
 
-    def extract(self):
+    def extract(self, max_errors=None, max_concurrency=None):
+        """ extract and validate data, return data and errors.
+        Coroutine validators are awaited concurrently on event loop
+        in worker thread, blocking validators are executed on
+        thread pool.
+
+        ``max_errors``: Stop after number of errors, overrides
+          fieldset ``max_errors``
+
+        ``max_concurrency``: Maximum number of blocking validators
+          running at a time, overrides fieldset ``max_concurrency``
+        """
+        if max_errors is None:
+            max_errors = self.max_errors
+
+        data, errors = self._extract(max_errors)
+        self._complete(errors, max_errors, max_concurrency)
+        self._discard(data, errors)
+        return data, errors
+
+    def extract_changes(self, validate_unchanged=False,
+                        max_errors=None, max_concurrency=None):
+        """ extract and validate data, compare submitted values with
+        form representation of bound values. Return data, errors and
+        set of names of changed fields.
+
+        ``validate_unchanged``: Validate unchanged fields, by default
+          only required value is checked.
+        """
+        if max_errors is None:
+            max_errors = self.max_errors
+
+        changes = set()
+        data, errors = self._extract(max_errors, changes, validate_unchanged)
+        self._complete(errors, max_errors, max_concurrency)
+        self._discard(data, errors)
+        return data, errors, changes
+
+    def _complete(self, errors, max_errors, max_concurrency):
+        if errors._pending or errors._deferred:
+            executor = self._executor(max_concurrency)
+            try:
+                while True:
+                    tasks = self._next_round(errors)
+                    if not errors._running:
+                        break
+                    self._apply(errors, concurrency.run_tasks(
+                        tasks, executor) if tasks else [])
+            except:
+                self._close(errors)
+                raise
+
+            self._order(errors)
+
+        self._finish(errors, max_errors)
+
+    def extract_async(self, max_errors=None, loop=None, max_concurrency=None):
+        """ extract and validate data, coroutine validators are
+        awaited concurrently on ``loop``. Return future of
+        ``(data, errors)`` tuple. """
+        if max_errors is None:
+            max_errors = self.max_errors
+
+        data, errors = self._extract(max_errors)
+
+        def finish():
+            self._order(errors)
+            self._finish(errors, max_errors)
+            self._discard(data, errors)
+            return data, errors
+
+        return self._run_async(errors, finish, loop, max_concurrency)
+
+    def validate_async(self, data, loop=None, max_concurrency=None):
+        """ validate data with fieldset validator, coroutine
+        validators are awaited on ``loop``. Return future, it raises
+        :py:class:`pform.Invalid` error. """
+        errors = FieldsetErrors(self)
+        error = check_field(self, data)
+        if isinstance(error, Pending):
+            errors._pending.append(error)
+        elif error is not None:
+            errors.append(error)
+
+        def finish():
+            if errors:
+                raise errors[0]
+
+        return self._run_async(errors, finish, loop, max_concurrency)
+
+    def _executor(self, max_concurrency):
+        executor = self.concurrent if self.concurrent is not True else None
+        return concurrency.get_limited_executor(
+            executor, max_concurrency or self.max_concurrency)
+
+    def _run_async(self, errors, finish, loop, max_concurrency):
+        loop = loop or concurrency.asyncio.get_event_loop()
+        future = loop.create_future()
+        executor = self._executor(max_concurrency)
+
+        def step(gathered=None):
+            try:
+                if gathered is not None:
+                    self._apply(errors, gathered.result())
+
+                while True:
+                    tasks = self._next_round(errors)
+                    if not errors._running:
+                        result = finish()
+                        break
+                    if tasks:
+                        concurrency.asyncio.gather(
+                            *[concurrency.wrap_task(task, loop, executor)
+                              for task in tasks],
+                            return_exceptions=True).add_done_callback(step)
+                        return
+                    self._apply(errors, [])
+            except Exception as e:
+                self._close(errors)
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+        step()
+        return future
+
+    def _next_round(self, errors):
+        """ Start next round of pending validations, return tasks """
+        if not errors._pending:
+            # fieldset validators that wait for pending validations
+            while errors._deferred:
+                fieldset, data, pendings = errors._deferred.pop(0)
+                if any(_failed(p) for p in pendings):
+                    continue
+
+                error = check_field(fieldset, data)
+                if error is None:
+                    continue
+
+                # parent fieldsets depend on nested fieldset validator
+                if not isinstance(error, Pending):
+                    errors.append(error)
+                    error, resolved = Pending([], None), error
+                    error.error = resolved
+                else:
+                    errors._pending.append(error)
+
+                for entry in errors._deferred:
+                    if any(p in entry[2] for p in pendings):
+                        entry[2].append(error)
+
+                if errors._pending:
+                    break
+
+        errors._running, errors._pending = errors._pending, []
+        return [task for pending in errors._running
+                for task in pending.tasks]
+
+    def _apply(self, errors, results):
+        """ Resolve running validations with tasks results """
+        running, errors._running = errors._running, []
+
+        idx = 0
+        for pending in running:
+            count = len(pending.tasks)
+            error = pending.set_results(results[idx:idx+count])
+            idx += count
+
+            if isinstance(error, Pending):
+                errors._pending.append(error)
+            elif error is not None:
+                errors.append(error)
+
+    def _order(self, errors):
+        """ Sort errors in order of fields, as if all validators
+        were executed sequentially """
+        order = {}
+
+        def walk(fieldset):
+            for fs in fieldset.fieldsets():
+                if fs is not fieldset:
+                    walk(fs)
+            for field in fieldset.fields():
+                order[id(field)] = len(order)
+            order[id(fieldset)] = len(order)
+
+        walk(self)
+        errors.sort(key=lambda err: order.get(
+            id(getattr(err, 'field', None)), len(order)))
+
+    def _finish(self, errors, max_errors):
+        if errors.stopped:
+            errors.append(Invalid(
+                self.error_max_errors, mapping={'max': max_errors},
+                name='max_errors'))
+
+    def _discard(self, data, errors):
+        """ Remove staged files of failed extraction """
+        if errors:
+            for staged in storage.staged_files(data):
+                staged.discard()
+
+    def _extract(self, max_errors, changes=None, validate_unchanged=True):
         data = {}
         errors = FieldsetErrors(self)
+        try:
+            self._extract_values(
+                data, errors, max_errors, changes, validate_unchanged)
+        except:
+            self._close(errors)
+            raise
+
+        return data, errors
 
+    def _extract_values(self, data, errors, max_errors,
+                        changes, validate_unchanged):
         for fieldset in self.fieldsets():
             if fieldset is self:
                 continue
 
-            fdata, ferrors = fieldset.extract()
+            if max_errors and len(errors) >= max_errors:
+                errors.stopped = True
+                return
+
+            fdata, ferrors = fieldset._extract(
+                max_errors - len(errors) if max_errors else None,
+                changes, validate_unchanged)
             if fieldset.flat:
                 data.update(fdata)
             else:
                 data[fieldset.name] = fdata
             errors.extend(ferrors)
+            errors._pending.extend(ferrors._pending)
+            errors._deferred.extend(ferrors._deferred)
+
+            if ferrors.stopped:
+                errors.stopped = True
+                return
 
         for field in self.fields():
+            if max_errors and len(errors) >= max_errors:
+                errors.stopped = True
+                return
+
             value = field.extract()
 
+            changed = changes is None or field.is_changed(value)
+            if changed and changes is not None:
+                changes.add(field.name)
+
             if value is not null:
                 try:
                     value = field.to_field(value)
@@ -132,10 +407,15 @@ class Fieldset(OrderedDict):
             if value is null and field.missing is not null:
                 value = copy.copy(field.missing)
 
-            try:
-                field.validate(value)
-            except Invalid as e:
-                errors.append(e)
+            if changed or validate_unchanged:
+                error = check_field(field, value)
+            else:
+                error = field.check_required(value)
+
+            if isinstance(error, Pending):
+                errors._pending.append(error)
+            elif error is not None:
+                errors.append(error)
 
             if field.preparer is not None:
                 value = field.preparer(value)
@@ -146,12 +426,20 @@ class Fieldset(OrderedDict):
                 data[field.name[self.lprefix:]] = value
 
         if not errors:
-            try:
-                self.validate(data)
-            except Invalid as e:
-                errors.append(e)
-
-        return data, errors
+            if errors._pending:
+                errors._deferred.append((self, data, list(errors._pending)))
+            else:
+                error = check_field(self, data)
+                if isinstance(error, Pending):
+                    errors._pending.append(error)
+                elif error is not None:
+                    errors.append(error)
+
+    def _close(self, errors):
+        """ Close coroutines of validations which are not run """
+        for pending in errors._pending + errors._running:
+            pending.close()
+        errors._pending, errors._running = [], []
 
     def __add__(self, fieldset):
         if not isinstance(fieldset, Fieldset):
@@ -160,20 +448,78 @@ class Fieldset(OrderedDict):
         return self.__class__(self, fieldset)
 
 
+def _failed(pending):
+    error = pending
+    while isinstance(error, Pending):
+        error = error.error
+    return error is not None
+
+
 class FieldsetErrors(list):
+    """ List of fieldset errors. Errors are indexed by field name
+    and error name, nested ``CompositeError`` errors are indexed by
+    field name, i.e. ``address.state``. Index and ``msg`` mapping are
+    updated on mutation.
+
+    ``stopped``: Extraction was stopped after ``max_errors`` errors.
+    """
+
+    stopped = False
 
     def __init__(self, fieldset, *args):
         super(FieldsetErrors, self).__init__(args)
 
         self.fieldset = fieldset
+        self._index = None
+        self._msg = None
+
+        # pending asynchronous validations
+        self._pending = []
+        self._running = []
+        self._deferred = []
+
+    def _reset(self):
+        self._index = None
+        self._msg = None
+
+    def _add_to_index(self, index, err, prefix=None):
+        names = []
+        field = getattr(err, 'field', None)
+        if field is not None and getattr(field, 'name', None):
+            names.append(field.name)
+        if err.name:
+            names.append(err.name if prefix is None
+                         else '%s.%s' % (prefix, err.name))
+
+        for name in set(names):
+            index.setdefault(name, []).append(err)
+
+        for sub in getattr(err, 'errors', {}).values():
+            self._add_to_index(
+                index, sub, names[0] if names else prefix)
+
+    def _get_index(self):
+        index = self._index
+        if index is None:
+            index = {}
+            for err in self:
+                if isinstance(err, Invalid):
+                    self._add_to_index(index, err)
+            self._index = index
+
+        return index
 
     @property
     def msg(self):
-        r = {}
-        for err in self:
-            r[err.field.name] = text_type(err)
+        msg = self._msg
+        if msg is None:
+            msg = {}
+            for err in self:
+                name = err.field.name if err.field is not None else err.name
+                msg[name] = text_type(err)
+            self._msg = msg
 
-        return r
+        return dict(msg)
 
     def append(self, err):
         """
@@ -186,6 +532,27 @@ class FieldsetErrors(list):
         else:
             super(FieldsetErrors, self).append(err)
 
+            self._msg = None
+            if self._index is not None and isinstance(err, Invalid):
+                self._add_to_index(self._index, err)
+
+    def extend(self, errors):
+        for err in errors:
+            self.append(err)
+
+    def __iadd__(self, errors):
+        self.extend(errors)
+        return self
+
+    def __imul__(self, n):
+        super(FieldsetErrors, self).__imul__(n)
+        self._reset()
+        return self
+
+    def clear(self):
+        del self[:]
+        self._reset()
+
     def add_field_error(self, name, err):
         """
         Add error to specific field. Set error `field` to specified field.
@@ -201,6 +568,10 @@ class FieldsetErrors(list):
 
         self.append(err)
 
+    def get(self, name, default=None):
+        """ Return list of errors for field or error name """
+        return self._get_index().get(name, default)
+
     def __contains__(self, name):
         """
         Check if there is error for field
@@ -208,6 +579,40 @@ class FieldsetErrors(list):
         if isinstance(name, Invalid):
             return super(FieldsetErrors, self).__contains__(name)
 
-        for err in self:
-            if (err.field and err.field.name == name) or (err.name == name):
-                return True
+        return name in self._get_index()
+
+    def insert(self, idx, err):
+        super(FieldsetErrors, self).insert(idx, err)
+        self._reset()
+
+    def remove(self, err):
+        super(FieldsetErrors, self).remove(err)
+        self._reset()
+
+    def pop(self, *args):
+        self._reset()
+        return super(FieldsetErrors, self).pop(*args)
+
+    def reverse(self):
+        super(FieldsetErrors, self).reverse()
+        self._reset()
+
+    def sort(self, *args, **kw):
+        super(FieldsetErrors, self).sort(*args, **kw)
+        self._reset()
+
+    def __setitem__(self, key, value):
+        super(FieldsetErrors, self).__setitem__(key, value)
+        self._reset()
+
+    def __delitem__(self, key):
+        super(FieldsetErrors, self).__delitem__(key)
+        self._reset()
+
+    def __setslice__(self, i, j, value): # pragma: no cover
+        list.__setslice__(self, i, j, value)
+        self._reset()
+
+    def __delslice__(self, i, j): # pragma: no cover
+        list.__delslice__(self, i, j)
+        self._reset()
@@ -6,14 +6,23 @@ from pyramid.decorator import reify
 from pyramid.renderers import NullRendererHelper
 from pyramid.interfaces import IResponse
 from pyramid.httpexceptions import HTTPException, HTTPForbidden
+from pyramid.httpexceptions import HTTPRequestEntityTooLarge
 from pyramid.config.views import DefaultViewMapper
 from player import layout, render, tmpl_filter, add_message
 
+from pform import concurrency, storage
+from pform.cache import request_cache
 from pform.field import Field
-from pform.fieldset import Fieldset
+from pform.fieldset import Fieldset, FieldsetErrors
+from pform.composite import CompositeField
+from pform.upload import parse_multipart
+from pform.jsonapi import JsonParams, errors_to_json, parse_json_params
 from pform.button import Buttons, Actions
 from pform.interfaces import Invalid, HTTPResponseIsReady
 
+# hidden param with id of submitted form, see ``form.pt``
+FORM_IDENTITY = '__form_identity__'
+
 
 @tmpl_filter('form:error')
 def form_error_message(context, request):
@@ -68,14 +77,66 @@ class FormWidgets(OrderedDict):
                  'widgets': widgets})
 
     def extract(self):
-        data, errors = self.fieldset.extract()
+        return self.validate_extracted(
+            *self.fieldset.extract(
+                self.form.max_errors, self.form.max_concurrency))
+
+    def extract_changes(self, validate_unchanged=False):
+        """ extract form values, return data, errors and set of names
+        of changed fields. See :py:meth:`pform.Fieldset.extract_changes`
+        """
+        data, errors, changes = self.fieldset.extract_changes(
+            validate_unchanged,
+            self.form.max_errors, self.form.max_concurrency)
+        return self.validate_extracted(data, errors) + (changes,)
+
+    def extract_async(self, loop=None):
+        """ extract form values, coroutine validators are awaited
+        concurrently on ``loop``. Return future. """
+        loop = loop or concurrency.asyncio.get_event_loop()
+        future = self.fieldset.extract_async(
+            self.form.max_errors, loop, self.form.max_concurrency)
+        result = loop.create_future()
+
+        def done(extracted):
+            try:
+                result.set_result(
+                    self.validate_extracted(*extracted.result()))
+            except Exception as e:
+                result.set_exception(e)
+
+        future.add_done_callback(done)
+        return result
+
+    def validate_extracted(self, data, errors):
+        """ form validation of extracted fieldset data. Staged files
+        are committed to store if data is valid. """
+        staged = storage.staged_files(data)
 
         # additional form validation
-        self.form.validate_form(data, errors)
+        stopped = getattr(errors, 'stopped', False)
+        try:
+            if stopped:
+                self.form.validate_csrf_token()
+            else:
+                self.form.validate_form(data, errors)
+        except:
+            for item in staged:
+                item.discard()
+            raise
+
+        for item in staged:
+            if errors:
+                item.discard()
+            else:
+                item.commit()
 
         # convert strings
-        errors = [Invalid(err) if isinstance(err, string_types) else err
-                  for err in errors]
+        errors = FieldsetErrors(
+            getattr(errors, 'fieldset', self.fieldset),
+            *[Invalid(err) if isinstance(err, string_types) else err
+              for err in errors])
+        errors.stopped = stopped
 
         # set errors to fields
         for err in errors:
@@ -174,6 +235,31 @@ class Form(object):
     ``csrf_name``: Form csrf field name
 
     ``csrf_token``: Form csrf token value
+
+    ``max_content_length``: Maximum request body size, it is checked
+    before request body is read.
+
+    ``stream_uploads``: Parse ``multipart/form-data`` request body with
+    streaming parser, files are written to temporary files while
+    request body is read. Body is shared between forms of the page,
+    upload size limits (``FileField.max_size``) of submitted form are
+    checked after parsing. ``request.POST`` is not available in this
+    mode.
+
+    ``max_errors``: Stop extraction after number of errors, form
+    ``validate()`` is not called. See :py:class:`pform.Fieldset`.
+
+    ``max_concurrency``: Maximum number of blocking validators of
+    one form running on shared thread pool at a time.
+
+    ``json_mode``: Form params are parsed from JSON request body,
+    nested objects are mapped to composite fields and nested
+    fieldsets. See :py:meth:`json_errors`.
+
+    Several forms could be rendered on one page, ``__form_identity__``
+    param of submitted form is read once per request. Actions are
+    executed only for submitted form, other forms are rendered from
+    content only. See :py:meth:`is_submitted`.
     """
 
     label = None
@@ -200,6 +286,12 @@ class Form(object):
     csrf_name = 'csrf-token'
     csrf_token = ''
 
+    max_content_length = None
+    stream_uploads = False
+    max_errors = None
+    max_concurrency = None
+    json_mode = False
+
     tmpl_view = 'form:form'
     tmpl_actions = 'form:form-actions'
     tmpl_widget = 'form:widget'
@@ -251,18 +343,114 @@ class Form(object):
 
     def form_params(self):
         """ get form request params """
+        if self.json_mode and self.params is None:
+            self.params = parse_json_params(self.request)
+            return self.params
+
         if self.params is not None:
-            if not isinstance(self.params, MultiDict):
+            if not isinstance(self.params, (MultiDict, JsonParams)):
                 return MultiDict(self.params)
             return self.params
 
         if self.method == 'post':
+            if self.stream_uploads:
+                self.params = self.parse_uploads()
+                return self.params
+
+            self.validate_content_length()
             return self.request.POST
         elif self.method == 'get':
             return self.request.GET
         else:
             return self.params
 
+    def form_identity(self):
+        """ Return ``__form_identity__`` request param or ``None``.
+        Param is read once per request and shared between forms. """
+        if self.params is None and not self.json_mode and \
+                self.method in ('post', 'get'):
+            storage = request_cache(self.request, 'pform:identity')
+            if storage is not None:
+                if self.method not in storage:
+                    storage[self.method] = \
+                        self.form_params().get(FORM_IDENTITY)
+                return storage[self.method]
+
+        return self.form_params().get(FORM_IDENTITY)
+
+    def is_submitted(self):
+        """ Check if this form is submitted. Form without submitted
+        identity is always active. """
+        identity = self.form_identity()
+        return identity is None or identity == self.id
+
+    def validate_content_length(self):
+        """ Check request ``Content-Length`` """
+        if (self.max_content_length is not None and
+                (self.request.content_length or 0) > self.max_content_length):
+            raise HTTPRequestEntityTooLarge()
+
+    def upload_limits(self):
+        """ Return maximum upload sizes of form file fields
+        keyed by request param name """
+        limits = {}
+
+        def walk(fieldset, prefix):
+            for field in fieldset.fields():
+                if isinstance(field, CompositeField):
+                    walk(field.fields, field.fields.prefix)
+                elif getattr(field, 'max_size', 0):
+                    limits['%s%s' % (prefix, field.name)] = field.max_size
+
+            for fs in fieldset.fieldsets():
+                if fs is not fieldset:
+                    walk(fs, '%s%s' % (prefix, fs.prefix))
+
+        walk(self.fields, self.fields.prefix)
+        return limits
+
+    def parse_uploads(self):
+        """ Parse request body with streaming multipart parser. Body is
+        parsed once per request and shared between forms of the page,
+        it is parsed without form limits, only submitted form checks
+        its ``max_content_length`` and upload sizes. """
+        request = self.request
+        if not (request.content_type or '').startswith('multipart/'):
+            self.validate_content_length()
+            return request.POST
+
+        storage = request_cache(request, 'pform:identity')
+        if storage is None:
+            # body can not be shared, enforce limits while reading
+            return parse_multipart(
+                request.environ['wsgi.input'],
+                request.headers['Content-Type'],
+                request.content_length,
+                self.max_content_length,
+                self.upload_limits(),
+                request.charset or 'utf-8')
+
+        params = storage.get('uploads')
+        if params is None:
+            params = storage['uploads'] = parse_multipart(
+                request.environ['wsgi.input'],
+                request.headers['Content-Type'],
+                request.content_length,
+                charset=request.charset or 'utf-8')
+
+        identity = params.get(FORM_IDENTITY)
+        if identity is None or identity == self.id:
+            self.validate_content_length()
+            self.validate_upload_sizes(params)
+        return params
+
+    def validate_upload_sizes(self, params):
+        """ Check sizes of parsed uploads """
+        for name, limit in self.upload_limits().items():
+            for value in params.getall(name):
+                if getattr(value, 'length', 0) > limit:
+                    raise HTTPRequestEntityTooLarge()
+
     def update_widgets(self):
         """ prepare form widgets """
         self.widgets = FormWidgets(self.fields, self, self.request)
@@ -279,10 +467,15 @@ class Form(object):
         if not self.content and data:
             self.content = data
 
+        # other form of the page is submitted, render from content
+        submitted = self.is_submitted()
+        if not submitted:
+            self.params = MultiDict()
+
         self.update_widgets()
         self.update_actions()
 
-        ac_result = self.actions.execute()
+        ac_result = self.actions.execute() if submitted else None
         if IResponse.providedBy(ac_result):
             raise HTTPResponseIsReady(ac_result)
 
@@ -333,6 +526,23 @@ class Form(object):
         """ extract form values """
         return self.widgets.extract()
 
+    def json_errors(self, errors):
+        """ Return JSON serializable list of errors """
+        return errors_to_json(errors)
+
+    def extract_changes(self, validate_unchanged=False):
+        """ extract form values, compare them with form content.
+        Return data, errors and set of names of changed fields.
+        Only changed fields are validated unless ``validate_unchanged``
+        is set. """
+        return self.widgets.extract_changes(validate_unchanged)
+
+    def extract_async(self, loop=None):
+        """ extract form values, coroutine validators are awaited
+        concurrently on event loop. Return future of
+        ``(data, errors)`` tuple. """
+        return self.widgets.extract_async(loop)
+
     def add_error_message(self, msg):
         """ add form error message """
         add_message(self.request, msg, 'form:error')
@@ -3,10 +3,25 @@ from zope import interface
 from pyramid.i18n import get_localizer
 from pyramid.threadlocal import get_current_request
 from translationstring import TranslationStringFactory
+from pform.cache import request_cache
 
 MessageFactory = _ = TranslationStringFactory('pform')
 
 
+def get_request_localizer(request):
+    """ Return localizer for request, localizer is resolved
+    once per request """
+    storage = request_cache(request, 'pform:i18n')
+    if storage is None:
+        return get_localizer(request)
+
+    localizer = storage.get('localizer')
+    if localizer is None:
+        localizer = storage['localizer'] = get_localizer(request)
+
+    return localizer
+
+
 class Invalid(Exception):
     """An exception raised by data types and validators indicating that
     the value for a particular field was not valid.
@@ -20,8 +35,13 @@ class Invalid(Exception):
     ``name``: Custom error name
 
     ``errors``: Sub errors
+
+    Message is translated on first conversion to string, translated
+    message is cached until ``msg`` or ``mapping`` is changed.
     """
 
+    _translated = None
+
     def __init__(self, msg='', field=None, mapping=None, name=None,errors=None):
         self.msg = msg
         self.field = field
@@ -35,14 +55,23 @@ class Invalid(Exception):
                 self[err.name] = err
 
     def __str__(self):
+        msg, mapping = self.msg, self.mapping
+
+        translated = self._translated
+        if translated is not None and \
+                translated[0] is msg and translated[1] is mapping:
+            return translated[2]
+
         request = getattr(self.field, 'request', None)
         if request is None:
             request = get_current_request()
 
         if request is None:
-            return self.msg
+            return msg
 
-        return get_localizer(request).translate(self.msg, mapping=self.mapping)
+        text = get_request_localizer(request).translate(msg, mapping=mapping)
+        self._translated = (msg, mapping, text)
+        return text
 
     def __repr__(self):
         return 'Invalid(%s: %s)' % (self.field or self.name or '', self.msg)
@@ -0,0 +1,360 @@
+""" JSON request mode """
+import re
+import json
+import logging
+from pyramid.compat import text_type, string_types
+from pyramid.response import Response
+from pyramid.httpexceptions import HTTPBadRequest
+
+from pform import fields
+from pform.field import Field
+from pform.fieldset import Fieldset, FieldsetErrors
+from pform.composite import CompositeField
+from pform.interfaces import _, null, Invalid
+from pform.validator import All, Email, Regex, Range, Length, OneOf
+
+log = logging.getLogger('pform')
+
+# number of batch results in one response chunk
+BATCH_CHUNK_SIZE = 50
+
+# maximum number of items in one batch
+BATCH_MAX_ITEMS = 1000
+
+error_not_object = _('Item should be JSON object.')
+error_item_failed = _('Item validation failed.')
+
+
+class JsonParams(dict):
+    """ Form params parsed from JSON object. Nested objects are
+    mapped to composite fields and nested fieldsets by dotted names
+    once, values keep their JSON types, JSON ``null`` is treated as
+    missing value. Supports ``MultiDict`` methods used by fields.
+
+    .. code-block:: python
+
+      params = JsonParams({'name': 'Nikolay',
+                           'address': {'city': 'Almaty'}})
+
+      params['address.city'] == 'Almaty'
+    """
+
+    def __init__(self, data=None):
+        super(JsonParams, self).__init__()
+
+        if data:
+            self._flatten(data, '')
+
+    def _flatten(self, data, prefix):
+        for key, value in data.items():
+            name = '%s%s' % (prefix, key)
+            if value is None:
+                value = null
+            self[name] = value
+            if isinstance(value, dict):
+                self._flatten(value, '%s.' % name)
+
+    def getall(self, name):
+        """ Return list of values, JSON array is returned as is """
+        value = self.get(name, null)
+        if value is null:
+            return []
+        if isinstance(value, (list, tuple)):
+            return list(value)
+        return [value]
+
+    def getone(self, name):
+        return self[name]
+
+    def mixed(self):
+        return dict(self)
+
+
+def parse_json_params(request):
+    """ Parse ``request.json_body``, body should be JSON object.
+    Raise ``HTTPBadRequest`` for invalid body. """
+    if not request.body:
+        return JsonParams()
+
+    try:
+        data = request.json_body
+    except ValueError:
+        raise HTTPBadRequest('Request body is not valid JSON.')
+
+    if not isinstance(data, dict):
+        raise HTTPBadRequest('Request body should be JSON object.')
+
+    return JsonParams(data)
+
+
+def error_texts(err):
+    """ Return list of translated messages of error, :py:class:`pform.All`
+    error has message for each failed subvalidator """
+    if isinstance(err.msg, (list, tuple)):
+        return [text_type(msg) for msg in err.msg]
+
+    return [text_type(err)]
+
+
+def error_messages(err, name, messages):
+    """ Add error messages and composite suberror messages to
+    ``messages`` mapping of dotted field name to list of messages """
+    if err.msg:
+        messages.setdefault(name, []).extend(error_texts(err))
+    for sub in err.errors.values():
+        error_messages(sub, '%s.%s' % (name, sub.name), messages)
+
+    return messages
+
+
+def errors_to_json(errors):
+    """ Convert fieldset errors to JSON serializable list of
+    ``{'name': ..., 'message': ...}`` items, one item for each message.
+    ``name`` is dotted field name, it is ``None`` for form errors. """
+    result = []
+    for err in errors:
+        if isinstance(err, string_types):
+            result.append({'name': None, 'message': err})
+            continue
+
+        field = getattr(err, 'field', None)
+        name = getattr(field, 'name', None) or err.name or None
+        if name is None:
+            result.extend({'name': None, 'message': message}
+                          for message in error_texts(err))
+            continue
+
+        for sub, messages in sorted(error_messages(err, name, {}).items()):
+            result.extend({'name': sub, 'message': message}
+                          for message in messages)
+
+    return result
+
+
+def validate_batch(schema, items, request, context=None):
+    """ Validate each object of JSON array ``items`` with ``schema``,
+    :py:class:`pform.Fieldset` or form class. Schema is built once and
+    bound to each item. Yield ``(index, data, errors)`` tuples,
+    unexpected exception of item validation is reported as item
+    error. """
+    fieldset = schema
+    if not isinstance(fieldset, Fieldset):
+        fieldset = schema.fields
+        if not isinstance(fieldset, Fieldset):
+            fieldset = Fieldset(*fieldset)
+
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            yield index, None, FieldsetErrors(
+                fieldset, Invalid(error_not_object))
+            continue
+
+        try:
+            bound = fieldset.bind(
+                request, None, JsonParams(item), '', context)
+            data, errors = bound.extract()
+        except Exception:
+            log.exception("Batch item %s validation failed", index)
+            data, errors = None, FieldsetErrors(
+                fieldset, Invalid(error_item_failed))
+
+        yield index, data, errors
+
+
+def batch_response(schema, items, request, context=None,
+                   chunk_size=BATCH_CHUNK_SIZE, max_items=BATCH_MAX_ITEMS):
+    """ Validate ``items`` with :py:func:`validate_batch`, return
+    response with JSON array of ``{'index': ..., 'valid': ...,
+    'errors': [...]}`` results. Items are validated before response
+    is returned, response body is produced in chunks of ``chunk_size``
+    results. Raise ``HTTPBadRequest`` if there are more than
+    ``max_items`` items. """
+    if max_items and len(items) > max_items:
+        raise HTTPBadRequest(
+            'Batch should contain at most %s items.' % max_items)
+
+    results = [json.dumps({'index': index,
+                           'valid': not errors,
+                           'errors': errors_to_json(errors)})
+               for index, data, errors in validate_batch(
+                   schema, items, request, context)]
+
+    def app_iter():
+        if not results:
+            yield b'[]'
+
+        for idx in range(0, len(results), chunk_size):
+            chunk = ','.join(results[idx:idx+chunk_size])
+            if idx + chunk_size >= len(results):
+                chunk += ']'
+            yield ((',' if idx else '[') + chunk).encode('utf-8')
+
+    return Response(app_iter=app_iter(),
+                    content_type='application/json', charset='utf-8')
+
+
+JSON_SCHEMA = 'http://json-schema.org/draft-04/schema#'
+
+# field class -> JSON schema, more specific classes first
+FIELD_SCHEMAS = [
+    (fields.FileField, {}),
+    (fields.BoolField, {'type': 'boolean'}),
+    (fields.IntegerField, {'type': 'integer'}),
+    (fields.FloatField, {'type': 'number'}),
+    (fields.DecimalField, {'type': 'number'}),
+    (fields.DateTimeField, {'type': 'string', 'format': 'date-time'}),
+    (fields.DateField, {'type': 'string', 'format': 'date'}),
+    (fields.BaseMultiChoiceField, {'type': 'array', 'uniqueItems': True}),
+    (fields.TextField, {'type': 'string'}),
+    (fields.BaseChoiceField, {'type': 'string'}),
+]
+
+_json_types = string_types + (int, float, bool)
+
+# python regexp syntax without ECMA 262 equivalent: \A, \Z, named groups,
+# comments, scoped flags, atomic groups, conditionals, possessive
+# quantifiers
+_non_ecma_re = re.compile(r'\\[AZ]|\(\?(?:P|#|[aiLmsux-]|>|\()|[*+?}]\+')
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def json_schema(schema):
+    """ Return JSON schema of :py:class:`pform.Fieldset` or form class
+    for client side validation. Field types, required fields, static
+    vocabularies and :py:class:`pform.Length`, :py:class:`pform.Range`,
+    :py:class:`pform.Regex`, :py:class:`pform.OneOf` validators are
+    exported, other validators are checked on server only.
+
+    Schema is cached on fieldset until its fields are changed. """
+    fieldset = schema
+    if not isinstance(fieldset, Fieldset):
+        fieldset = schema.fields
+        if not isinstance(fieldset, Fieldset):
+            fieldset = Fieldset(*fieldset)
+
+    key = list(fieldset.values())
+    cached = getattr(fieldset, '_json_schema', None)
+    if cached is None or cached[0] != key:
+        result = fieldset_schema(fieldset)
+        result['$schema'] = JSON_SCHEMA
+        cached = fieldset._json_schema = (key, result)
+
+    return cached[1]
+
+
+def fieldset_schema(fieldset):
+    """ Return JSON schema of fieldset object """
+    result = {'type': 'object', 'properties': {}}
+    if fieldset.title:
+        result['title'] = text_type(fieldset.title)
+    if fieldset.description:
+        result['description'] = text_type(fieldset.description)
+
+    required = []
+    for name, item in fieldset.items():
+        if isinstance(item, Fieldset):
+            schema = result['properties'][name] = fieldset_schema(item)
+        elif isinstance(item, Field):
+            schema = result['properties'][name] = field_schema(item)
+        else:
+            continue
+
+        if schema.get('type') == 'object':
+            # object is required if it has required properties
+            if 'required' in schema:
+                required.append(name)
+        elif item.required:
+            required.append(name)
+
+    if required:
+        result['required'] = required
+
+    return result
+
+
+def field_schema(field):
+    """ Return JSON schema of field, field could provide
+    ``json_schema()`` method """
+    if hasattr(field, 'json_schema'):
+        return field.json_schema()
+
+    if isinstance(field, CompositeField):
+        result = fieldset_schema(field.fields)
+    else:
+        result = {}
+        for cls, schema in FIELD_SCHEMAS:
+            if isinstance(field, cls):
+                result = dict(schema)
+                break
+
+    if field.title:
+        result['title'] = text_type(field.title)
+    if field.description:
+        result['description'] = text_type(field.description)
+    if isinstance(field.default, _json_types):
+        result['default'] = field.default
+
+    # static vocabulary
+    if isinstance(field, fields.VocabularyField) and \
+            not isinstance(field, (fields.BoolField,
+                                   fields.DependentChoiceField)) and \
+            field.voc_factory is None:
+        tokens = [term.token for term in field.vocabulary]
+        if result.get('type') == 'array':
+            result['items'] = {'type': 'string', 'enum': tokens}
+        else:
+            result['enum'] = tokens
+
+    if field.validator is not None:
+        validator_schema(field.validator, result)
+
+    # empty string is missing value of text fields
+    if field.required and result.get('type') == 'string' and \
+            field.missing == '' and not result.get('minLength'):
+        result['minLength'] = 1
+
+    return result
+
+
+def validator_schema(validator, result):
+    """ Add constraints of validator to field JSON schema """
+    if isinstance(validator, All):
+        for v in validator.validators:
+            validator_schema(v, result)
+        return
+
+    constraints = {}
+    if isinstance(validator, Email):
+        constraints['format'] = 'email'
+    elif isinstance(validator, Regex):
+        pattern = getattr(validator.match_object, 'pattern', None)
+        # regexp flags are not supported by json schema, json schema
+        # pattern is not anchored, Regex matches at start of value
+        if isinstance(pattern, string_types) and \
+                not validator.match_object.flags & ~re.UNICODE and \
+                _non_ecma_re.search(pattern) is None:
+            constraints['pattern'] = '^(?:%s)' % pattern
+    elif isinstance(validator, Length):
+        array = result.get('type') == 'array'
+        if validator.min is not None:
+            constraints['minItems' if array else 'minLength'] = validator.min
+        if validator.max is not None:
+            constraints['maxItems' if array else 'maxLength'] = validator.max
+    elif isinstance(validator, Range):
+        if _is_number(validator.min):
+            constraints['minimum'] = validator.min
+        if _is_number(validator.max):
+            constraints['maximum'] = validator.max
+    elif isinstance(validator, OneOf):
+        choices = list(validator.choices)
+        if all(isinstance(c, _json_types) for c in choices):
+            constraints['enum'] = choices
+
+    for name, value in constraints.items():
+        if name in result:
+            result.setdefault('allOf', []).append({name: value})
+        else:
+            result[name] = value
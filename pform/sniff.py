@@ -0,0 +1,174 @@
+""" File content type sniffing by magic numbers """
+
+SNIFF_SIZE = 4096
+
+# (offset, magic bytes, mimetype)
+MAGIC = (
+    (0, b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (0, b'\xff\xd8\xff', 'image/jpeg'),
+    (0, b'GIF87a', 'image/gif'),
+    (0, b'GIF89a', 'image/gif'),
+    (0, b'II*\x00', 'image/tiff'),
+    (0, b'MM\x00*', 'image/tiff'),
+    (0, b'\x00\x00\x01\x00', 'image/x-icon'),
+    (0, b'%PDF-', 'application/pdf'),
+    (0, b'%!PS', 'application/postscript'),
+    (0, b'{\\rtf', 'application/rtf'),
+    (0, b'PK\x03\x04', 'application/zip'),
+    (0, b'PK\x05\x06', 'application/zip'),
+    (0, b'\x1f\x8b', 'application/gzip'),
+    (0, b'BZh', 'application/x-bzip2'),
+    (0, b'7z\xbc\xaf\x27\x1c', 'application/x-7z-compressed'),
+    (0, b'Rar!\x1a\x07', 'application/x-rar-compressed'),
+    (0, b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'application/x-ole-storage'),
+    (257, b'ustar', 'application/x-tar'),
+    (0, b'ID3', 'audio/mpeg'),
+    (0, b'\xff\xfb', 'audio/mpeg'),
+    (0, b'OggS', 'audio/ogg'),
+    (0, b'fLaC', 'audio/flac'),
+    (4, b'ftyp', 'video/mp4'),
+    (0, b'\x1a\x45\xdf\xa3', 'video/webm'),
+)
+
+# RIFF containers, format is stored at offset 8
+RIFF = {
+    b'WEBP': 'image/webp',
+    b'WAVE': 'audio/wav',
+    b'AVI ': 'video/x-msvideo',
+}
+
+# size of BMP DIB header, stored at offset 14
+BMP_HEADERS = (12, 40, 52, 56, 64, 108, 124)
+
+# text formats, checked against lowercased start of data
+TEXT_MAGIC = (
+    (b'<?xml', 'application/xml'),
+    (b'<svg', 'image/svg+xml'),
+    (b'<!doctype html', 'text/html'),
+    (b'<html', 'text/html'),
+)
+
+# declared type is accepted if it is known alias of sniffed type
+ALIASES = {
+    'image/jpg': 'image/jpeg',
+    'image/pjpeg': 'image/jpeg',
+    'image/x-png': 'image/png',
+    'image/x-ms-bmp': 'image/bmp',
+    'image/x-bmp': 'image/bmp',
+    'image/vnd.microsoft.icon': 'image/x-icon',
+    'application/x-pdf': 'application/pdf',
+    'application/x-zip-compressed': 'application/zip',
+    'application/x-gzip': 'application/gzip',
+    'audio/mp3': 'audio/mpeg',
+    'audio/x-wav': 'audio/wav',
+    'audio/x-flac': 'audio/flac',
+    'video/avi': 'video/x-msvideo',
+}
+
+# declared type is accepted if it refines sniffed generic type,
+# i.e. .docx is zip archive, .csv is plain text
+GENERIC = {
+    'text/plain': frozenset((
+        'text/csv',
+        'text/tab-separated-values',
+        'text/markdown',
+        'text/x-markdown',
+        'text/calendar',
+        'text/vcard',
+        'text/x-vcard',
+    )),
+    'application/xml': frozenset((
+        'text/xml',
+        'application/atom+xml',
+        'application/rss+xml',
+        'application/xhtml+xml',
+    )),
+    'application/zip': frozenset((
+        'application/vnd.openxmlformats-officedocument'
+        '.wordprocessingml.document',
+        'application/vnd.openxmlformats-officedocument'
+        '.spreadsheetml.sheet',
+        'application/vnd.openxmlformats-officedocument'
+        '.presentationml.presentation',
+        'application/vnd.oasis.opendocument.text',
+        'application/vnd.oasis.opendocument.spreadsheet',
+        'application/vnd.oasis.opendocument.presentation',
+        'application/vnd.oasis.opendocument.graphics',
+        'application/epub+zip',
+        'application/java-archive',
+    )),
+    'application/x-ole-storage': frozenset((
+        'application/msword',
+        'application/vnd.ms-excel',
+        'application/vnd.ms-powerpoint',
+        'application/vnd.ms-outlook',
+        'application/vnd.visio',
+    )),
+}
+
+
+def sniff(data):
+    """ Return mimetype of ``data`` or ``None`` if type is unknown """
+    for offset, magic, mimetype in MAGIC:
+        if data[offset:offset+len(magic)] == magic:
+            return mimetype
+
+    if data[:4] == b'RIFF' and data[8:12] in RIFF:
+        return RIFF[data[8:12]]
+
+    if data[:2] == b'BM' and len(data) >= 18:
+        size = bytearray(data[14:18])
+        if size[0] + (size[1] << 8) + (size[2] << 16) + (size[3] << 24) \
+                in BMP_HEADERS:
+            return 'image/bmp'
+
+    head = data.lstrip()[:256].lower()
+    if head.startswith(b'\xef\xbb\xbf'):
+        head = head[3:]
+
+    for magic, mimetype in TEXT_MAGIC:
+        if head.startswith(magic):
+            if mimetype == 'application/xml' and b'<svg' in data[:1024]:
+                return 'image/svg+xml'
+            return mimetype
+
+    if b'\x00' not in data:
+        try:
+            data.decode('utf-8')
+        except UnicodeDecodeError as e:
+            # data could be cut in the middle of multibyte sequence
+            if e.start < len(data) - 3:
+                return None
+        return 'text/plain'
+
+
+def sniff_mimetype(fp, size=SNIFF_SIZE):
+    """ Return mimetype of file content, only first ``size`` bytes
+    are read, file position is not changed """
+    pos = fp.tell()
+    try:
+        fp.seek(0)
+        data = fp.read(size)
+    finally:
+        fp.seek(pos)
+
+    if not isinstance(data, bytes):
+        data = data.encode('latin1')
+
+    return sniff(data)
+
+
+def resolve_mimetype(sniffed, declared):
+    """ Return effective mimetype, declared mimetype is used only
+    if it is alias of sniffed type or refines sniffed generic type """
+    if sniffed is None:
+        return 'application/octet-stream'
+
+    declared = (declared or '').lower()
+    if ALIASES.get(declared) == sniffed:
+        return declared
+
+    if declared in GENERIC.get(sniffed, ()):
+        return declared
+
+    return sniffed
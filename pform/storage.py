@@ -0,0 +1,164 @@
+""" Content addressed file storage """
+import os
+import hashlib
+import tempfile
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _makedirs(path):
+    try:
+        os.makedirs(path)
+    except OSError:
+        if not os.path.isdir(path):
+            raise
+
+
+class SizeExceeded(Exception):
+    """ Stored data exceeds size limit """
+
+
+class FileStore(object):
+    """ Local content addressed file store. Files are stored by digest
+    in fan-out directory structure, i.e. ``root/ab/cd/abcd...``.
+    Identical files are stored once.
+
+    ``path``: Store root directory.
+
+    ``algorithm``: Hash algorithm used for file addressing.
+
+    ``fanout``: Number of directory levels.
+
+    .. code-block:: python
+
+      store = FileStore('/var/lib/uploads')
+
+      field = pform.FileField('image', store=store, digests=('md5',))
+    """
+
+    def __init__(self, path, algorithm='sha256', fanout=2):
+        self.root = os.path.abspath(path)
+        self.algorithm = algorithm
+        self.fanout = fanout
+
+        self.tmp = os.path.join(self.root, 'tmp')
+        _makedirs(self.tmp)
+
+    def path(self, digest):
+        """ Return file path for ``digest`` """
+        parts = [digest[i*2:i*2+2] for i in range(self.fanout)]
+        return os.path.join(self.root, *(parts + [digest]))
+
+    def __contains__(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def open(self, digest):
+        """ Open stored file for reading """
+        return open(self.path(digest), 'rb')
+
+    def store(self, fp, digests=(), max_size=0):
+        """ Read ``fp`` and store its data, digests are computed while
+        data is written. Return dictionary with ``digest``, ``digests``,
+        ``size`` and ``path`` keys.
+
+        ``digests``: Names of additional hash algorithms.
+
+        ``max_size``: Raise ``SizeExceeded`` if data is larger than
+          ``max_size``.
+        """
+        staged = self.stage(fp, digests, max_size)
+        staged.commit()
+        return staged
+
+    def stage(self, fp, digests=(), max_size=0):
+        """ Read ``fp`` into temporary file of store, digests are
+        computed while data is written. Return :py:class:`StagedFile`,
+        file is moved to store with :py:meth:`StagedFile.commit`. """
+        hashers = dict((name, hashlib.new(name))
+                       for name in set(digests) | set((self.algorithm,)))
+
+        size = 0
+        fd, tmp = tempfile.mkstemp(dir=self.tmp)
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                while True:
+                    chunk = fp.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    if not isinstance(chunk, bytes):
+                        chunk = chunk.encode('latin1')
+
+                    size += len(chunk)
+                    if max_size and size > max_size:
+                        raise SizeExceeded(size)
+
+                    for hasher in hashers.values():
+                        hasher.update(chunk)
+                    out.write(chunk)
+        except:
+            os.unlink(tmp)
+            raise
+
+        hexdigests = dict((name, hasher.hexdigest())
+                          for name, hasher in hashers.items())
+        digest = hexdigests[self.algorithm]
+
+        return StagedFile(tmp, digest=digest, digests=hexdigests,
+                          size=size, path=self.path(digest))
+
+
+class StagedFile(dict):
+    """ File descriptor of data staged in :py:class:`FileStore`
+    temporary directory. ``path`` key is file path in store, file
+    exists there only after :py:meth:`commit`.
+
+    ``callbacks``: Functions called after file is committed. """
+
+    committed = False
+
+    def __init__(self, tmp, **kw):
+        super(StagedFile, self).__init__(**kw)
+        self.tmp = tmp
+        self.callbacks = []
+
+    def commit(self):
+        """ Move staged data to store, identical file is stored once """
+        if self.committed:
+            return
+
+        path = self['path']
+        try:
+            if os.path.exists(path):
+                os.unlink(self.tmp)
+            else:
+                _makedirs(os.path.dirname(path))
+                os.rename(self.tmp, path)
+        except:
+            self.discard()
+            raise
+
+        self.committed = True
+
+        for callback in self.callbacks:
+            callback()
+
+    def discard(self):
+        """ Remove staged data """
+        if not self.committed and os.path.exists(self.tmp):
+            os.unlink(self.tmp)
+
+
+def staged_files(data):
+    """ Return list of :py:class:`StagedFile` values of extracted
+    ``data``, nested dictionaries and lists are checked """
+    result = []
+    if isinstance(data, StagedFile):
+        result.append(data)
+    elif isinstance(data, dict):
+        for value in data.values():
+            result.extend(staged_files(value))
+    elif isinstance(data, (list, tuple)):
+        for value in data:
+            result.extend(staged_files(value))
+
+    return result
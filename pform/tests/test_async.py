@@ -0,0 +1,316 @@
+""" Tests for coroutine validators """
+import time
+import threading
+import asyncio
+from pyramid.testing import DummyRequest
+
+import pform
+from base import BaseTestCase
+
+DELAY = 0.2
+
+
+def async_validator(delay=DELAY, calls=None):
+    def validator(field, value):
+        if calls is not None:
+            calls.append(value)
+        error = None if value == 'ok' else pform.Invalid('Bad', field)
+        return asyncio.sleep(delay, result=error)
+    return validator
+
+
+def coro_frame(coro):
+    # native coroutines have ``cr_frame``, generator based ``gi_frame``
+    return getattr(coro, 'cr_frame', getattr(coro, 'gi_frame', None))
+
+
+def blocking_validator(barrier):
+    def validator(value):
+        barrier.wait()
+        return value == 'ok'
+    return pform.Function(validator, 'Bad', blocking=True)
+
+
+class TestAsyncValidators(BaseTestCase):
+
+    def _fieldset(self, params, *fields, **kw):
+        return pform.Fieldset(*fields, **kw).bind(self.request, params=params)
+
+    def test_extract_concurrent(self):
+        fs = self._fieldset(
+            {'f1': 'ok', 'f2': 'bad', 'f3': 'bad'},
+            pform.TextField('f1', validator=async_validator()),
+            pform.TextField('f2', validator=async_validator()),
+            pform.TextField('f3', validator=async_validator()))
+
+        started = time.time()
+        data, errors = fs.extract()
+        self.assertLess(time.time() - started, DELAY * 2.5)
+
+        self.assertEqual(data, {'f1': 'ok', 'f2': 'bad', 'f3': 'bad'})
+        self.assertEqual(len(errors), 2)
+        self.assertIn('f2', errors)
+        self.assertIn('f3', errors)
+        self.assertNotIn('f1', errors)
+
+    def test_extract_async(self):
+        fs = self._fieldset(
+            {'f1': 'ok', 'f2': 'bad'},
+            pform.TextField('f1', validator=async_validator()),
+            pform.TextField('f2', validator=async_validator()))
+
+        loop = asyncio.new_event_loop()
+        try:
+            data, errors = loop.run_until_complete(fs.extract_async(loop=loop))
+        finally:
+            loop.close()
+
+        self.assertEqual(data['f1'], 'ok')
+        self.assertEqual([err.field.name for err in errors], ['f2'])
+
+    def test_all_mixed(self):
+        calls = []
+        validator = pform.All(
+            pform.Length(min=2), async_validator(0, calls), ordered=True)
+        fs = self._fieldset({'f1': 'x'}, pform.TextField(
+            'f1', validator=validator))
+
+        data, errors = fs.extract()
+        self.assertEqual(len(errors[0].msg), 2)
+
+        validator.fail_fast = True
+        data, errors = fs.extract()
+        self.assertEqual(len(errors[0].msg), 1)
+        self.assertEqual(calls, ['x'])
+
+    def _tracked_validator(self, coros):
+        def validator(field, value):
+            coro = asyncio.sleep(0)
+            coros.append(coro)
+            return coro
+        return validator
+
+    def test_all_fail_fast_closes_coroutines(self):
+        coros = []
+        validator = pform.All(
+            self._tracked_validator(coros), pform.Length(min=3),
+            fail_fast=True)
+
+        error = validator.check(None, 'x')
+        self.assertEqual(len(error.suberrors), 1)
+        self.assertEqual(len(coros), 1)
+        self.assertIsNone(coro_frame(coros[0]))
+
+    def test_extract_error_closes_coroutines(self):
+        class BrokenField(pform.TextField):
+            def to_field(self, value):
+                raise ValueError(value)
+
+        coros = []
+        fs = self._fieldset(
+            {'f1': 'ok', 'f2': 'x'},
+            pform.TextField('f1', validator=self._tracked_validator(coros)),
+            BrokenField('f2'))
+
+        self.assertRaises(ValueError, fs.extract)
+        self.assertEqual(len(coros), 1)
+        self.assertIsNone(coro_frame(coros[0]))
+
+    def test_composite(self):
+        fs = self._fieldset(
+            {'address.street': 'bad', 'address.city': 'ok'},
+            pform.CompositeField('address', fields=(
+                pform.TextField('street', validator=async_validator(0)),
+                pform.TextField('city', validator=async_validator(0)))))
+
+        data, errors = fs.extract()
+        self.assertIsInstance(errors[0], pform.CompositeError)
+        self.assertIn('street', errors[0])
+        self.assertIn('address.street', errors)
+        self.assertNotIn('address.city', errors)
+
+    def test_fieldset_validator_deferred(self):
+        calls = []
+
+        def validator(fs, data):
+            calls.append(data)
+            raise pform.Invalid('Fieldset', fs)
+
+        fs = self._fieldset(
+            {'f1': 'bad'},
+            pform.TextField('f1', validator=async_validator(0)),
+            validator=validator)
+        data, errors = fs.extract()
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(calls, [])
+
+        fs = self._fieldset(
+            {'f1': 'ok'},
+            pform.TextField('f1', validator=async_validator(0)),
+            validator=validator)
+        data, errors = fs.extract()
+        self.assertEqual(calls, [{'f1': 'ok'}])
+        self.assertEqual(errors[0].msg, ['Fieldset'])
+
+    def test_nested_fieldset_validator_deferred(self):
+        fs = self._fieldset(
+            {'nested.f1': 'ok'},
+            pform.Fieldset(
+                pform.TextField('f1', validator=async_validator(0)),
+                name='nested',
+                validator=async_validator(0)),
+            validator=lambda fs, data: pform.Invalid('Parent', fs))
+
+        data, errors = fs.extract()
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(errors[0].msg, ['Bad'])
+
+    def test_validate_async(self):
+        fs = pform.Fieldset(validator=async_validator(0))
+
+        loop = asyncio.new_event_loop()
+        try:
+            self.assertIsNone(
+                loop.run_until_complete(fs.validate_async('ok', loop)))
+            self.assertRaises(
+                pform.Invalid, loop.run_until_complete,
+                fs.validate_async('bad', loop))
+        finally:
+            loop.close()
+
+    def test_validate_sync_bridge(self):
+        field = pform.TextField('f1', validator=async_validator(0))
+
+        self.assertIsNone(field.validate('ok'))
+        with self.assertRaises(pform.Invalid) as cm:
+            field.validate('bad')
+        self.assertEqual(cm.exception.msg, 'Bad')
+
+    def test_memoize(self):
+        calls = []
+        validator = pform.Memoize(async_validator(0, calls))
+        fs = self._fieldset(
+            {'f1': 'bad'}, pform.TextField('f1', validator=validator))
+
+        fs.extract()
+        data, errors = fs.extract()
+        self.assertEqual(errors[0].msg, 'Bad')
+        self.assertEqual(calls, ['bad'])
+
+    def test_form_extract_async(self):
+        class MyForm(pform.Form):
+            fields = pform.Fieldset(
+                pform.TextField('f1', validator=async_validator(0)))
+
+        request = DummyRequest()
+        request.POST = {'f1': 'bad'}
+
+        form = MyForm(None, request)
+        form.update_form()
+
+        loop = asyncio.new_event_loop()
+        try:
+            data, errors = loop.run_until_complete(form.extract_async(loop))
+        finally:
+            loop.close()
+
+        self.assertEqual(errors[0].msg, 'Bad')
+        self.assertIs(form.widgets['f1'].error, errors[0])
+
+
+class TestBlockingValidators(BaseTestCase):
+
+    def _fieldset(self, params, *fields, **kw):
+        return pform.Fieldset(*fields, **kw).bind(self.request, params=params)
+
+    def test_extract_concurrent(self):
+        barrier = threading.Barrier(3, timeout=5)
+        fs = self._fieldset(
+            {'f1': 'bad', 'f2': 'ok', 'f3': 'bad'},
+            pform.TextField('f1', validator=blocking_validator(barrier)),
+            pform.TextField('f2', validator=blocking_validator(barrier)),
+            pform.TextField('f3', validator=blocking_validator(barrier)))
+
+        data, errors = fs.extract()
+
+        self.assertEqual([e.field.name for e in errors], ['f1', 'f3'])
+        self.assertEqual(errors[0].msg, 'Bad')
+
+    def test_errors_order(self):
+        barrier = threading.Barrier(2, timeout=5)
+        fs = self._fieldset(
+            {'f1': 'bad', 'f2': '', 'f3': 'bad', 'f4': 'bad', 'f5': 'bad'},
+            pform.TextField('f1', validator=blocking_validator(barrier)),
+            pform.TextField('f2'),
+            pform.TextField('f3', validator=async_validator(0)),
+            pform.TextField('f4', validator=blocking_validator(barrier)),
+            pform.TextField('f5', validator=async_validator(0)))
+
+        data, errors = fs.extract()
+
+        self.assertEqual([e.field.name for e in errors],
+                         ['f1', 'f2', 'f3', 'f4', 'f5'])
+
+    def test_composite(self):
+        barrier = threading.Barrier(2, timeout=5)
+        fs = self._fieldset(
+            {'address.street': 'bad', 'address.city': 'bad'},
+            pform.CompositeField(
+                'address',
+                fields=(
+                    pform.TextField(
+                        'street', validator=blocking_validator(barrier)),
+                    pform.TextField(
+                        'city', validator=blocking_validator(barrier)))))
+
+        data, errors = fs.extract()
+
+        self.assertEqual(len(errors), 1)
+        self.assertIn('address', errors)
+
+    def test_max_concurrency(self):
+        lock = threading.Lock()
+        state = {'running': 0, 'max': 0}
+
+        def validator(value):
+            with lock:
+                state['running'] += 1
+                state['max'] = max(state['max'], state['running'])
+            time.sleep(0.02)
+            with lock:
+                state['running'] -= 1
+            return True
+
+        fs = self._fieldset(
+            dict(('f%s' % i, 'ok') for i in range(6)),
+            *[pform.TextField('f%s' % i, validator=pform.Function(
+                validator, blocking=True)) for i in range(6)],
+            max_concurrency=2)
+
+        data, errors = fs.extract()
+
+        self.assertFalse(errors)
+        self.assertEqual(state['max'], 2)
+
+    def test_extract_async(self):
+        barrier = threading.Barrier(2, timeout=5)
+        fs = self._fieldset(
+            {'f1': 'bad', 'f2': 'ok'},
+            pform.TextField('f1', validator=blocking_validator(barrier)),
+            pform.TextField('f2', validator=blocking_validator(barrier)))
+
+        loop = asyncio.new_event_loop()
+        try:
+            data, errors = loop.run_until_complete(fs.extract_async(loop=loop))
+        finally:
+            loop.close()
+
+        self.assertEqual([e.field.name for e in errors], ['f1'])
+
+    def test_validate_sync(self):
+        field = pform.TextField(
+            'f1', validator=pform.Function(lambda v: v == 'ok', 'Bad',
+                                           blocking=True))
+
+        self.assertIsNone(field.validate('ok'))
+        self.assertRaises(pform.Invalid, field.validate, 'bad')
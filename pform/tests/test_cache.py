@@ -0,0 +1,75 @@
+""" Tests for L{pform.cache} """
+from base import TestCase
+
+
+class TestLRUCache(TestCase):
+
+    def _makeOne(self, **kw):
+        from pform.cache import LRUCache
+        return LRUCache(**kw)
+
+    def test_get_set(self):
+        cache = self._makeOne()
+        self.assertIsNone(cache.get('key'))
+
+        cache.set('key', 'value')
+        self.assertEqual(cache.get('key'), 'value')
+        self.assertEqual(cache.stats(),
+                         {'hits': 1, 'misses': 1, 'size': 1, 'maxsize': 128})
+
+    def test_maxsize(self):
+        cache = self._makeOne(maxsize=2)
+        cache.set(1, 1)
+        cache.set(2, 2)
+        cache.get(1)
+        cache.set(3, 3)
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get(1), 1)
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(cache.get(3), 3)
+
+    def test_ttl(self):
+        now = [100]
+        cache = self._makeOne(ttl=10, timer=lambda: now[0])
+        cache.set('key', 'value')
+        self.assertEqual(cache.get('key'), 'value')
+
+        now[0] = 110
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(len(cache), 0)
+
+    def test_get_or_create(self):
+        data = []
+        def creator():
+            data.append(1)
+            return 'value'
+
+        cache = self._makeOne()
+        self.assertEqual(cache.get_or_create('key', creator), 'value')
+        self.assertEqual(cache.get_or_create('key', creator), 'value')
+        self.assertEqual(len(data), 1)
+
+    def test_invalidate(self):
+        cache = self._makeOne()
+        cache.set(1, 1)
+        cache.set(2, 2)
+        cache.set(3, 3)
+
+        cache.invalidate(1, 2)
+        self.assertEqual(len(cache), 1)
+
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+    def test_request_cache(self):
+        from pform.cache import request_cache
+
+        class Request(object):
+            pass
+
+        request = Request()
+        storage = request_cache(request, 'test')
+        self.assertEqual(storage, {})
+        self.assertIs(request_cache(request, 'test'), storage)
+        self.assertIsNone(request_cache(object(), 'test'))
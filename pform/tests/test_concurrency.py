@@ -0,0 +1,236 @@
+""" Tests for L{pform.concurrency} """
+import threading
+from base import TestCase, BaseTestCase
+
+import pform
+
+
+class TestDeferred(TestCase):
+
+    def test_deferred(self):
+        from pform.concurrency import Deferred, current
+
+        barrier = threading.Barrier(2, timeout=5)
+        result = {}
+
+        def func(value):
+            barrier.wait()
+            return value
+
+        with Deferred() as deferred:
+            self.assertIs(current(), deferred)
+            deferred.add(lambda: func(1),
+                         lambda val: result.setdefault('one', val))
+            deferred.add(lambda: func(2),
+                         lambda val: result.setdefault('two', val))
+
+        self.assertIsNone(current())
+        self.assertEqual(result, {'one': 1, 'two': 2})
+
+    def test_deferred_coroutines(self):
+        import asyncio
+        from pform.concurrency import Deferred
+
+        result = []
+        with Deferred() as deferred:
+            deferred.add(lambda: asyncio.sleep(0, result=1), result.append)
+            deferred.add(lambda: 2, result.append)
+
+        self.assertEqual(result, [1, 2])
+
+    def test_deferred_key(self):
+        from pform.concurrency import Deferred
+
+        calls = []
+        result = []
+
+        def func(value):
+            calls.append(value)
+            return value
+
+        with Deferred() as deferred:
+            deferred.add(lambda: func(1), result.append, 'one')
+            deferred.add(lambda: func(1), result.append, 'one')
+            deferred.add(lambda: func(2), result.append)
+
+        self.assertEqual(calls, [1, 2])
+        self.assertEqual(result, [1, 1, 2])
+
+    def test_deferred_exception(self):
+        from pform.concurrency import Deferred
+
+        def func():
+            raise ValueError()
+
+        deferred = Deferred()
+        deferred.add(func, None)
+        deferred.add(lambda: 1, None)
+        self.assertRaises(ValueError, deferred.run)
+
+    def test_run_coroutines(self):
+        import asyncio
+        from pform.concurrency import run_coroutines
+
+        result = run_coroutines(
+            [asyncio.sleep(0, result=1),
+             asyncio.wait_for(asyncio.sleep(5), timeout=0)])
+
+        self.assertEqual(result[0], 1)
+        self.assertIsInstance(result[1], asyncio.TimeoutError)
+
+    def test_run_tasks(self):
+        import asyncio
+        from pform.concurrency import Blocking, run_tasks
+
+        barrier = threading.Barrier(2, timeout=5)
+
+        def func(value):
+            barrier.wait()
+            return value
+
+        def error():
+            raise ValueError()
+
+        result = run_tasks([Blocking(lambda: func(1)),
+                            asyncio.sleep(0, result=2),
+                            Blocking(lambda: func(3)),
+                            Blocking(error)])
+
+        self.assertEqual(result[:3], [1, 2, 3])
+        self.assertIsInstance(result[3], ValueError)
+
+
+class TestLimitedExecutor(TestCase):
+
+    def test_limit(self):
+        from pform.concurrency import LimitedExecutor, get_executor
+
+        lock = threading.Lock()
+        state = {'running': 0, 'max': 0}
+        event = threading.Event()
+
+        def func(value):
+            with lock:
+                state['running'] += 1
+                state['max'] = max(state['max'], state['running'])
+            event.wait(0.05)
+            with lock:
+                state['running'] -= 1
+            return value
+
+        executor = LimitedExecutor(get_executor(), 2)
+        futures = [executor.submit(lambda i=i: func(i)) for i in range(6)]
+
+        self.assertEqual([f.result(5) for f in futures], list(range(6)))
+        self.assertEqual(state['max'], 2)
+        self.assertEqual(executor.running, 0)
+
+    def test_exception(self):
+        from pform.concurrency import LimitedExecutor, get_executor
+
+        def func():
+            raise ValueError()
+
+        executor = LimitedExecutor(get_executor(), 1)
+        self.assertRaises(ValueError, executor.submit(func).result, 5)
+        self.assertEqual(executor.submit(lambda: 1).result(5), 1)
+
+
+class TestConcurrentBind(BaseTestCase):
+
+    def test_concurrent_bind(self):
+        barrier = threading.Barrier(3, timeout=5)
+
+        def factory(request):
+            barrier.wait()
+            return pform.Vocabulary('one')
+
+        fieldset = pform.Fieldset(
+            pform.ChoiceField('one', voc_factory=factory),
+            pform.ChoiceField('two', voc_factory=factory),
+            pform.CompositeField('composite', fields=(
+                pform.ChoiceField('three', voc_factory=factory),)),
+            concurrent=True)
+
+        fs = fieldset.bind(self.request)
+        self.assertIn('one', fs['one'].vocabulary)
+        self.assertIn('one', fs['two'].vocabulary)
+        self.assertIn('one', fs['composite'].fields['three'].vocabulary)
+
+    def test_concurrent_bind_executor(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        executor = ThreadPoolExecutor(max_workers=2)
+        threads = set()
+
+        def factory(request):
+            threads.add(threading.current_thread())
+            return pform.Vocabulary('one')
+
+        fieldset = pform.Fieldset(
+            pform.ChoiceField('one', voc_factory=factory),
+            pform.ChoiceField('two', voc_factory=factory),
+            concurrent=executor)
+
+        fieldset.bind(self.request)
+        executor.shutdown()
+        self.assertNotIn(threading.current_thread(), threads)
+
+    def test_concurrent_bind_coroutine_cache(self):
+        import asyncio
+
+        cache = pform.LRUCache()
+
+        def factory(request):
+            return asyncio.sleep(0, result=pform.Vocabulary('one'))
+
+        fieldset = pform.Fieldset(
+            pform.ChoiceField('one', voc_factory=factory, voc_cache=cache),
+            pform.ChoiceField('two', voc_factory=factory),
+            concurrent=True)
+
+        fs1 = fieldset.bind(self.request)
+        fs2 = fieldset.bind(self.request)
+        self.assertIn('one', fs1['one'].vocabulary)
+        self.assertIs(fs1['one'].vocabulary, fs2['one'].vocabulary)
+        self.assertEqual(len(cache), 1)
+
+    def test_concurrent_bind_request_cache(self):
+        lock = threading.Lock()
+        calls = []
+
+        def factory(request):
+            with lock:
+                calls.append(request)
+            threading.Event().wait(0.05)
+            return pform.Vocabulary('one')
+
+        fieldset = pform.Fieldset(
+            *[pform.ChoiceField(name, voc_factory=factory,
+                                voc_cache='request')
+              for name in ('one', 'two', 'three', 'four')],
+            concurrent=True)
+
+        fs = fieldset.bind(self.request)
+        self.assertEqual(len(calls), 1)
+        self.assertIs(fs['one'].vocabulary, fs['four'].vocabulary)
+
+        fieldset.bind(self.request)
+        self.assertEqual(len(calls), 1)
+
+    def test_concurrent_bind_threadlocals(self):
+        from pyramid.threadlocal import get_current_request
+
+        requests = []
+
+        def factory(request):
+            requests.append(get_current_request())
+            return pform.Vocabulary('one')
+
+        fieldset = pform.Fieldset(
+            pform.ChoiceField('one', voc_factory=factory),
+            pform.ChoiceField('two', voc_factory=factory),
+            concurrent=True)
+
+        fieldset.bind(self.request)
+        self.assertEqual(requests, [self.request, self.request])
@@ -31,6 +31,13 @@ class TestFieldset(BaseTestCase):
         self.config.provide_form_field('my-field', MyField)
         self.assertIs(pform.get_field_factory(self.request, 'my-field'), MyField)
 
+    def test_provide_form(self):
+        class MyForm(pform.Form):
+            """ """
+
+        self.config.provide_form('my-form', MyForm)
+        self.assertIs(pform.get_form_factory(self.request, 'my-form'), MyForm)
+
     def test_conflict(self):
 
         class MyField(pform.Field):
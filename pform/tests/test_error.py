@@ -56,6 +56,36 @@ class TestInvalid(BaseTestCase):
         err = Invalid('${val} message', mapping={'val': 'Error'})
         self.assertEqual(str(err), '${val} message')
 
+    def test_str_cached(self):
+        from pform import Invalid, Field
+
+        calls = []
+
+        class Localizer(object):
+            def translate(self, msg, mapping=None):
+                calls.append(msg)
+                return msg.upper()
+
+        self.request.localizer = Localizer()
+        f = Field(name='test')
+        f.request = self.request
+
+        err = Invalid('message', f)
+        self.assertEqual(str(err), 'MESSAGE')
+        self.assertEqual(str(err), 'MESSAGE')
+        self.assertEqual(calls, ['message'])
+
+        err.msg = 'changed'
+        self.assertEqual(str(err), 'CHANGED')
+        self.assertEqual(calls, ['message', 'changed'])
+
+    def test_localizer_per_request(self):
+        from pform.interfaces import get_request_localizer
+
+        localizer = get_request_localizer(self.request)
+        del self.request.localizer
+        self.assertIs(get_request_localizer(self.request), localizer)
+
     def test_get_suberror_ctor(self):
         from pform import Invalid
 
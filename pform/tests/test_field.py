@@ -131,6 +131,35 @@ class TestField(BaseTestCase):
             field.validate(pform.null)
         self.assertEqual(field.error_required, cm.exception.msg)
 
+    def test_field_check(self):
+        field = pform.Field('test')
+
+        self.assertIsNone(field.check(''))
+        self.assertEqual(field.check(field.missing).msg, 'Required')
+
+        field = pform.Field('test', validator=pform.Length(max=1))
+        self.assertEqual(field.check('abc').msg.mapping, {'max': 1})
+
+    def test_check_field_validate_override(self):
+        from pform.field import check_field
+
+        class MyField(pform.TextField):
+            def validate(self, value):
+                super(MyField, self).validate(value)
+                if value != 'ok':
+                    raise pform.Invalid('Not ok', self)
+
+        field = MyField('test')
+        self.assertIsNone(check_field(field, 'ok'))
+        self.assertEqual(check_field(field, 'bad').msg, 'Not ok')
+        self.assertEqual(check_field(field, pform.null).msg, 'Required')
+
+        class MyField2(MyField):
+            def check(self, value):
+                return pform.Invalid('Check', self)
+
+        self.assertEqual(check_field(MyField2('test'), 'ok').msg, 'Check')
+
     def test_field_extract(self):
         field = pform.Field('test')
 
@@ -170,6 +199,53 @@ class TestField(BaseTestCase):
         widget.update()
         self.assertEqual(widget.form_value, 'form value')
 
+    def test_field_bound_form_value(self):
+        calls = []
+
+        class MyField(pform.Field):
+            def to_form(self, value):
+                calls.append(value)
+                return str(value)
+
+        widget = MyField('test').bind(object(), '', 10, {'test': '11'})
+        widget.update()
+        self.assertEqual(widget.form_value, '11')
+        self.assertEqual(widget.get_bound_form_value(), '10')
+        self.assertEqual(widget.get_bound_form_value(), '10')
+        self.assertEqual(calls, [10])
+
+    def test_field_is_changed(self):
+        field = pform.TextField('test', default='default')
+
+        widget = field.bind(object(), '', 'content', {})
+        self.assertFalse(widget.is_changed())
+
+        widget = field.bind(object(), '', 'content', {'test': 'content'})
+        self.assertFalse(widget.is_changed())
+        self.assertTrue(widget.is_changed('changed'))
+
+        widget = field.bind(object(), '', pform.null, {'test': 'default'})
+        self.assertFalse(widget.is_changed())
+
+        widget = pform.TextField('test').bind(
+            object(), '', pform.null, {'test': ''})
+        self.assertFalse(widget.is_changed())
+
+        widget = field.bind(object(), '', 'content', {'test': 'changed'})
+        self.assertTrue(widget.is_changed())
+
+    def test_field_is_changed_omit_empty(self):
+        field = pform.MultiChoiceField('tags', vocabulary=('a', 'b'))
+
+        widget = field.bind(object(), '', ['a'], {})
+        self.assertTrue(widget.is_changed())
+
+        widget = field.bind(object(), '', [], {})
+        self.assertFalse(widget.is_changed())
+
+        widget = pform.BoolField('flag').bind(object(), '', True, {})
+        self.assertTrue(widget.is_changed())
+
     def test_field_update_with_error(self):
         class MyField(pform.Field):
             def to_form(self, value):
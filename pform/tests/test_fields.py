@@ -217,6 +217,151 @@ class TestVocabularyField(BaseTestCase):
         field.bind(self.request, 'p.', None, None, context)
         self.assertIs(data[-1], context)
 
+    def test_voc_cache(self):
+        from pform.fields import VocabularyField
+
+        data = []
+        def factory(context):
+            data.append(context)
+            return pform.Vocabulary('one')
+
+        cache = pform.LRUCache()
+        field = VocabularyField('test', voc_factory=factory, voc_cache=cache)
+
+        clone1 = field.bind(self.request, 'p.', None, None)
+        clone2 = field.bind(self.make_request(), 'p.', None, None)
+        self.assertIs(clone1.vocabulary, clone2.vocabulary)
+        self.assertEqual(len(data), 1)
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 1)
+
+        clone2.invalidate_vocabulary(None)
+        field.bind(self.request, 'p.', None, None)
+        self.assertEqual(len(data), 2)
+
+    def test_voc_cache_key(self):
+        from pform.fields import VocabularyField
+
+        data = []
+        def factory(form):
+            data.append(form)
+            return pform.Vocabulary(form.tenant)
+
+        def cache_key(form):
+            return form.tenant
+
+        class Context(object):
+            def __init__(self, tenant):
+                self.tenant = tenant
+
+        cache = pform.LRUCache()
+        field = VocabularyField('test', voc_factory=factory,
+                                voc_cache=cache, voc_cache_key=cache_key)
+
+        clone = field.bind(self.request, 'p.', None, None, Context('one'))
+        field.bind(self.request, 'p.', None, None, Context('one'))
+        field.bind(self.request, 'p.', None, None, Context('two'))
+        self.assertEqual(len(data), 2)
+        self.assertEqual(len(cache), 2)
+
+        clone.invalidate_vocabulary('one')
+        self.assertEqual(len(cache), 1)
+
+        clone.invalidate_vocabulary()
+        self.assertEqual(len(cache), 0)
+
+    def test_voc_cache_shared_same_name(self):
+        from pform.fields import VocabularyField
+
+        cache = pform.LRUCache()
+        field1 = VocabularyField(
+            'test', voc_cache=cache,
+            voc_factory=lambda context: pform.Vocabulary('one'))
+        field2 = VocabularyField(
+            'test', voc_cache=cache,
+            voc_factory=lambda context: pform.Vocabulary('two'))
+
+        clone1 = field1.bind(self.request, 'p.', None, None)
+        clone2 = field2.bind(self.request, 'p.', None, None)
+        self.assertEqual(clone1.vocabulary.get_term('one').token, 'one')
+        self.assertEqual(clone2.vocabulary.get_term('two').token, 'two')
+        self.assertEqual(len(cache), 2)
+
+    def test_voc_cache_request(self):
+        from pform.fields import VocabularyField
+
+        data = []
+        def factory(context):
+            data.append(context)
+            return pform.Vocabulary('one')
+
+        field = VocabularyField(
+            'test', voc_factory=factory, voc_cache='request')
+
+        clone1 = field.bind(self.request, 'p.', None, None)
+        clone2 = field.bind(self.request, 'p.', None, None)
+        self.assertIs(clone1.vocabulary, clone2.vocabulary)
+        self.assertEqual(len(data), 1)
+
+        field.bind(self.make_request(), 'p.', None, None)
+        self.assertEqual(len(data), 2)
+
+        # request can not hold cache
+        field.bind(object(), 'p.', None, None)
+        self.assertEqual(len(data), 3)
+
+    def test_voc_cache_request_shared(self):
+        from pform.fields import VocabularyField
+
+        data = []
+        def factory(request):
+            data.append(request)
+            return pform.Vocabulary('one')
+
+        field1 = VocabularyField(
+            'test1', voc_factory=factory, voc_cache='request')
+        field2 = VocabularyField(
+            'test2', voc_factory=factory, voc_cache='request')
+        composite = pform.CompositeField('composite', fields=(field2,))
+
+        class Form(object):
+            request = self.request
+
+        fs1 = pform.Fieldset(field1, composite).bind(
+            self.request, context=Form())
+        fs2 = pform.Fieldset(field1, composite).bind(
+            self.request, context=Form())
+
+        self.assertEqual(len(data), 1)
+        self.assertIs(fs1['test1'].vocabulary,
+                      fs2['composite'].fields['test2'].vocabulary)
+
+        fs1['test1'].invalidate_vocabulary()
+        field2.bind(self.request, 'p.', None, None, Form())
+        self.assertEqual(len(data), 2)
+
+    def test_vocabulary_registry(self):
+        from pform.vocabulary import get_vocabulary_registry
+
+        data = []
+        def factory(arg):
+            data.append(arg)
+            return pform.Vocabulary('one')
+
+        arg1, arg2 = object(), object()
+
+        registry = get_vocabulary_registry(self.request)
+        self.assertIs(registry, get_vocabulary_registry(self.request))
+
+        voc = registry.resolve(factory, arg1)
+        self.assertIs(voc, registry.resolve(factory, arg1))
+        self.assertIsNot(voc, registry.resolve(factory, arg2))
+        self.assertEqual(data, [arg1, arg2])
+        self.assertEqual(registry.hits, 1)
+
+        registry.forget(factory)
+        self.assertEqual(len(registry), 0)
+
     def test_voc_factory_mapper(self):
         from pform.fields import voc_factory_mapper
         m = mock.Mock()
@@ -336,6 +481,22 @@ class TestVocabularyField(BaseTestCase):
                            'value': 'three'}])
 
 
+    def test_vocabulary_field_sort_items(self):
+        voc = pform.Vocabulary(
+            (1, 'one', 'One'),
+            (2, 'two', 'Two'),
+            (3, 'three', 'Three'))
+
+        field = pform.ChoiceField('test', vocabulary=voc, sort_items=True)
+        field = field.bind(self.request, '', pform.null, {})
+        field.update()
+
+        self.assertEqual([item['label'] for item in field.items],
+                         ['One', 'Three', 'Two'])
+        self.assertEqual([item['id'] for item in field.items],
+                         ['test-0', 'test-1', 'test-2'])
+
+
 class TestBaseChoiceField(BaseTestCase):
 
     def _makeOne(self, name, **kw):
@@ -471,6 +632,86 @@ class TestChoiceField(BaseTestCase):
                            'value': 'two'}])
 
 
+class TestDependentChoiceField(BaseTestCase):
+
+    def _makeFieldset(self, provider):
+        return pform.Fieldset(
+            pform.ChoiceField(
+                'country', default='US', vocabulary=('US', 'KZ')),
+            pform.DependentChoiceField(
+                'state', parent='country', voc_provider=provider))
+
+    def test_ctor(self):
+        self.assertRaises(ValueError, pform.DependentChoiceField, 'state')
+        self.assertRaises(ValueError, pform.DependentChoiceField,
+                          'state', parent='country')
+
+    def test_vocabulary(self):
+        data = []
+        def provider(country):
+            data.append(country)
+            return {'US': ('TX', 'CA'), 'KZ': ('AL',)}[country]
+
+        fieldset = self._makeFieldset(provider)
+
+        fs = fieldset.bind(self.request, params=MultiDict({'country': 'KZ'}))
+        fs['state'].update()
+        self.assertEqual(
+            [item['value'] for item in fs['state'].items], ['AL'])
+
+        fs = fieldset.bind(self.request, {'country': 'US'})
+        fs['state'].update()
+        self.assertEqual(
+            [item['value'] for item in fs['state'].items], ['TX', 'CA'])
+
+        fs = fieldset.bind(self.request, params=MultiDict({'country': 'KZ'}))
+        fs['state'].update()
+        self.assertEqual(data, ['KZ', 'US'])
+
+        fs['state'].invalidate_vocabulary('KZ')
+        fs['state'].update()
+        self.assertEqual(data, ['KZ', 'US', 'KZ'])
+
+    def test_validate(self):
+        def provider(country):
+            return {'US': ('TX', 'CA'), 'KZ': ('AL',)}[country]
+
+        fieldset = self._makeFieldset(provider)
+
+        fs = fieldset.bind(self.request, params=MultiDict(
+            {'country': 'KZ', 'state': 'AL'}))
+        data, errors = fs.extract()
+        self.assertEqual(data, {'country': 'KZ', 'state': 'AL'})
+        self.assertFalse(errors)
+
+        fs = fieldset.bind(self.request, params=MultiDict(
+            {'country': 'US', 'state': 'AL'}))
+        data, errors = fs.extract()
+        self.assertEqual(len(errors), 1)
+        self.assertIs(errors[0].field, fs['state'])
+
+    def test_bind_without_fieldset(self):
+        data = []
+        def provider(country):
+            data.append(country)
+            return ()
+
+        field = pform.DependentChoiceField(
+            'state', parent='country', voc_provider=provider)
+
+        widget = field.bind(self.request, 'preview.', pform.null, {})
+        widget.update()
+        self.assertEqual(data, [pform.null])
+
+    def test_parent_not_found(self):
+        fieldset = pform.Fieldset(
+            pform.DependentChoiceField(
+                'state', parent='country', voc_provider=lambda c: ()))
+
+        fs = fieldset.bind(self.request)
+        self.assertRaises(ValueError, fs['state'].update)
+
+
 class TestMultiChoiceField(BaseTestCase):
 
     def _makeOne(self, name, **kw):
@@ -767,6 +1008,23 @@ class TestFileField(BaseTestCase):
         self.assertEqual('Maximum file size exceeded.', cm.exception.msg)
 
 
+    def test_validate_max_size_known_size(self):
+        request = self.make_request()
+
+        field = self._makeOne('test', max_size=10)
+        field = field.bind(request, '', 'content', {})
+
+        class FP(object):
+            def seek(self, *args):
+                raise AssertionError('seek is called')
+
+        with self.assertRaises(pform.Invalid) as cm:
+            field.validate({'fp': FP(), 'size': 11})
+
+        self.assertEqual('Maximum file size exceeded.', cm.exception.msg)
+        self.assertIsNone(field.validate({'fp': FP(), 'size': 10}))
+
+
 class TestOptionsField(BaseTestCase):
 
     def test_ctor(self):
@@ -1,6 +1,8 @@
 """
 Unit tests for L{pform.fieldset}
 """
+from webob.multidict import MultiDict
+
 import pform
 from base import BaseTestCase
 
@@ -192,6 +194,50 @@ class TestFieldset(BaseTestCase):
         self.assertEqual(errors[0].msg, 'Required')
         self.assertEqual(errors[1].msg, 'Required')
 
+    def test_fieldset_extract_max_errors(self):
+        calls = []
+
+        def validator(field, value):
+            calls.append(field.name)
+
+        fieldset = pform.Fieldset(
+            self._makeOne('f1'), self._makeOne('f2'),
+            pform.Fieldset(self._makeOne('f3'), name='fs'),
+            self._makeOne('f4', required=False, validator=validator),
+            max_errors=2).bind(object())
+
+        data, errors = fieldset.extract()
+        self.assertTrue(errors.stopped)
+        self.assertEqual(len(errors), 3)
+        self.assertEqual(errors[-1].name, 'max_errors')
+        self.assertEqual(errors[-1].mapping, {'max': 2})
+        self.assertIn('max_errors', errors)
+        self.assertEqual(calls, [])
+
+        data, errors = fieldset.extract(max_errors=0)
+        self.assertFalse(errors.stopped)
+        self.assertEqual(len(errors), 3)
+        self.assertEqual(calls, ['f4'])
+
+    def test_fieldset_extract_max_errors_nested(self):
+        fieldset = pform.Fieldset(
+            pform.Fieldset(
+                self._makeOne('f1'), self._makeOne('f2'), name='fs'),
+            self._makeOne('f3')).bind(object())
+
+        data, errors = fieldset.extract(max_errors=1)
+        self.assertTrue(errors.stopped)
+        self.assertEqual(len(errors), 2)
+        self.assertIs(errors[0].field, fieldset['fs']['f1'])
+
+        data, errors = fieldset.extract(max_errors=2)
+        self.assertTrue(errors.stopped)
+        self.assertEqual(len(errors), 3)
+
+        data, errors = fieldset.extract(max_errors=3)
+        self.assertFalse(errors.stopped)
+        self.assertEqual(len(errors), 3)
+
     def test_fieldset_extract(self):
         field = self._makeOne('test')
         fieldset = pform.Fieldset(field).bind(object(), params={'test': 'FORM'})
@@ -267,6 +313,56 @@ class TestFieldset(BaseTestCase):
         data, errors = fieldset.extract()
         self.assertEqual(len(errors), 1)
 
+    def test_fieldset_extract_changes_cleared(self):
+        fieldset = pform.Fieldset(
+            pform.MultiChoiceField(
+                'tags', vocabulary=('a', 'b'), required=False),
+            pform.TextField('title', required=False))
+
+        fs = fieldset.bind(self.request, {'tags': ['a'], 'title': 't'},
+                           MultiDict({'title': 't'}))
+        data, errors, changes = fs.extract_changes()
+        self.assertFalse(errors)
+        self.assertEqual(data['tags'], [])
+        self.assertEqual(changes, set(['tags']))
+
+    def test_fieldset_extract_changes(self):
+        calls = []
+
+        def validator(field, value):
+            calls.append(value)
+            if value == 'invalid':
+                raise pform.Invalid('Invalid', field)
+
+        fieldset = pform.Fieldset(
+            pform.TextField('f1', validator=validator),
+            pform.TextField('f2', validator=validator),
+            pform.TextField('f3', validator=validator),
+            pform.Fieldset(
+                pform.IntegerField('f4'), name='nested'),
+            pform.CompositeField('address', fields=(
+                pform.TextField('city', validator=validator),)),
+        ).bind(self.request,
+               {'f1': 'invalid', 'f2': 'two', 'f3': 'three',
+                'nested': {'f4': 4}, 'address': {'city': 'invalid'}},
+               {'f1': 'invalid', 'f2': 'changed', 'f3': '',
+                'nested.f4': '5', 'address.city': 'invalid'})
+
+        data, errors, changes = fieldset.extract_changes()
+
+        self.assertEqual(changes, set(['f2', 'f3', 'nested.f4']))
+        self.assertEqual(data['f2'], 'changed')
+        self.assertEqual(data['nested'], {'f4': 5})
+        self.assertEqual(calls, ['changed'])
+        self.assertEqual([e.field.name for e in errors], ['f3'])
+
+        del calls[:]
+        data, errors, changes = fieldset.extract_changes(
+            validate_unchanged=True)
+        self.assertEqual(calls, ['invalid', 'changed', 'invalid'])
+        self.assertEqual([e.field.name for e in errors],
+                         ['f1', 'f3', 'address'])
+
 
 class TestFieldsetErrors(BaseTestCase):
 
@@ -299,6 +395,73 @@ class TestFieldsetErrors(BaseTestCase):
         self.assertIn('field', errors)
         self.assertNotIn('field2', errors)
 
+    def test_fieldset_errors_get(self):
+        f = field.bind(self.request,'','',{})
+        f.name = 'field'
+
+        err1 = pform.Invalid('error1', f)
+        err2 = pform.Invalid('error2', name='named')
+
+        errors = pform.FieldsetErrors(object(), err1)
+        errors.append(err2)
+
+        self.assertEqual(errors.get('field'), [err1])
+        self.assertEqual(errors.get('named'), [err2])
+        self.assertIsNone(errors.get('unknown'))
+
+        errors.remove(err1)
+        self.assertNotIn('field', errors)
+        self.assertIn('named', errors)
+
+        del errors[0]
+        self.assertNotIn('named', errors)
+
+    def test_fieldset_errors_clear(self):
+        f = field.bind(self.request,'','',{})
+        errors = pform.FieldsetErrors(object(), pform.Invalid('error1', f))
+        self.assertIn('test', errors)
+
+        errors.clear()
+        self.assertNotIn('test', errors)
+        self.assertEqual(errors.msg, {})
+
+        errors.append(pform.Invalid('error1', f))
+        self.assertEqual(errors.msg, {'test': 'error1'})
+        errors *= 0
+        self.assertNotIn('test', errors)
+        self.assertEqual(errors.msg, {})
+
+    def test_fieldset_errors_composite(self):
+        fs = pform.Fieldset(
+            pform.CompositeField('address', fields=(
+                pform.TextField('street'),
+                pform.TextField('city')))).bind(self.request)
+
+        data, errors = fs.extract()
+        self.assertIn('address', errors)
+        self.assertIn('address.street', errors)
+        self.assertIn('address.city', errors)
+        self.assertNotIn('street', errors)
+        self.assertEqual(errors.get('address.city')[0].msg, 'Required')
+
+    def test_fieldset_errors_msg_cached(self):
+        err1 = pform.Invalid('error1', field.bind(self.request,'','',{}))
+        err2 = pform.Invalid('error2', field1.bind(self.request,'','',{}))
+
+        errors = pform.FieldsetErrors(object(), err1)
+        msg = errors.msg
+        self.assertEqual(msg, {'test': 'error1'})
+
+        # cached mapping is not exposed
+        msg['test'] = 'changed'
+        self.assertEqual(errors.msg, {'test': 'error1'})
+
+        errors.extend([err2])
+        self.assertEqual(errors.msg, {'test': 'error1', 'test1': 'error2'})
+
+        errors.pop()
+        self.assertEqual(errors.msg, {'test': 'error1'})
+
     def test_fieldset_add_field_error(self):
         f = field.bind(self.request,'','',{})
         f.name = 'field'
@@ -286,6 +286,48 @@ class TestForm(BaseTestCase):
         data, errors = form_ob.extract()
         self.assertEqual(data['test'], 'Test string')
 
+    def test_form_extract_max_errors(self):
+        import pform
+
+        class MyForm(pform.Form):
+            max_errors = 1
+            fields = pform.Fieldset(
+                pform.TextField('f1'), pform.TextField('f2'))
+
+            def validate(self, data, errors):
+                raise AssertionError('should not be called')
+
+        request = DummyRequest()
+        request.POST = {}
+
+        form_ob = MyForm(None, request)
+        form_ob.update_form()
+
+        data, errors = form_ob.extract()
+        self.assertTrue(errors.stopped)
+        self.assertEqual(len(errors), 2)
+        self.assertEqual(errors[0].msg, 'Required')
+        self.assertIsNone(errors[1].field)
+
+    def test_form_extract_changes(self):
+        import pform
+
+        class MyForm(pform.Form):
+            fields = pform.Fieldset(
+                pform.TextField('f1'), pform.TextField('f2'))
+            content = {'f1': 'one', 'f2': 'two'}
+
+        request = DummyRequest()
+        request.POST = {'f1': 'one', 'f2': 'changed'}
+
+        form_ob = MyForm(None, request)
+        form_ob.update_form()
+
+        data, errors, changes = form_ob.extract_changes()
+        self.assertFalse(errors)
+        self.assertEqual(changes, set(['f2']))
+        self.assertEqual(data, {'f1': 'one', 'f2': 'changed'})
+
     def test_form_render(self):
         import pform
 
@@ -651,3 +693,62 @@ class TestForm(BaseTestCase):
         form.validate_form({}, errors)
         self.assertEqual(len(errors), 1)
         self.assertEqual(errors[0].msg, 'error1')
+
+    def test_form_identity(self):
+        import pform
+        request = self.make_request(
+            POST={'__form_identity__': 'form2'})
+
+        form = pform.Form(object(), request)
+        self.assertEqual(form.form_identity(), 'form2')
+        self.assertFalse(form.is_submitted())
+
+        form = pform.Form(object(), request, prefix='form2.')
+        self.assertTrue(form.is_submitted())
+
+    def test_form_identity_read_once(self):
+        import pform
+        request = self.make_request(
+            POST={'__form_identity__': 'form2'})
+
+        pform.Form(object(), request).form_identity()
+        request.POST['__form_identity__'] = 'form1'
+
+        form = pform.Form(object(), request, prefix='form1.')
+        self.assertEqual(form.form_identity(), 'form2')
+
+    def test_form_identity_not_submitted(self):
+        import pform
+
+        form = pform.Form(object(), self.make_request())
+        self.assertIsNone(form.form_identity())
+        self.assertTrue(form.is_submitted())
+
+    def test_update_form_dispatch_identity(self):
+        import pform
+        request = self.make_request(
+            POST={'__form_identity__': 'form1',
+                  'form1.buttons.save': 'Save',
+                  'form2.buttons.save': 'Save',
+                  'test': 'posted'})
+
+        executed = []
+
+        class CustomForm(pform.Form):
+            fields = pform.Fieldset(pform.TextField('test'))
+
+            @pform.button('Save')
+            def save_handler(self):
+                executed.append(self.id)
+                return {'saved': self.id}
+
+        form1 = CustomForm(object(), request, prefix='form1.')
+        form2 = CustomForm(object(), request, prefix='form2.',
+                           content={'test': 'content2'})
+
+        self.assertEqual(form1.update_form(), {'saved': 'form1'})
+        self.assertEqual(form2.update_form(), {})
+        self.assertEqual(executed, ['form1'])
+
+        self.assertEqual(form1.widgets['test'].form_value, 'posted')
+        self.assertEqual(form2.widgets['test'].form_value, 'content2')
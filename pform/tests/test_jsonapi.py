@@ -0,0 +1,488 @@
+""" Tests for L{pform.jsonapi} """
+import json
+import decimal
+import datetime
+from pyramid.request import Request
+from pyramid.httpexceptions import HTTPBadRequest
+
+import pform
+from base import TestCase, BaseTestCase
+
+
+class TestJsonParams(TestCase):
+
+    def test_flatten(self):
+        from pform.jsonapi import JsonParams
+
+        params = JsonParams({'name': 'Nikolay', 'age': 35,
+                             'address': {'city': 'Almaty',
+                                         'geo': {'lat': 43.2}}})
+
+        self.assertEqual(params['age'], 35)
+        self.assertEqual(params['address.city'], 'Almaty')
+        self.assertEqual(params['address.geo.lat'], 43.2)
+        self.assertEqual(params['address']['city'], 'Almaty')
+        self.assertNotIn('city', params)
+
+    def test_getall(self):
+        from pform.jsonapi import JsonParams
+
+        params = JsonParams({'tags': ['a', 'b'], 'one': 'a', 'none': None})
+
+        self.assertEqual(params.getall('tags'), ['a', 'b'])
+        self.assertEqual(params.getall('one'), ['a'])
+        self.assertEqual(params.getall('none'), [])
+        self.assertEqual(params.getall('unknown'), [])
+
+
+class TestParseJsonParams(TestCase):
+
+    def _make_request(self, body):
+        return Request.blank('/', method='POST', body=body,
+                             content_type='application/json')
+
+    def test_parse(self):
+        from pform.jsonapi import parse_json_params
+
+        params = parse_json_params(
+            self._make_request(b'{"name": "test", "a": {"b": 1}}'))
+        self.assertEqual(params['a.b'], 1)
+
+        self.assertEqual(parse_json_params(self._make_request(b'')), {})
+
+    def test_parse_invalid(self):
+        from pform.jsonapi import parse_json_params
+
+        self.assertRaises(HTTPBadRequest, parse_json_params,
+                          self._make_request(b'{"name"'))
+        self.assertRaises(HTTPBadRequest, parse_json_params,
+                          self._make_request(b'[1, 2]'))
+
+
+class TestErrorsToJson(BaseTestCase):
+
+    def test_errors(self):
+        from pform.jsonapi import errors_to_json
+
+        field = pform.TextField('name')
+        composite = pform.CompositeField(
+            'address', fields=(pform.TextField('city'),))
+
+        errors = pform.FieldsetErrors(
+            None,
+            pform.Invalid('Required', field),
+            pform.CompositeError(
+                field=composite,
+                errors=[pform.Invalid('Bad city', name='city')]),
+            pform.Invalid('Form error'),
+            'Message')
+
+        result = errors_to_json(errors)
+        self.assertEqual(result, [
+            {'name': 'name', 'message': 'Required'},
+            {'name': 'address.city', 'message': 'Bad city'},
+            {'name': None, 'message': 'Form error'},
+            {'name': None, 'message': 'Message'}])
+        json.dumps(result)
+
+    def test_all_errors(self):
+        from pform.jsonapi import errors_to_json
+
+        field = pform.TextField(
+            'name', validator=pform.All(
+                pform.Length(min=3), pform.Regex('^[0-9]+$')))
+        fs = pform.Fieldset(field).bind(self.request, params={'name': 'a'})
+        data, errors = fs.extract()
+
+        result = errors_to_json(errors)
+        self.assertEqual(result, [
+            {'name': 'name', 'message': 'Shorter than minimum length 3'},
+            {'name': 'name',
+             'message': 'String does not match expected pattern'}])
+        json.dumps(result)
+
+
+class TestJsonForm(BaseTestCase):
+
+    def _make_form(self, data):
+        class MyForm(pform.Form):
+            json_mode = True
+            fields = pform.Fieldset(
+                pform.TextField('name'),
+                pform.IntegerField('age'),
+                pform.FloatField('ratio', required=False),
+                pform.BoolField('active'),
+                pform.DateField('born'),
+                pform.MultiChoiceField(
+                    'tags', vocabulary=('a', 'b', 'c')),
+                pform.CompositeField('address', fields=(
+                    pform.TextField('city'),
+                    pform.IntegerField('zip'))),
+                pform.Fieldset(
+                    pform.TextField('nick'), name='profile'))
+
+        request = self.make_request(
+            method='POST', body=json.dumps(data).encode('utf-8'),
+            content_type='application/json')
+        request.json_body = data
+
+        form = MyForm(None, request)
+        form.update_form()
+        return form
+
+    def test_extract(self):
+        form = self._make_form({
+            'name': 'Nikolay', 'age': 35, 'ratio': 0.5, 'active': False,
+            'born': '1980-01-02', 'tags': ['a', 'c'],
+            'address': {'city': 'Almaty', 'zip': 50000},
+            'profile': {'nick': 'fafhrd'}})
+
+        data, errors = form.extract()
+
+        self.assertFalse(errors)
+        self.assertEqual(data, {
+            'name': 'Nikolay', 'age': 35, 'ratio': 0.5, 'active': False,
+            'born': datetime.date(1980, 1, 2), 'tags': ['a', 'c'],
+            'address': {'city': 'Almaty', 'zip': 50000},
+            'profile': {'nick': 'fafhrd'}})
+
+    def test_extract_errors(self):
+        form = self._make_form({
+            'age': 'old', 'ratio': 1, 'active': True, 'born': '1980-01-02',
+            'tags': ['a'], 'address': {'city': 'Almaty', 'zip': 'x'},
+            'profile': {}})
+
+        data, errors = form.extract()
+
+        self.assertEqual(form.json_errors(errors), [
+            {'name': 'profile.nick', 'message': 'Required'},
+            {'name': 'name', 'message': 'Required'},
+            {'name': 'age', 'message': '"old" is not a number'},
+            {'name': 'address.zip', 'message': '"x" is not a number'}])
+
+    def test_extract_wrong_types(self):
+        form = self._make_form({
+            'name': None, 'age': 35, 'ratio': 0.5, 'active': None,
+            'born': '1980-01-02',
+            'tags': [{'a': 1}], 'address': {'city': 5, 'zip': 50000},
+            'profile': {'nick': ['fafhrd']}})
+
+        data, errors = form.extract()
+
+        self.assertEqual(form.json_errors(errors), [
+            {'name': 'profile.nick', 'message': 'Wrong type'},
+            {'name': 'name', 'message': 'Required'},
+            {'name': 'active', 'message': 'Required'},
+            {'name': 'tags', 'message': 'Wrong type'},
+            {'name': 'address.city', 'message': 'Wrong type'}])
+
+
+class TestTypedValues(TestCase):
+
+    def test_number(self):
+        field = pform.IntegerField('age')
+
+        self.assertEqual(field.to_field(0), 0)
+        self.assertEqual(field.to_field(10), 10)
+        self.assertEqual(field.to_field('10'), 10)
+        self.assertIs(field.to_field(''), pform.null)
+        self.assertRaises(pform.Invalid, field.to_field, 'x')
+
+        # any non bool JSON number
+        self.assertRaises(pform.Invalid, field.to_field, 2.5)
+        self.assertRaises(pform.Invalid, field.to_field, True)
+        self.assertEqual(field.to_field(2.0), 2)
+
+        for field in (pform.FloatField('ratio'), pform.DecimalField('ratio')):
+            self.assertEqual(field.to_field(0), 0)
+            self.assertIsInstance(field.to_field(0), field.typ)
+            self.assertRaises(pform.Invalid, field.to_field, False)
+
+        field = pform.DecimalField('price')
+        self.assertEqual(field.to_field(0.1), decimal.Decimal('0.1'))
+
+    def test_date(self):
+        field = pform.DateField('date')
+
+        self.assertEqual(field.to_field(datetime.date(2014, 1, 2)),
+                         datetime.date(2014, 1, 2))
+        self.assertEqual(field.to_field(datetime.datetime(2014, 1, 2, 3)),
+                         datetime.date(2014, 1, 2))
+
+    def test_datetime(self):
+        field = pform.DateTimeField('date')
+
+        value = field.to_field(datetime.datetime(2014, 1, 2, 3))
+        self.assertEqual(value.tzinfo, field.default_tzinfo)
+        self.assertEqual(value.hour, 3)
+
+    def test_text(self):
+        field = pform.TextField('name', validator=pform.Length(min=2))
+
+        self.assertEqual(field.to_field('name'), 'name')
+        self.assertRaises(pform.Invalid, field.to_field, 5)
+        self.assertRaises(pform.Invalid, field.to_field, {'a': 1})
+        self.assertRaises(pform.Invalid, field.to_field, ['name'])
+
+        field = pform.ChoiceField('choice', vocabulary=('a', 'b'))
+        self.assertRaises(pform.Invalid, field.to_field, {'a': 1})
+        self.assertRaises(pform.Invalid, field.to_field, ['a'])
+
+    def test_bool(self):
+        field = pform.BoolField('active')
+
+        self.assertIs(field.to_field(False), False)
+        self.assertIs(field.to_field('true'), True)
+
+
+class TestBatch(BaseTestCase):
+
+    fields = pform.Fieldset(
+        pform.TextField('name'),
+        pform.IntegerField('age', validator=pform.Range(min=18)))
+
+    def test_validate_batch(self):
+        from pform.jsonapi import validate_batch
+
+        results = list(validate_batch(
+            self.fields,
+            [{'name': 'one', 'age': 20}, {'age': 10}, 'item'],
+            self.request))
+
+        self.assertEqual([index for index, data, errors in results],
+                         [0, 1, 2])
+        self.assertEqual(results[0][1], {'name': 'one', 'age': 20})
+        self.assertFalse(results[0][2])
+        self.assertEqual([e.field.name for e in results[1][2]],
+                         ['name', 'age'])
+        self.assertIsNone(results[2][1])
+        self.assertEqual(results[2][2][0].msg, 'Item should be JSON object.')
+
+    def test_validate_batch_form(self):
+        from pform.jsonapi import validate_batch
+
+        class MyForm(pform.Form):
+            fields = (pform.TextField('name'),)
+
+        results = list(validate_batch(MyForm, [{}], self.request))
+        self.assertEqual(results[0][2][0].msg, 'Required')
+
+    def test_batch_response(self):
+        from pform.jsonapi import batch_response
+
+        items = [{'name': 'n%d' % i, 'age': 10 + i} for i in range(10)]
+        response = batch_response(self.fields, items, self.request,
+                                  chunk_size=3)
+
+        chunks = list(response.app_iter)
+        self.assertEqual(len(chunks), 4)
+
+        results = json.loads(b''.join(chunks).decode('utf-8'))
+        self.assertEqual([r['index'] for r in results], list(range(10)))
+        self.assertEqual([r['valid'] for r in results],
+                         [False] * 8 + [True] * 2)
+        self.assertEqual(results[0]['errors'], [
+            {'name': 'age', 'message': '10 is less than minimum value 18'}])
+
+        response = batch_response(self.fields, items[:3], self.request,
+                                  chunk_size=3)
+        self.assertEqual(len(json.loads(response.body.decode('utf-8'))), 3)
+
+        response = batch_response(self.fields, [], self.request)
+        self.assertEqual(response.body, b'[]')
+
+    def test_batch_response_eager(self):
+        from pform.jsonapi import batch_response
+
+        calls = []
+        def validator(field, value):
+            calls.append(value)
+            if value == 'boom':
+                raise RuntimeError(value)
+
+        fields = pform.Fieldset(pform.TextField('name', validator=validator))
+        response = batch_response(
+            fields, [{'name': 'one'}, {'name': 'boom'}, {'name': 'two'}],
+            self.request)
+        self.assertEqual(calls, ['one', 'boom', 'two'])
+
+        results = json.loads(response.body.decode('utf-8'))
+        self.assertEqual([r['valid'] for r in results], [True, False, True])
+        self.assertEqual(results[1]['errors'], [
+            {'name': None, 'message': 'Item validation failed.'}])
+
+    def test_batch_response_max_items(self):
+        from pform.jsonapi import batch_response
+
+        self.assertRaises(
+            HTTPBadRequest, batch_response, self.fields,
+            [{}, {}, {}], self.request, max_items=2)
+
+
+class TestBatchView(BaseTestCase):
+
+    def setUp(self):
+        super(TestBatchView, self).setUp()
+
+        class MyForm(pform.Form):
+            fields = pform.Fieldset(pform.TextField('name'))
+
+        self.config.provide_form('batch', MyForm)
+
+    def _make_request(self, body):
+        request = Request.blank('/', method='POST', body=body,
+                                content_type='application/json')
+        request.registry = self.registry
+        request.context = None
+        request.matchdict = {'form': 'batch'}
+        return request
+
+    def test_batch_view(self):
+        from pform.views import batch_view
+
+        response = batch_view(self._make_request(b'[{"name": "x"}, {}]'))
+        self.assertEqual(response.content_type, 'application/json')
+        self.assertEqual(json.loads(response.body.decode('utf-8')), [
+            {'index': 0, 'valid': True, 'errors': []},
+            {'index': 1, 'valid': False,
+             'errors': [{'name': 'name', 'message': 'Required'}]}])
+
+    def test_batch_view_max_items(self):
+        from pform.views import batch_view
+
+        self.registry.settings['pform.batch_max_items'] = '1'
+        self.assertRaises(HTTPBadRequest, batch_view,
+                          self._make_request(b'[{"name": "x"}, {}]'))
+
+    def test_batch_view_errors(self):
+        from pform.views import batch_view
+
+        self.assertRaises(HTTPBadRequest, batch_view,
+                          self._make_request(b'{"name": "x"}'))
+        self.assertRaises(HTTPBadRequest, batch_view,
+                          self._make_request(b'[{'))
+
+    def test_route(self):
+        self.config.include('pform.views')
+        route = self.config.get_routes_mapper().get_route('pform:batch')
+        self.assertEqual(route.match('/_pform/batch/batch'),
+                         {'form': 'batch'})
+
+
+class TestJsonSchema(BaseTestCase):
+
+    def test_fields(self):
+        from pform.jsonapi import json_schema
+
+        fieldset = pform.Fieldset(
+            pform.TextField('name', title='Name', validator=pform.All(
+                pform.Length(max=30), pform.Regex('^[a-z]+$'),
+                pform.Regex('a'))),
+            pform.TextField('digits', validator=pform.Regex(r'^\d+\Z')),
+            pform.TextField('nick', validator=pform.Regex(r'(?P<n>\w)')),
+            pform.TextField('email', required=False,
+                            validator=pform.Email()),
+            pform.IntegerField('age', validator=pform.Range(min=18)),
+            pform.FloatField('ratio', required=False),
+            pform.BoolField('active'),
+            pform.DateField('born'),
+            pform.DateTimeField('created', required=False),
+            pform.ChoiceField('lang', vocabulary=('en', 'ru')),
+            pform.ChoiceField('country', voc_factory=lambda: ('US',)),
+            pform.MultiChoiceField(
+                'tags', vocabulary=('a', 'b'), validator=pform.Length(min=1)),
+            pform.TextField('code', default='x', validator=pform.All(
+                pform.OneOf(('x', 'y')), pform.Regex('(?i)x'))),
+            title='Person')
+
+        schema = json_schema(fieldset)
+        props = schema['properties']
+
+        self.assertEqual(schema['$schema'],
+                         'http://json-schema.org/draft-04/schema#')
+        self.assertEqual(schema['type'], 'object')
+        self.assertEqual(schema['title'], 'Person')
+        self.assertEqual(
+            schema['required'],
+            ['name', 'digits', 'nick', 'age', 'active', 'born', 'lang',
+             'country', 'tags', 'code'])
+
+        self.assertEqual(props['name'], {
+            'type': 'string', 'title': 'Name', 'maxLength': 30,
+            'minLength': 1, 'pattern': '^(?:^[a-z]+$)',
+            'allOf': [{'pattern': '^(?:a)'}]})
+        self.assertNotIn('pattern', props['digits'])
+        self.assertNotIn('pattern', props['nick'])
+        self.assertEqual(props['email'], {
+            'type': 'string', 'format': 'email'})
+        self.assertEqual(props['age']['type'], 'integer')
+        self.assertEqual(props['age']['minimum'], 18)
+        self.assertEqual(props['ratio']['type'], 'number')
+        self.assertEqual(props['active']['type'], 'boolean')
+        self.assertEqual(props['born']['format'], 'date')
+        self.assertEqual(props['created']['format'], 'date-time')
+        self.assertEqual(props['lang']['enum'], ['en', 'ru'])
+        self.assertNotIn('enum', props['country'])
+        self.assertEqual(props['tags'], {
+            'type': 'array', 'uniqueItems': True,
+            'minItems': 1, 'items': {'type': 'string', 'enum': ['a', 'b']}})
+        self.assertEqual(props['code']['enum'], ['x', 'y'])
+        self.assertEqual(props['code']['default'], 'x')
+        self.assertNotIn('pattern', props['code'])
+
+        json.dumps(schema)
+
+    def test_nested(self):
+        from pform.jsonapi import json_schema
+
+        class MyForm(pform.Form):
+            fields = pform.Fieldset(
+                pform.CompositeField('address', fields=(
+                    pform.TextField('city'),
+                    pform.TextField('zip', required=False))),
+                pform.Fieldset(
+                    pform.TextField('nick', required=False), name='profile'))
+
+        schema = json_schema(MyForm)
+
+        self.assertEqual(schema['required'], ['address'])
+        self.assertEqual(schema['properties']['address']['required'],
+                         ['city'])
+        self.assertEqual(
+            schema['properties']['profile']['properties']['nick'],
+            {'type': 'string'})
+
+    def test_cached(self):
+        from pform.jsonapi import json_schema
+
+        fieldset = pform.Fieldset(pform.TextField('name'))
+
+        schema = json_schema(fieldset)
+        self.assertIs(json_schema(fieldset), schema)
+
+        fieldset.append(pform.TextField('email'))
+        self.assertIn('email', json_schema(fieldset)['properties'])
+
+    def test_custom_field(self):
+        from pform.jsonapi import json_schema
+
+        class ColorField(pform.TextField):
+            def json_schema(self):
+                return {'type': 'string', 'format': 'color'}
+
+        schema = json_schema(pform.Fieldset(ColorField('color')))
+        self.assertEqual(schema['properties']['color'],
+                         {'type': 'string', 'format': 'color'})
+
+    def test_schema_view(self):
+        from pform.views import schema_view
+
+        class MyForm(pform.Form):
+            fields = pform.Fieldset(pform.TextField('name'))
+
+        self.config.provide_form('schema', MyForm)
+
+        request = self.make_request()
+        request.matchdict = {'form': 'schema'}
+        self.assertEqual(schema_view(request).json_body['required'],
+                         ['name'])
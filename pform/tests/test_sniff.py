@@ -0,0 +1,132 @@
+""" Tests for L{pform.sniff} """
+from io import BytesIO
+
+import pform
+from base import TestCase, BaseTestCase
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 32
+
+
+class TestSniff(TestCase):
+
+    def test_sniff(self):
+        from pform.sniff import sniff
+
+        self.assertEqual(sniff(PNG), 'image/png')
+        self.assertEqual(sniff(b'\xff\xd8\xff\xe0JFIF'), 'image/jpeg')
+        self.assertEqual(sniff(b'GIF89a...'), 'image/gif')
+        self.assertEqual(sniff(b'%PDF-1.4\n'), 'application/pdf')
+        self.assertEqual(sniff(b'RIFF\x00\x00\x00\x00WEBPVP8 '), 'image/webp')
+        self.assertEqual(sniff(b'\x00\x00\x00\x18ftypmp42'), 'video/mp4')
+        self.assertEqual(sniff(b'\x00' * 257 + b'ustar'), 'application/x-tar')
+
+    def test_sniff_text(self):
+        from pform.sniff import sniff
+
+        self.assertEqual(sniff(b'hello'), 'text/plain')
+        self.assertEqual(sniff(u'ф'.encode('utf-8')), 'text/plain')
+        self.assertEqual(sniff(b'  <!DOCTYPE html><html>'), 'text/html')
+        self.assertEqual(sniff(b'<?xml version="1.0"?><root/>'),
+                         'application/xml')
+        self.assertEqual(sniff(b'<?xml version="1.0"?><svg></svg>'),
+                         'image/svg+xml')
+        self.assertIsNone(sniff(b'\x00\x01\x02\x03binary'))
+        self.assertIsNone(sniff(b'\xff\xfe\xfd\xfc text'))
+
+    def test_sniff_mimetype(self):
+        from pform.sniff import sniff_mimetype
+
+        fp = BytesIO(PNG + b'\x00' * 10000)
+        fp.seek(100)
+        self.assertEqual(sniff_mimetype(fp), 'image/png')
+        self.assertEqual(fp.tell(), 100)
+
+    def test_resolve_mimetype(self):
+        from pform.sniff import resolve_mimetype
+
+        self.assertEqual(resolve_mimetype('image/png', 'image/jpeg'),
+                         'image/png')
+        self.assertEqual(resolve_mimetype('text/plain', 'text/csv'),
+                         'text/csv')
+        self.assertEqual(resolve_mimetype('text/plain', 'image/png'),
+                         'text/plain')
+        self.assertEqual(
+            resolve_mimetype('application/zip', 'application/epub+zip'),
+            'application/epub+zip')
+        self.assertEqual(
+            resolve_mimetype('application/x-ole-storage',
+                             'application/msword'),
+            'application/msword')
+        self.assertEqual(resolve_mimetype(None, 'image/png'),
+                         'application/octet-stream')
+
+        # generic type is not refined by unrelated types
+        self.assertEqual(resolve_mimetype('application/zip',
+                                          'application/pdf'),
+                         'application/zip')
+        self.assertEqual(
+            resolve_mimetype('application/x-ole-storage',
+                             'application/pdf'),
+            'application/x-ole-storage')
+        self.assertEqual(resolve_mimetype('text/plain', 'text/html'),
+                         'text/plain')
+
+        # known alias
+        self.assertEqual(resolve_mimetype('image/jpeg', 'image/jpg'),
+                         'image/jpg')
+        self.assertEqual(resolve_mimetype('image/png', 'image/jpg'),
+                         'image/png')
+
+    def test_sniff_bmp(self):
+        from pform.sniff import sniff
+
+        self.assertEqual(
+            sniff(b'BM' + b'\x00' * 12 + b'\x28\x00\x00\x00'), 'image/bmp')
+        self.assertEqual(sniff(b'BMW is a car brand.'), 'text/plain')
+
+
+class TestFileFieldSniff(BaseTestCase):
+
+    def _validate(self, data, mimetype, **kw):
+        kw.setdefault('sniff_content', True)
+        field = pform.FileField('test', allowed_types=('image/png',), **kw)
+        field = field.bind(self.request, '', pform.null, {})
+
+        value = {'fp': BytesIO(data), 'mimetype': mimetype, 'size': len(data)}
+        field.validate(value)
+        return value
+
+    def test_allowed_types(self):
+        value = self._validate(PNG, 'application/octet-stream')
+        self.assertEqual(value['sniffed_mimetype'], 'image/png')
+
+    def test_spoofed_type(self):
+        with self.assertRaises(pform.Invalid) as cm:
+            self._validate(b'<html>', 'image/png')
+
+        self.assertEqual('Unknown file type.', cm.exception.msg)
+
+    def test_sniff_cached(self):
+        field = pform.FileField('test', allowed_types=('image/png',),
+                                sniff_content=True)
+        field = field.bind(self.request, '', pform.null, {})
+
+        value = {'fp': BytesIO(PNG), 'mimetype': 'image/png',
+                 'sniffed_mimetype': 'image/jpeg'}
+        self.assertRaises(pform.Invalid, field.validate, value)
+
+    def test_alias(self):
+        field = pform.FileField('test', allowed_types=('image/jpg',),
+                                sniff_content=True)
+        field = field.bind(self.request, '', pform.null, {})
+
+        value = {'fp': BytesIO(b'\xff\xd8\xff\xe0JFIF'),
+                 'mimetype': 'image/jpg'}
+        self.assertIsNone(field.validate(value))
+
+    def test_sniff_default(self):
+        self.assertFalse(pform.FileField.sniff_content)
+
+    def test_sniff_disabled(self):
+        value = self._validate(b'<html>', 'image/png', sniff_content=False)
+        self.assertNotIn('sniffed_mimetype', value)
@@ -0,0 +1,180 @@
+""" Tests for L{pform.storage} """
+import os
+import shutil
+import hashlib
+import tempfile
+from io import BytesIO
+
+import pform
+from base import TestCase, BaseTestCase
+
+
+class TestFileStore(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_store(self):
+        from pform.storage import FileStore
+
+        store = FileStore(self.dir)
+        data = b'data' * 100000
+        digest = hashlib.sha256(data).hexdigest()
+
+        info = store.store(BytesIO(data), ('md5',))
+        self.assertEqual(info['digest'], digest)
+        self.assertEqual(info['digests'],
+                         {'sha256': digest,
+                          'md5': hashlib.md5(data).hexdigest()})
+        self.assertEqual(info['size'], len(data))
+        self.assertEqual(info['path'], os.path.join(
+            self.dir, digest[:2], digest[2:4], digest))
+        self.assertIn(digest, store)
+
+        with store.open(digest) as fp:
+            self.assertEqual(fp.read(), data)
+
+        # deduplication
+        info2 = store.store(BytesIO(data))
+        self.assertEqual(info2['path'], info['path'])
+        self.assertEqual(os.listdir(store.tmp), [])
+
+    def test_stage(self):
+        from pform.storage import FileStore, staged_files
+
+        store = FileStore(self.dir)
+        staged = store.stage(BytesIO(b'data'))
+        self.assertNotIn(staged['digest'], store)
+        self.assertEqual(len(os.listdir(store.tmp)), 1)
+        self.assertEqual(staged_files({'f': [staged]}), [staged])
+
+        staged.discard()
+        self.assertEqual(os.listdir(store.tmp), [])
+        self.assertNotIn(staged['digest'], store)
+
+        staged = store.stage(BytesIO(b'data'))
+        staged.commit()
+        staged.discard()
+        self.assertIn(staged['digest'], store)
+        self.assertEqual(os.listdir(store.tmp), [])
+
+    def test_store_max_size(self):
+        from pform.storage import FileStore, SizeExceeded
+
+        store = FileStore(self.dir, fanout=1)
+        self.assertRaises(SizeExceeded, store.store, BytesIO(b'data'), (), 3)
+        self.assertEqual(os.listdir(store.tmp), [])
+
+        info = store.store(BytesIO(b'data'), (), 4)
+        self.assertEqual(os.path.dirname(info['path']),
+                         os.path.join(self.dir, info['digest'][:2]))
+
+
+class FileStorage:
+    def __init__(self, fp, filename, mt, s):
+        self.file = fp
+        self.filename = filename
+        self.type = mt
+        self.length = s
+
+
+class TestFileFieldStore(BaseTestCase):
+
+    def setUp(self):
+        super(TestFileFieldStore, self).setUp()
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _extract(self, data, **kw):
+        field = pform.FileField(
+            'test', store=pform.FileStore(self.dir), **kw)
+        fs = pform.Fieldset(field).bind(self.request, params={
+            'test': FileStorage(BytesIO(data), 'test.txt', 'text/plain', -1)})
+        return fs.extract()
+
+    def test_store(self):
+        data, errors = self._extract(b'data', digests=('md5',))
+
+        self.assertFalse(errors)
+        value = data['test']
+        self.assertEqual(value['digest'], hashlib.sha256(b'data').hexdigest())
+        self.assertEqual(value['digests']['md5'],
+                         hashlib.md5(b'data').hexdigest())
+        self.assertEqual(value['size'], 4)
+        self.assertEqual(value['filename'], 'test.txt')
+        self.assertEqual(value['mimetype'], 'text/plain')
+
+        # file is staged until commit
+        self.assertFalse(os.path.exists(value['path']))
+        value.commit()
+        self.assertTrue(os.path.exists(value['path']))
+        self.assertEqual(os.listdir(os.path.join(self.dir, 'tmp')), [])
+
+    def test_store_string_param(self):
+        field = pform.FileField('test', store=pform.FileStore(self.dir))
+        fs = pform.Fieldset(field).bind(self.request, params={
+            'test': 'data', 'test-filename': 'test.txt',
+            'test-mimetype': 'text/plain'})
+
+        data, errors = fs.extract()
+        self.assertFalse(errors)
+        value = data['test']
+        self.assertEqual(value['digest'], hashlib.sha256(b'data').hexdigest())
+        self.assertEqual(value['size'], 4)
+        self.assertEqual(value['filename'], 'test.txt')
+
+    def test_store_max_size(self):
+        data, errors = self._extract(b'data', max_size=3)
+        self.assertEqual(errors[0].msg, 'Maximum file size exceeded.')
+
+    def test_store_allowed_types(self):
+        data, errors = self._extract(b'data', allowed_types=('image/png',))
+        self.assertEqual(errors[0].msg, 'Unknown file type.')
+        self.assertEqual(os.listdir(os.path.join(self.dir)), ['tmp'])
+        self.assertEqual(os.listdir(os.path.join(self.dir, 'tmp')), [])
+
+    def _form(self, **kw):
+        store = self.store = pform.FileStore(self.dir)
+
+        class FileForm(pform.Form):
+            fields = pform.Fieldset(
+                pform.FileField('file', store=store),
+                pform.TextField('title'))
+
+        kw['file'] = FileStorage(BytesIO(b'data'), 'test.txt', 'text/plain', 4)
+        request = self.make_request(POST=kw)
+        form = FileForm(None, request)
+        form.update_form()
+        return form
+
+    def test_form_commit(self):
+        form = self._form(title='Title')
+        data, errors = form.extract()
+
+        self.assertFalse(errors)
+        self.assertIn(data['file']['digest'], self.store)
+        self.assertEqual(os.listdir(self.store.tmp), [])
+
+    def test_form_invalid(self):
+        form = self._form()
+        data, errors = form.extract()
+
+        self.assertEqual(errors[0].msg, 'Required')
+        self.assertNotIn(data['file']['digest'], self.store)
+        self.assertEqual(os.listdir(self.store.tmp), [])
+
+    def test_form_csrf(self):
+        from pyramid.httpexceptions import HTTPForbidden
+
+        form = self._form(title='Title')
+        form.csrf = True
+        form.request.session.get_csrf_token = lambda: 'token'
+
+        self.assertRaises(HTTPForbidden, form.extract)
+        self.assertEqual(os.listdir(self.store.tmp), [])
+        self.assertEqual(os.listdir(self.dir), ['tmp'])
@@ -0,0 +1,385 @@
+""" Tests for L{pform.upload} """
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from pyramid.httpexceptions import HTTPBadRequest
+from pyramid.httpexceptions import HTTPRequestEntityTooLarge
+
+import pform
+from base import TestCase, BaseTestCase
+
+BOUNDARY = '----pformboundary'
+CONTENT_TYPE = 'multipart/form-data; boundary=%s' % BOUNDARY
+
+
+def make_body(*parts):
+    body = []
+    for name, value, filename in parts:
+        body.append(('--%s\r\n' % BOUNDARY).encode('latin1'))
+        if filename is None:
+            body.append((
+                'Content-Disposition: form-data; name="%s"\r\n\r\n' % name
+            ).encode('latin1'))
+        else:
+            body.append((
+                'Content-Disposition: form-data; name="%s"; '
+                'filename="%s"\r\nContent-Type: text/plain\r\n\r\n' % (
+                    name, filename)).encode('latin1'))
+        body.append(value)
+        body.append(b'\r\n')
+    body.append(('--%s--\r\n' % BOUNDARY).encode('latin1'))
+    return b''.join(body)
+
+
+class TestParseMultipart(TestCase):
+
+    def _parse(self, body, **kw):
+        from pform.upload import parse_multipart
+        return parse_multipart(
+            BytesIO(body), CONTENT_TYPE, len(body), **kw)
+
+    def test_parse_header(self):
+        from pform.upload import parse_header
+
+        self.assertEqual(
+            parse_header('form-data; name="test"; filename="a;\\"b.txt"'),
+            ('form-data', {'name': 'test', 'filename': 'a;"b.txt'}))
+
+    def test_parse(self):
+        data = b'x' * 200000 + b'\r\n--' + b'y' * 10
+        params = self._parse(make_body(
+            ('text', b'value', None),
+            ('file', data, 'test.txt'),
+            ('empty', b'', '')))
+
+        self.assertEqual(params['text'], 'value')
+        self.assertEqual(params['empty'], '')
+
+        upload = params['file']
+        self.assertEqual(upload.filename, 'test.txt')
+        self.assertEqual(upload.type, 'text/plain')
+        self.assertEqual(upload.length, len(data))
+        self.assertEqual(upload.file.read(), data)
+
+    def test_parse_limits(self):
+        body = make_body(('text', b'value', None),
+                         ('file', b'x' * 100, 'test.txt'))
+
+        self.assertRaises(HTTPRequestEntityTooLarge,
+                          self._parse, body, limits={'file': 99})
+        self.assertRaises(HTTPRequestEntityTooLarge,
+                          self._parse, body, max_content_length=100)
+
+        params = self._parse(body, limits={'file': 100})
+        self.assertEqual(params['file'].length, 100)
+
+    def test_parse_limits_stops_reading(self):
+        from pform.upload import parse_multipart
+
+        class Stream(object):
+            read_size = 0
+            def read(self, size):
+                self.read_size += size
+                return b'x' * size
+
+        stream = Stream()
+        head = make_body(('file', b'', 'test.txt')).split(b'\r\n\r\n')[0]
+        body = BytesIO(head + b'\r\n\r\n')
+
+        def read(size):
+            return body.read(size) or stream.read(size)
+
+        stream_body = type('Body', (), {'read': staticmethod(read)})()
+
+        self.assertRaises(
+            HTTPRequestEntityTooLarge, parse_multipart, stream_body,
+            CONTENT_TYPE, 2 << 30, limits={'file': 1024})
+        self.assertLess(stream.read_size, 1 << 20)
+
+    def test_parse_errors(self):
+        self.assertRaises(HTTPBadRequest, self._parse, b'garbage')
+        self.assertRaises(HTTPBadRequest, self._parse,
+                          make_body(('text', b'value', None))[:-30])
+
+        from pform.upload import parse_multipart
+        self.assertRaises(HTTPBadRequest, parse_multipart,
+                          BytesIO(b''), 'multipart/form-data', 0)
+
+
+class TestFormStreamUploads(BaseTestCase):
+
+    def _makeForm(self, body, request=None, **kw):
+        from pyramid.request import Request
+
+        if request is None:
+            request = Request.blank('/', {
+                'REQUEST_METHOD': 'POST',
+                'CONTENT_TYPE': CONTENT_TYPE,
+                'CONTENT_LENGTH': str(len(body)),
+                'wsgi.input': BytesIO(body)})
+            request.registry = self.registry
+
+        class MyForm(pform.Form):
+            fields = pform.Fieldset(
+                pform.TextField('name'),
+                pform.FileField('file', max_size=100))
+
+        return MyForm(None, request, **kw)
+
+    def test_upload_limits(self):
+        form = self._makeForm(b'')
+        self.assertEqual(form.upload_limits(), {'file': 100})
+
+    def test_stream_uploads(self):
+        form = self._makeForm(make_body(
+            ('name', b'name', None),
+            ('file', b'data', 'test.txt')),
+            stream_uploads=True)
+        form.update_form()
+
+        data, errors = form.extract()
+        self.assertFalse(errors)
+        self.assertEqual(data['name'], 'name')
+        self.assertEqual(data['file']['size'], 4)
+        self.assertEqual(data['file']['fp'].read(), b'data')
+
+    def test_stream_uploads_multiple_forms(self):
+        form1 = self._makeForm(make_body(
+            ('__form_identity__', b'form2', None),
+            ('name', b'name', None),
+            ('file', b'x' * 50, 'test.txt')),
+            stream_uploads=True, prefix='form1.')
+        form1.fields['file'].max_size = 10
+        form2 = self._makeForm(
+            b'', stream_uploads=True, prefix='form2.',
+            request=form1.request)
+
+        # limits of not submitted form are not enforced
+        form1.update_form()
+        form2.update_form()
+
+        data, errors = form2.extract()
+        self.assertFalse(errors)
+        self.assertEqual(data['file']['fp'].read(), b'x' * 50)
+
+    def test_stream_uploads_multiple_forms_too_large(self):
+        form1 = self._makeForm(make_body(
+            ('__form_identity__', b'form2', None),
+            ('file', b'x' * 50, 'test.txt')),
+            stream_uploads=True, prefix='form1.')
+        form2 = self._makeForm(
+            b'', stream_uploads=True, prefix='form2.',
+            request=form1.request)
+        form2.fields['file'].max_size = 10
+
+        form1.update_form()
+        self.assertRaises(HTTPRequestEntityTooLarge, form2.update_form)
+
+    def test_stream_uploads_too_large(self):
+        form = self._makeForm(make_body(
+            ('file', b'x' * 101, 'test.txt')),
+            stream_uploads=True)
+
+        self.assertRaises(HTTPRequestEntityTooLarge, form.update_form)
+
+    def test_max_content_length(self):
+        form = self._makeForm(make_body(
+            ('file', b'x' * 100, 'test.txt')),
+            max_content_length=100)
+
+        self.assertRaises(HTTPRequestEntityTooLarge, form.update_form)
+
+
+class TestUploadStaging(TestCase):
+
+    def setUp(self):
+        from pform.upload import UploadStaging
+        self.dir = tempfile.mkdtemp()
+        self.staging = UploadStaging(self.dir, 1024)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_append(self):
+        meta = self.staging.create('test.txt', 'text/plain', 8)
+        self.assertEqual(meta['offset'], 0)
+        self.assertFalse(meta['complete'])
+
+        meta = self.staging.append(meta['id'], 0, BytesIO(b'1234'))
+        self.assertEqual(meta['offset'], 4)
+        self.assertFalse(meta['complete'])
+
+        meta = self.staging.append(meta['id'], 4, BytesIO(b'5678'))
+        self.assertTrue(meta['complete'])
+        self.assertEqual(self.staging.get(meta['id']), meta)
+        self.assertEqual(self.staging.open(meta['id']).read(), b'12345678')
+
+    def test_append_offset_mismatch(self):
+        meta = self.staging.create('test.txt', 'text/plain', 8)
+        self.staging.append(meta['id'], 0, BytesIO(b'1234'))
+
+        self.assertRaises(
+            ValueError, self.staging.append, meta['id'], 0, BytesIO(b'1234'))
+        self.assertRaises(
+            ValueError, self.staging.append, meta['id'], 6, BytesIO(b'1234'))
+        self.assertEqual(self.staging.get(meta['id'])['offset'], 4)
+
+    def test_append_exceeds_size(self):
+        meta = self.staging.create('test.txt', 'text/plain', 4)
+
+        self.assertRaises(
+            HTTPRequestEntityTooLarge,
+            self.staging.append, meta['id'], 0, BytesIO(b'12345'))
+        self.assertRaises(
+            HTTPRequestEntityTooLarge,
+            self.staging.append, meta['id'], 0, BytesIO(b'12345'), 5)
+        self.assertEqual(self.staging.get(meta['id'])['offset'], 0)
+        self.assertEqual(self.staging.open(meta['id']).read(), b'')
+
+    def test_max_size(self):
+        from pform.upload import UploadStaging
+
+        staging = UploadStaging(self.dir, max_size=10)
+        self.assertRaises(
+            HTTPRequestEntityTooLarge,
+            staging.create, 'test.txt', 'text/plain', 11)
+
+    def test_max_size_required(self):
+        from pform.upload import UploadStaging
+
+        self.assertRaises(ValueError, UploadStaging, self.dir, 0)
+        self.assertRaises(ValueError, UploadStaging, self.dir, None)
+
+    def test_append_locked(self):
+        meta = self.staging.create('test.txt', 'text/plain', 8)
+
+        class Stream(object):
+            # second chunk is sent while first is being appended
+            def __init__(self, staging):
+                self.staging = staging
+                self.data = [b'1234']
+                self.errors = []
+
+            def read(self, size):
+                try:
+                    self.staging.append(meta['id'], 0, BytesIO(b'5678'))
+                except ValueError as e:
+                    self.errors.append(e.args[0])
+                return self.data.pop() if self.data else b''
+
+        stream = Stream(self.staging)
+        meta = self.staging.append(meta['id'], 0, stream)
+        self.assertEqual(stream.errors, [0, 0])
+        self.assertEqual(meta['offset'], 4)
+        self.assertEqual(self.staging.open(meta['id']).read(), b'1234')
+        self.assertEqual(sorted(os.listdir(self.dir)),
+                         sorted([meta['id'] + '.data',
+                                 meta['id'] + '.json']))
+
+    def test_cleanup(self):
+        from pform.upload import UploadStaging
+
+        now = [1000.0]
+        staging = UploadStaging(
+            self.dir, 1024, ttl=100, timer=lambda: now[0])
+
+        old = staging.create('test.txt', 'text/plain', 4)
+        os.utime(os.path.join(self.dir, old['id'] + '.json'), (850, 850))
+
+        now[0] = 1000.0 + staging.cleanup_interval + 1
+        meta = staging.create('test.txt', 'text/plain', 4)
+        self.assertRaises(KeyError, staging.get, old['id'])
+        self.assertFalse(
+            os.path.exists(os.path.join(self.dir, old['id'] + '.data')))
+        self.assertEqual(staging.get(meta['id'])['id'], meta['id'])
+
+    def test_unknown_upload(self):
+        self.assertRaises(KeyError, self.staging.get, '0' * 32)
+        self.assertRaises(KeyError, self.staging.get, '../../etc/passwd')
+
+    def test_remove(self):
+        meta = self.staging.create('test.txt', 'text/plain', 4)
+        self.staging.remove(meta['id'])
+        self.assertRaises(KeyError, self.staging.get, meta['id'])
+
+
+class TestFileFieldChunked(BaseTestCase):
+
+    def setUp(self):
+        super(TestFileFieldChunked, self).setUp()
+        from pform.upload import UploadStaging
+
+        self.dir = tempfile.mkdtemp()
+        self.staging = UploadStaging(self.dir, 1024)
+        self.registry['pform:uploads'] = self.staging
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        del self.registry['pform:uploads']
+
+    def _extract(self, upload_id, **kw):
+        fs = pform.Fieldset(pform.FileField('file', chunked=True, **kw))
+        fs = fs.bind(self.request, params={'file': upload_id})
+        return fs.extract()
+
+    def test_chunked(self):
+        meta = self.staging.create('test.txt', 'text/plain', 4)
+        self.staging.append(meta['id'], 0, BytesIO(b'data'))
+
+        data, errors = self._extract(meta['id'])
+        self.assertFalse(errors)
+        self.assertEqual(data['file']['filename'], 'test.txt')
+        self.assertEqual(data['file']['mimetype'], 'text/plain')
+        self.assertEqual(data['file']['size'], 4)
+        self.assertEqual(data['file']['upload_id'], meta['id'])
+        self.assertEqual(data['file']['fp'].read(), b'data')
+
+    def test_chunked_validate_metadata(self):
+        meta = self.staging.create('test.txt', 'text/plain', 4)
+        self.staging.append(meta['id'], 0, BytesIO(b'data'))
+
+        data, errors = self._extract(meta['id'], max_size=3)
+        self.assertEqual(errors[0].msg, 'Maximum file size exceeded.')
+
+        data, errors = self._extract(
+            meta['id'], allowed_types=('image/png',))
+        self.assertEqual(errors[0].msg, 'Unknown file type.')
+
+    def test_chunked_incomplete(self):
+        meta = self.staging.create('test.txt', 'text/plain', 8)
+        self.staging.append(meta['id'], 0, BytesIO(b'data'))
+
+        data, errors = self._extract(meta['id'])
+        self.assertEqual(errors[0].msg, 'File upload is not complete.')
+
+        data, errors = self._extract('unknown')
+        self.assertEqual(errors[0].msg, 'File upload is not complete.')
+
+    def test_chunked_store(self):
+        store = pform.FileStore(os.path.join(self.dir, 'store'))
+        meta = self.staging.create('test.txt', 'text/plain', 4)
+        self.staging.append(meta['id'], 0, BytesIO(b'data'))
+
+        data, errors = self._extract(meta['id'], store=store)
+        self.assertFalse(errors)
+        self.assertEqual(data['file']['filename'], 'test.txt')
+        self.assertEqual(self.staging.get(meta['id'])['id'], meta['id'])
+
+        # upload is consumed
+        data['file'].commit()
+        self.assertIn(data['file']['digest'], store)
+        self.assertRaises(KeyError, self.staging.get, meta['id'])
+
+    def test_chunked_not_opened_on_update(self):
+        meta = self.staging.create('test.txt', 'text/plain', 4)
+        self.staging.append(meta['id'], 0, BytesIO(b'data'))
+
+        fs = pform.Fieldset(pform.FileField('file', chunked=True))
+        fs = fs.bind(self.request, params={'file': meta['id']})
+        fs['file'].update()
+        self.assertNotIn('fp', fs['file'].extract())
+
+    def test_chunked_missing(self):
+        data, errors = self._extract('')
+        self.assertEqual(errors[0].msg, 'Required')
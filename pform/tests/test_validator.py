@@ -40,6 +40,204 @@ class TestAll(TestCase):
         self.assertEqual(e.msg, ['msg1', 'msg2'])
 
 
+class TestAllOrdered(TestCase):
+
+    def _makeValidator(self, name, calls, msg=None, cost=None):
+        from pform import Function
+
+        def func(value):
+            calls.append(name)
+            return msg or True
+
+        return Function(func, cost=cost)
+
+    def test_ordered(self):
+        from pform import All
+
+        calls = []
+        validator = All(
+            self._makeValidator('expensive', calls, cost=100),
+            self._makeValidator('cheap', calls, cost=1),
+            self._makeValidator('default', calls),
+            ordered=True)
+
+        self.assertIsNone(validator.check(None, None))
+        self.assertEqual(calls, ['cheap', 'default', 'expensive'])
+        self.assertEqual(validator.cost, 111)
+
+    def test_fail_fast(self):
+        from pform import All
+
+        calls = []
+        validator = All(
+            self._makeValidator('expensive', calls, cost=100),
+            self._makeValidator('cheap', calls, 'Error', cost=1),
+            ordered=True, fail_fast=True)
+
+        error = validator.check(None, None)
+        self.assertEqual(error.msg, ['Error'])
+        self.assertEqual(calls, ['cheap'])
+
+    def test_measure(self):
+        from pform import All
+
+        calls = []
+        slow = self._makeValidator('slow', calls, cost=1)
+        fast = self._makeValidator('fast', calls, cost=2)
+        validator = All(slow, fast, ordered=True, measure=True)
+
+        validator.check(None, None)
+        self.assertEqual(calls, ['slow', 'fast'])
+        self.assertEqual(validator.timings[slow][0], 1)
+
+        validator.timings[slow] = (1, 1.0)
+        validator.timings[fast] = (1, 0.1)
+        del calls[:]
+        validator.check(None, None)
+        self.assertEqual(calls, ['fast', 'slow'])
+        self.assertEqual(validator.timings[fast][0], 2)
+
+    def test_unknown_argument(self):
+        from pform import All
+        self.assertRaises(TypeError, All, unknown=True)
+
+    def test_fieldset_validator(self):
+        import pform
+
+        validator = pform.All(
+            DummyValidator('msg1'), DummyValidator('msg2'), fail_fast=True)
+        fs = pform.Fieldset(validator=validator)
+        self.assertIs(fs.validator, validator)
+        self.assertEqual(fs.check({}).msg, ['msg1'])
+
+
+class TestMemoize(TestCase):
+
+    def _makeOne(self, calls, **kw):
+        from pform import Memoize, Function
+
+        def func(value):
+            calls.append(value)
+            return value != 'bad'
+
+        return Memoize(Function(func, 'Bad value', cost=50), **kw)
+
+    def test_memoize(self):
+        calls = []
+        validator = self._makeOne(calls)
+
+        self.assertIsNone(validator.check(None, 'good'))
+        self.assertIsNone(validator.check(None, 'good'))
+        self.assertEqual(calls, ['good'])
+
+        field = object()
+        error = validator.check(field, 'bad')
+        self.assertEqual(error.msg, 'Bad value')
+        e = invalid_exc(validator, field, 'bad')
+        self.assertEqual(e.msg, 'Bad value')
+        self.assertIs(e.field, field)
+        self.assertIsNot(e, error)
+        self.assertEqual(calls, ['good', 'bad'])
+
+        self.assertEqual(validator.stats()['hits'], 2)
+        self.assertEqual(validator.stats()['misses'], 2)
+        self.assertEqual(validator.cost, 50)
+
+    def test_memoize_all_error(self):
+        from pform import All, Memoize
+
+        validator = Memoize(All(DummyValidator('msg1'), DummyValidator('msg2')))
+
+        validator.check(None, 'value')
+        error = validator.check(None, 'value')
+        self.assertEqual(error.msg, ['msg1', 'msg2'])
+        self.assertEqual(validator.stats()['hits'], 1)
+
+    def test_memoize_unhashable(self):
+        calls = []
+        validator = self._makeOne(calls)
+
+        validator.check(None, ['value'])
+        validator.check(None, ['value'])
+        self.assertEqual(len(calls), 2)
+
+    def test_memoize_key(self):
+        calls = []
+        validator = self._makeOne(calls, key=tuple)
+
+        validator.check(None, ['a'])
+        validator.check(None, ['a'])
+        self.assertEqual(calls, [['a']])
+
+        validator.invalidate(['a'])
+        validator.check(None, ['a'])
+        self.assertEqual(len(calls), 2)
+
+    def test_memoize_ttl(self):
+        calls = []
+        validator = self._makeOne(calls, ttl=10)
+        now = [100]
+        validator.cache.timer = lambda: now[0]
+
+        validator.check(None, 'good')
+        now[0] = 111
+        validator.check(None, 'good')
+        self.assertEqual(calls, ['good', 'good'])
+
+
+class TestCheckValidator(TestCase):
+
+    def _callFUT(self, validator, value):
+        from pform.validator import check_validator
+        return check_validator(validator, None, value)
+
+    def test_check(self):
+        from pform import Length
+
+        self.assertIsNone(self._callFUT(Length(max=1), 'a'))
+        self.assertIsNotNone(self._callFUT(Length(max=1), 'abc'))
+
+    def test_callable(self):
+        self.assertIsNone(self._callFUT(DummyValidator(), None))
+        self.assertEqual(self._callFUT(DummyValidator('msg'), None).msg, 'msg')
+
+    def test_call_override(self):
+        from pform import Invalid, Length
+
+        class MyLength(Length):
+            def __call__(self, field, value):
+                raise Invalid('custom', field)
+
+        self.assertEqual(self._callFUT(MyLength(max=10), 'a').msg, 'custom')
+
+    def test_all_lazy_messages(self):
+        from pform import All, Invalid
+
+        class Error(Invalid):
+            def __str__(self):
+                calls.append(self.msg)
+                return self.msg
+
+        calls = []
+
+        def validator(field, value):
+            raise Error('msg', field)
+
+        error = All(validator).check(None, None)
+        self.assertEqual(calls, [])
+        self.assertEqual(error.msg, ['msg'])
+        self.assertEqual(error.msg, ['msg'])
+        self.assertEqual(calls, ['msg'])
+
+    def test_all_check(self):
+        from pform import All, Length
+
+        validator = All(DummyValidator('msg1'), Length(max=1))
+        error = validator.check(None, 'abc')
+        self.assertEqual(len(error.msg), 2)
+        self.assertIsNone(All(DummyValidator()).check(None, 'a'))
+
+
 class TestFunction(TestCase):
     def _makeOne(self, *arg, **kw):
         from pform import Function
@@ -133,6 +331,71 @@ class TestRegex(TestCase):
         self.assertEqual(self._makeOne(regex)(None, '01'), None)
         self.assertRaises(Invalid, self._makeOne(regex), None, 't')
 
+    def test_compiled_once(self):
+        self.assertIs(self._makeOne('[0-9]+').match_object,
+                      self._makeOne('[0-9]+').match_object)
+
+
+class TestRegexSet(TestCase):
+
+    def _makeOne(self, *patterns):
+        import re
+        from pform.validator import RegexSet
+        return RegexSet([re.compile(p) for p in patterns])
+
+    def test_match(self):
+        regexes = self._makeOne('[0-9]+$', '[a-z]', '(1|2)2', '')
+
+        self.assertEqual(regexes.match('123'), [True, False, True, True])
+        self.assertEqual(regexes.match('a1'), [False, True, False, True])
+        self.assertEqual(regexes.match(''), [False, False, False, True])
+
+    def test_inline_flags(self):
+        regexes = self._makeOne('(?i)[a-z]+$', '(?i)A')
+        self.assertEqual(regexes.match('ABC'), [True, True])
+        self.assertEqual(regexes.match('bc'), [True, False])
+
+    def test_not_combinable(self):
+        self.assertRaises(ValueError, self._makeOne, '(?i)a', 'b')
+        self.assertRaises(ValueError, self._makeOne, '(a)\\1', 'b')
+        self.assertRaises(ValueError, self._makeOne, '(?P<n>a)', 'b')
+        self.assertRaises(ValueError, self._makeOne, '(?x)a # a', '(?x)b')
+
+    def test_all(self):
+        from pform import All, Regex, Length, Invalid
+
+        all = All(Regex('[a-z]', 'lower'), Length(min=3),
+                  Regex('.*[0-9]$', 'digit'), Regex('(?i).', 'other flags'))
+
+        self.assertEqual(len(all.get_regexes()), 2)
+
+        self.assertIsNone(all(None, 'abc1'))
+        self.assertEqual(invalid_exc(all, None, '1').msg,
+                         ['lower', 'Shorter than minimum length 3'])
+        self.assertEqual(invalid_exc(all, None, 'abcd').msg, ['digit'])
+
+        all.validators.append(Regex('a', 'first'))
+        self.assertEqual(len(all.get_regexes()), 3)
+        self.assertEqual(invalid_exc(all, None, 'b1').msg,
+                         ['Shorter than minimum length 3', 'first'])
+
+    def test_all_fail_fast(self):
+        from pform import All, Regex
+
+        all = All(Regex('a', 'first'), Regex('b', 'second'), fail_fast=True)
+        self.assertEqual(invalid_exc(all, None, 'c').msg, ['first'])
+
+    def test_all_custom_regex(self):
+        from pform import All, Regex, Invalid
+
+        class MyRegex(Regex):
+            def check(self, field, value):
+                return Invalid('custom', field)
+
+        all = All(Regex('a'), MyRegex('a'))
+        self.assertIsNone(all.get_regexes())
+        self.assertEqual(invalid_exc(all, None, 'a').msg, ['custom'])
+
 
 class TestEmail(TestCase):
     def _makeOne(self):
@@ -160,6 +423,10 @@ class TestEmail(TestCase):
         self.assertRaises(Invalid, validator, None, '@here.us')
         self.assertRaises(Invalid, validator, None, '(name)@here.info')
 
+    def test_precompiled(self):
+        from pform.validator import EMAIL_RE
+        self.assertIs(self._makeOne().match_object, EMAIL_RE)
+
 class TestLength(TestCase):
     def _makeOne(self, min=None, max=None):
         from pform import Length
@@ -204,3 +471,42 @@ class TestOneOf(BaseTestCase):
         validator = self._makeOne([1, 2])
         e = invalid_exc(validator, None, None)
         self.assertEqual(str(e), '"None" is not one of 1, 2')
+
+    def test_index(self):
+        validator = self._makeOne(['a', ['b'], {'c': 1}])
+        self.assertEqual(validator.index, frozenset(['a']))
+
+        self.assertIsNone(validator(None, 'a'))
+        self.assertIsNone(validator(None, ['b']))
+        self.assertIsNone(validator(None, {'c': 1}))
+        invalid_exc(validator, None, 'b')
+        invalid_exc(validator, None, ['a'])
+
+    def test_failure_lazy_choices(self):
+        class Choice(object):
+            formatted = 0
+
+            def __hash__(self):
+                return 1
+
+            def __str__(self):
+                Choice.formatted += 1
+                return 'choice'
+
+        validator = self._makeOne([Choice()])
+        e = invalid_exc(validator, None, 'x')
+        self.assertEqual(Choice.formatted, 0)
+
+        self.assertEqual(str(e), '"x" is not one of choice')
+        self.assertEqual(Choice.formatted, 1)
+
+    def test_failure_truncated(self):
+        from pform import OneOf
+
+        e = invalid_exc(OneOf(range(5000)), None, -1)
+        self.assertEqual(
+            str(e), '"-1" is not one of %s, ...' % ', '.join(
+                str(i) for i in range(20)))
+
+        e = invalid_exc(OneOf(range(5), max_choices=2), None, -1)
+        self.assertEqual(str(e), '"-1" is not one of 0, 1, ...')
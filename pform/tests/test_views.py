@@ -0,0 +1,317 @@
+""" Tests for L{pform.views} """
+import shutil
+import tempfile
+from io import BytesIO
+from webob.multidict import MultiDict
+from pyramid.request import Request
+from pyramid.testing import DummySession
+from pyramid.httpexceptions import HTTPNotFound
+
+import pform
+from base import BaseTestCase
+
+
+states = {'US': (('TX', 'TX', 'Texas'), ('CA', 'CA', 'California')),
+          'KZ': (('AL', 'AL', 'Almaty'),)}
+
+
+class AddressForm(pform.Form):
+
+    fields = pform.Fieldset(
+        pform.TextField('name'),
+        pform.CompositeField('address', fields=(
+            pform.ChoiceField(
+                'country', default='US', vocabulary=('US', 'KZ')),
+            pform.DependentChoiceField(
+                'state', parent='country',
+                voc_provider=lambda country: states.get(country, ())),
+        )))
+
+
+class TestIncludeme(BaseTestCase):
+
+    def _routes(self):
+        mapper = self.config.get_routes_mapper()
+        return [route.name for route in mapper.get_routes()]
+
+    def test_upload_max_size_required(self):
+        from pyramid.exceptions import ConfigurationError
+
+        self.config.registry.settings['pform.upload_dir'] = '/tmp'
+        self.assertRaises(
+            ConfigurationError, self.config.include, 'pform.views')
+
+    def test_endpoints_opt_in(self):
+        self.assertNotIn('pform:field', self._routes())
+
+        self.config.include('pform.views')
+        self.assertIn('pform:field', self._routes())
+        self.assertIn('pform:batch', self._routes())
+
+
+class TestFindField(BaseTestCase):
+
+    def test_find_field(self):
+        from pform.views import find_field
+
+        fs = AddressForm.fields.bind(self.request)
+        self.assertIs(find_field(fs, 'name'), fs['name'])
+        self.assertIs(find_field(fs, 'address.state'),
+                      fs['address'].fields['state'])
+        self.assertRaises(KeyError, find_field, fs, 'unknown')
+        self.assertRaises(KeyError, find_field, fs, 'name.unknown')
+
+
+class TestFieldView(BaseTestCase):
+
+    def setUp(self):
+        super(TestFieldView, self).setUp()
+        self.config.provide_form('address', AddressForm)
+
+    def _make_request(self, form, field, params):
+        request = self.make_request(params=MultiDict(params))
+        request.matchdict = {'form': form, 'field': field}
+        return request
+
+    def test_field_view(self):
+        from pform.views import field_view
+
+        request = self._make_request(
+            'address', 'address.state',
+            {'address.country': 'KZ'})
+        body = field_view(request).text
+
+        self.assertIn('<select', body)
+        self.assertIn('Almaty', body)
+        self.assertNotIn('Texas', body)
+        self.assertNotIn('form.widgets.name', body)
+
+    def test_field_view_default_parent(self):
+        from pform.views import field_view
+
+        request = self._make_request('address', 'address.state', {})
+        body = field_view(request).text
+
+        self.assertIn('Texas', body)
+        self.assertNotIn('Almaty', body)
+
+    def test_field_view_not_found(self):
+        from pform.views import field_view
+
+        request = self._make_request('unknown', 'address.state', {})
+        self.assertRaises(HTTPNotFound, field_view, request)
+
+        request = self._make_request('address', 'address.unknown', {})
+        self.assertRaises(HTTPNotFound, field_view, request)
+
+    def test_route(self):
+        self.config.include('pform.views')
+        mapper = self.config.get_routes_mapper()
+        route = mapper.get_route('pform:field')
+        self.assertEqual(route.match('/_pform/address/field/address.state'),
+                         {'form': 'address', 'field': 'address.state'})
+
+
+class SignupForm(pform.Form):
+
+    fields = pform.Fieldset(
+        pform.TextField('email', validator=pform.Email()),
+        pform.ChoiceField('country', vocabulary=('US', 'KZ')),
+        pform.DependentChoiceField(
+            'state', parent='country',
+            voc_provider=lambda country: states.get(country, ())),
+        pform.Fieldset(
+            pform.TextField('nick', validator=pform.Length(min=3)),
+            name='profile'),
+        AddressForm.fields['address'],
+        validator=lambda fs, data: pform.Invalid('Form error', fs))
+
+
+class TestValidateFieldView(BaseTestCase):
+
+    def setUp(self):
+        super(TestValidateFieldView, self).setUp()
+        self.config.provide_form('signup', SignupForm)
+
+    def _validate(self, field, params):
+        from pform.views import validate_field_view
+
+        request = self.make_request(POST=MultiDict(params))
+        request.params = request.POST
+        request.matchdict = {'form': 'signup', 'field': field}
+        return validate_field_view(request).json_body
+
+    def test_select_field(self):
+        from pform.views import select_field
+
+        fs = select_field(SignupForm.fields, 'state')
+        self.assertEqual(list(fs), ['country', 'state'])
+        self.assertEqual(fs.validator.validators, [])
+
+        fs = select_field(SignupForm.fields, 'profile.nick')
+        self.assertEqual(list(fs), ['profile'])
+        self.assertEqual(fs['profile'].name, 'profile')
+        self.assertEqual(list(fs['profile']), ['nick'])
+
+        fs = select_field(SignupForm.fields, 'address.state')
+        self.assertEqual(list(fs), ['address'])
+
+        self.assertRaises(KeyError, select_field, SignupForm.fields, 'x')
+        self.assertRaises(
+            KeyError, select_field, SignupForm.fields, 'email.x')
+        self.assertRaises(
+            KeyError, select_field, SignupForm.fields, 'address.x')
+        self.assertRaises(
+            KeyError, select_field, SignupForm.fields, 'profile')
+
+    def test_valid(self):
+        self.assertEqual(
+            self._validate('email', {'email': 'me@example.com'}),
+            {'field': 'email', 'valid': True, 'errors': {}})
+
+    def test_invalid(self):
+        self.assertEqual(
+            self._validate('email', {'email': 'me', 'country': 'xx'}),
+            {'field': 'email', 'valid': False,
+             'errors': {'email': ['Invalid email address']}})
+
+        result = self._validate('email', {})
+        self.assertEqual(result['errors'], {'email': ['Required']})
+
+    def test_dependency(self):
+        result = self._validate('state', {'country': 'KZ', 'state': 'AL'})
+        self.assertTrue(result['valid'])
+
+        result = self._validate('state', {'country': 'US', 'state': 'AL'})
+        self.assertFalse(result['valid'])
+        self.assertIn('state', result['errors'])
+
+    def test_nested(self):
+        result = self._validate('profile.nick', {'profile.nick': 'ab'})
+        self.assertEqual(result['errors'], {
+            'profile.nick': ['Shorter than minimum length 3']})
+
+    def test_composite(self):
+        result = self._validate(
+            'address.state', {'address.country': 'KZ',
+                              'address.state': 'TX'})
+        self.assertEqual(list(result['errors']), ['address.state'])
+
+        result = self._validate(
+            'address.state', {'address.country': 'KZ',
+                              'address.state': 'AL'})
+        self.assertTrue(result['valid'])
+
+    def test_not_found(self):
+        self.assertRaises(HTTPNotFound, self._validate, 'unknown', {})
+
+    def test_route(self):
+        self.config.include('pform.views')
+        mapper = self.config.get_routes_mapper()
+        route = mapper.get_route('pform:validate')
+        self.assertEqual(route.match('/_pform/signup/validate/email'),
+                         {'form': 'signup', 'field': 'email'})
+
+
+class TestUploadViews(BaseTestCase):
+
+    def setUp(self):
+        super(TestUploadViews, self).setUp()
+        from pform.upload import UploadStaging
+
+        self.dir = tempfile.mkdtemp()
+        self.staging = UploadStaging(self.dir, 1024)
+        self.registry['pform:uploads'] = self.staging
+        self.session = DummySession()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        self.registry.pop('pform:uploads', None)
+
+    def _make_request(self, upload_id=None, body=b'', path='/',
+                      csrf=True, **kw):
+        request = Request.blank(path, method='PUT', body=body, **kw)
+        request.registry = self.registry
+        request.matchdict = {'id': upload_id}
+        request.session = self.session
+        if csrf:
+            request.headers['X-CSRF-Token'] = self.session.get_csrf_token()
+        return request
+
+    def _make_create_request(self, **params):
+        request = Request.blank('/', POST=params)
+        request.registry = self.registry
+        request.matchdict = {}
+        request.session = self.session
+        return request
+
+    def test_upload(self):
+        from pform.views import upload_create_view
+        from pform.views import upload_chunk_view
+        from pform.views import upload_status_view
+
+        request = self._make_create_request(
+            filename='test.txt', mimetype='text/plain', size='8',
+            csrf_token=self.session.get_csrf_token())
+        res = upload_create_view(request)
+        self.assertEqual(res.status_int, 201)
+        upload_id = res.json_body['id']
+
+        res = upload_chunk_view(self._make_request(
+            upload_id, b'1234', headers={'Upload-Offset': '0'}))
+        self.assertEqual(res.headers['Upload-Offset'], '4')
+        self.assertFalse(res.json_body['complete'])
+
+        # resend of received chunk
+        res = upload_chunk_view(self._make_request(
+            upload_id, b'1234', headers={'Upload-Offset': '0'}))
+        self.assertEqual(res.status_int, 409)
+        self.assertEqual(res.headers['Upload-Offset'], '4')
+
+        res = upload_status_view(self._make_request(upload_id))
+        self.assertEqual(res.json_body['offset'], 4)
+
+        res = upload_chunk_view(self._make_request(
+            upload_id, b'5678', path='/?offset=4'))
+        self.assertTrue(res.json_body['complete'])
+        self.assertEqual(self.staging.open(upload_id).read(), b'12345678')
+
+    def test_upload_errors(self):
+        from pform.views import upload_create_view
+        from pform.views import upload_chunk_view
+        from pform.views import upload_status_view
+        from pyramid.httpexceptions import HTTPBadRequest
+
+        request = self._make_create_request(
+            size='abc', csrf_token=self.session.get_csrf_token())
+        self.assertRaises(HTTPBadRequest, upload_create_view, request)
+
+        self.assertRaises(
+            HTTPNotFound, upload_status_view, self._make_request('0' * 32))
+        self.assertRaises(
+            HTTPNotFound, upload_chunk_view,
+            self._make_request('0' * 32, headers={'Upload-Offset': '0'}))
+        self.assertRaises(
+            HTTPBadRequest, upload_chunk_view, self._make_request('0' * 32))
+
+        del self.registry['pform:uploads']
+        self.assertRaises(
+            HTTPNotFound, upload_status_view, self._make_request('0' * 32))
+
+    def test_upload_csrf(self):
+        from pform.views import upload_create_view
+        from pform.views import upload_chunk_view
+        from pyramid.httpexceptions import HTTPForbidden
+
+        request = self._make_create_request(size='4')
+        self.assertRaises(HTTPForbidden, upload_create_view, request)
+
+        request = self._make_create_request(size='4', csrf_token='wrong')
+        self.assertRaises(HTTPForbidden, upload_create_view, request)
+
+        meta = self.staging.create('test.txt', 'text/plain', 4)
+        self.assertRaises(
+            HTTPForbidden, upload_chunk_view, self._make_request(
+                meta['id'], b'data', csrf=False,
+                headers={'Upload-Offset': '0'}))
+        self.assertEqual(self.staging.get(meta['id'])['offset'], 0)
@@ -186,3 +186,57 @@ class VocabularyTests(TestCase):
         vocab = MyVocabulary(1, 2, 3)
         for term in vocab:
             self.assertEqual(term.value + 1, term.nextvalue)
+
+
+class VocabularyTitlesTests(TestCase):
+
+    def _make_request(self, locale_name):
+        class Localizer(object):
+            def __init__(self):
+                self.locale_name = locale_name
+                self.calls = []
+
+            def translate(self, msg):
+                self.calls.append(msg)
+                return '%s-%s' % (msg, self.locale_name)
+
+        class Request(object):
+            registry = {}
+            localizer = Localizer()
+
+        return Request()
+
+    def test_titles(self):
+        voc = vocabulary.Vocabulary((1, 'one', 'One'), (2, 'two'))
+
+        titles = voc.get_titles()
+        self.assertEqual([title for term, title in titles], ['One', 'two'])
+        self.assertIs(titles[0][0], voc.get_term(1))
+        self.assertIs(voc.get_titles(), titles)
+
+    def test_titles_translated(self):
+        from translationstring import TranslationString
+
+        voc = vocabulary.Vocabulary(
+            (1, 'one', TranslationString('One')),
+            (2, 'two', 'Two'))
+
+        en = self._make_request('en')
+        titles = voc.get_titles(en)
+        self.assertEqual([title for term, title in titles], ['One-en', 'Two'])
+        self.assertIs(voc.get_titles(en), titles)
+        self.assertEqual(en.localizer.calls, ['One'])
+
+        de = self._make_request('de')
+        titles = voc.get_titles(de)
+        self.assertEqual([title for term, title in titles], ['One-de', 'Two'])
+
+    def test_titles_sorted(self):
+        voc = vocabulary.Vocabulary(
+            (1, 'one', 'b'), (2, 'two', 'Á'), (3, 'three', 'c'))
+
+        titles = voc.get_titles(sort=True)
+        self.assertEqual([term.value for term, title in titles], [2, 1, 3])
+
+        titles = voc.get_titles(sort=True, key=lambda title: title)
+        self.assertEqual([term.value for term, title in titles], [1, 3, 2])
@@ -0,0 +1,355 @@
+""" Streaming multipart/form-data parser, chunked uploads staging """
+import os
+import re
+import json
+import time
+import uuid
+import errno
+import tempfile
+from io import BytesIO
+from webob.multidict import MultiDict
+from pyramid.httpexceptions import HTTPBadRequest
+from pyramid.httpexceptions import HTTPRequestEntityTooLarge
+
+CHUNK_SIZE = 64 * 1024
+SPOOL_SIZE = 1024 * 1024
+MAX_HEADER_SIZE = 16 * 1024
+
+# staged uploads expire after one day of inactivity
+UPLOAD_TTL = 24 * 60 * 60
+
+_param_re = re.compile(
+    r';\s*([^\s=;]+)\s*=\s*(?:"((?:[^"\\]|\\.)*)"|([^;]*))')
+
+
+def parse_header(line):
+    """ Parse header value, return value and dictionary of params """
+    value = line.split(';', 1)[0].strip().lower()
+    params = {}
+    for name, quoted, token in _param_re.findall(line):
+        if quoted:
+            token = re.sub(r'\\(.)', r'\1', quoted)
+        params[name.lower()] = token.strip()
+
+    return value, params
+
+
+class UploadedFile(object):
+    """ Uploaded file, it has same attributes as ``cgi.FieldStorage``
+    instance, so :py:class:`pform.FileField` handles it as regular
+    upload.
+
+    ``length``: Size of uploaded data, it is always known.
+    """
+
+    def __init__(self, name, filename, type, file, length):
+        self.name = name
+        self.filename = filename
+        self.type = type
+        self.file = file
+        self.length = length
+
+    def __repr__(self):
+        return 'UploadedFile<%s: %s %s>' % (
+            self.name, self.filename, self.length)
+
+
+class _Reader(object):
+
+    def __init__(self, fp, content_length, max_content_length):
+        self.fp = fp
+        self.remaining = content_length
+        self.limit = max_content_length
+        self.total = 0
+
+    def read(self, size=CHUNK_SIZE):
+        if self.remaining is not None:
+            size = min(size, self.remaining)
+            if not size:
+                return b''
+
+        data = self.fp.read(size)
+        self.total += len(data)
+        if self.remaining is not None:
+            self.remaining -= len(data)
+
+        if self.limit is not None and self.total > self.limit:
+            raise HTTPRequestEntityTooLarge()
+
+        return data
+
+
+def parse_multipart(fp, content_type, content_length=None,
+                    max_content_length=None, limits=None, charset='utf-8'):
+    """ Parse ``multipart/form-data`` request body from ``fp`` stream,
+    data is consumed while reading. Files are written to spooled
+    temporary files without intermediate copies.
+
+    ``max_content_length``: Maximum size of request body.
+
+    ``limits``: Dictionary of maximum part sizes, keyed by param name.
+
+    Raises :py:class:`pyramid.httpexceptions.HTTPRequestEntityTooLarge`
+    as soon as request body or part exceeds its limit.
+    """
+    ctype, params = parse_header(content_type)
+    boundary = params.get('boundary')
+    if ctype != 'multipart/form-data' or not boundary:
+        raise HTTPBadRequest('Multipart boundary is not found.')
+
+    if (max_content_length is not None and content_length is not None and
+            content_length > max_content_length):
+        raise HTTPRequestEntityTooLarge()
+
+    limits = limits or {}
+    reader = _Reader(fp, content_length, max_content_length)
+    boundary = b'--' + boundary.encode('latin1')
+    delimiter = b'\r\n' + boundary
+
+    result = MultiDict()
+
+    # preamble
+    buf = b'\r\n'
+    while True:
+        idx = buf.find(delimiter)
+        if idx >= 0:
+            buf = buf[idx + len(delimiter):]
+            break
+        chunk = reader.read()
+        if not chunk:
+            raise HTTPBadRequest('Multipart boundary is not found.')
+        buf = buf[-len(delimiter):] + chunk
+
+    while True:
+        while len(buf) < 2:
+            chunk = reader.read()
+            if not chunk:
+                raise HTTPBadRequest('Unexpected end of multipart data.')
+            buf += chunk
+
+        if buf[:2] == b'--':
+            break
+        buf = buf[2:]
+
+        # part headers
+        while b'\r\n\r\n' not in buf:
+            if len(buf) > MAX_HEADER_SIZE:
+                raise HTTPBadRequest('Multipart headers are too long.')
+            chunk = reader.read()
+            if not chunk:
+                raise HTTPBadRequest('Unexpected end of multipart data.')
+            buf += chunk
+
+        head, buf = buf.split(b'\r\n\r\n', 1)
+        headers = {}
+        for line in head.decode(charset, 'replace').split('\r\n'):
+            if ':' in line:
+                hname, hvalue = line.split(':', 1)
+                headers[hname.strip().lower()] = hvalue.strip()
+
+        disposition, dparams = parse_header(
+            headers.get('content-disposition', ''))
+        name = dparams.get('name', '')
+        filename = dparams.get('filename')
+        limit = limits.get(name)
+
+        if filename:
+            out = tempfile.SpooledTemporaryFile(SPOOL_SIZE)
+        else:
+            out = BytesIO()
+
+        # part body
+        size = 0
+        while True:
+            idx = buf.find(delimiter)
+            if idx >= 0:
+                data, buf = buf[:idx], buf[idx + len(delimiter):]
+            else:
+                keep = len(delimiter) - 1
+                data, buf = buf[:-keep], buf[-keep:]
+
+            size += len(data)
+            if limit is not None and size > limit:
+                raise HTTPRequestEntityTooLarge()
+            out.write(data)
+
+            if idx >= 0:
+                break
+
+            chunk = reader.read()
+            if not chunk:
+                raise HTTPBadRequest('Unexpected end of multipart data.')
+            buf += chunk
+
+        if filename:
+            out.seek(0)
+            result.add(name, UploadedFile(
+                name, filename,
+                parse_header(headers.get('content-type', ''))[0],
+                out, size))
+        else:
+            result.add(name, out.getvalue().decode(charset, 'replace'))
+
+    return result
+
+
+class UploadStaging(object):
+    """ Staging directory for resumable chunked uploads. Each upload is
+    stored as data file and json metadata file. Chunks are appended
+    with offset verification, one chunk of upload is appended at a time.
+
+    ``path``: Staging directory.
+
+    ``max_size``: Maximum upload size, it is required.
+
+    ``ttl``: Uploads are removed after ``ttl`` seconds of inactivity,
+      expired uploads are removed while new uploads are created.
+    """
+
+    _id_re = re.compile('^[0-9a-f]{32}$')
+
+    cleanup_interval = 60
+
+    def __init__(self, path, max_size, ttl=UPLOAD_TTL, timer=time.time):
+        if not max_size or max_size < 0:
+            raise ValueError("Maximum upload size is required.")
+
+        self.root = os.path.abspath(path)
+        self.max_size = max_size
+        self.ttl = ttl
+        self.timer = timer
+        self.cleaned = 0
+
+        if not os.path.isdir(self.root):
+            os.makedirs(self.root)
+
+    def _path(self, upload_id, ext):
+        if not self._id_re.match(upload_id or ''):
+            raise KeyError(upload_id)
+        return os.path.join(self.root, '%s.%s' % (upload_id, ext))
+
+    def _write_meta(self, upload_id, meta):
+        path = self._path(upload_id, 'json')
+        with open(path + '.tmp', 'w') as fp:
+            json.dump(meta, fp)
+        os.rename(path + '.tmp', path)
+
+    def create(self, filename, mimetype, size):
+        """ Create new upload, ``size`` is total upload size.
+        Return upload metadata. """
+        if size > self.max_size:
+            raise HTTPRequestEntityTooLarge()
+
+        now = self.timer()
+        if now - self.cleaned > self.cleanup_interval:
+            self.cleaned = now
+            self.cleanup()
+
+        upload_id = uuid.uuid4().hex
+        open(self._path(upload_id, 'data'), 'wb').close()
+
+        meta = {'id': upload_id,
+                'filename': filename,
+                'mimetype': mimetype,
+                'size': size,
+                'offset': 0,
+                'complete': size == 0}
+        self._write_meta(upload_id, meta)
+        return meta
+
+    def get(self, upload_id):
+        """ Return upload metadata, raise ``KeyError`` if upload
+        is not found """
+        try:
+            with open(self._path(upload_id, 'json')) as fp:
+                return json.load(fp)
+        except (IOError, OSError):
+            raise KeyError(upload_id)
+
+    def open(self, upload_id):
+        """ Open upload data for reading """
+        return open(self._path(upload_id, 'data'), 'rb')
+
+    def append(self, upload_id, offset, fp, length=None):
+        """ Append chunk from ``fp`` at ``offset``. Offset should be
+        equal to size of already received data, otherwise ``ValueError``
+        is raised. ``ValueError`` is raised also if other chunk of
+        upload is being appended. Return upload metadata. """
+        meta = self.get(upload_id)
+
+        lock = self._path(upload_id, 'lock')
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+            raise ValueError(meta['offset'])
+
+        try:
+            meta = self.get(upload_id)
+            return self._append(upload_id, meta, offset, fp, length)
+        finally:
+            os.close(fd)
+            os.unlink(lock)
+
+    def _append(self, upload_id, meta, offset, fp, length):
+        if meta['offset'] != offset:
+            raise ValueError(meta['offset'])
+
+        limit = meta['size'] - offset
+        if length is not None and length > limit:
+            raise HTTPRequestEntityTooLarge()
+
+        received = 0
+        with open(self._path(upload_id, 'data'), 'r+b') as out:
+            out.seek(offset)
+            out.truncate()
+            while True:
+                chunk = fp.read(CHUNK_SIZE if length is None else
+                                min(CHUNK_SIZE, length - received))
+                if not chunk:
+                    break
+                received += len(chunk)
+                if received > limit:
+                    out.truncate(offset)
+                    raise HTTPRequestEntityTooLarge()
+                out.write(chunk)
+
+                if length is not None and received >= length:
+                    break
+
+        meta['offset'] = offset + received
+        meta['complete'] = meta['offset'] == meta['size']
+        self._write_meta(upload_id, meta)
+        return meta
+
+    def remove(self, upload_id):
+        """ Remove upload """
+        for ext in ('data', 'json', 'lock'):
+            path = self._path(upload_id, ext)
+            if os.path.exists(path):
+                os.unlink(path)
+
+    def cleanup(self):
+        """ Remove uploads that are not changed for ``ttl`` seconds """
+        expires = self.timer() - self.ttl
+
+        for name in os.listdir(self.root):
+            upload_id, _, ext = name.partition('.')
+            if ext != 'json' or not self._id_re.match(upload_id):
+                continue
+
+            try:
+                expired = os.path.getmtime(
+                    os.path.join(self.root, name)) < expires
+            except OSError:
+                continue
+
+            if expired:
+                self.remove(upload_id)
+
+
+def get_upload_staging(request):
+    """ Return upload staging configured with ``pform.upload_dir``
+    setting, return ``None`` if staging is not configured """
+    return request.registry.get('pform:uploads')
@@ -1,29 +1,394 @@
 """ Code from `colander` package """
 import re
+import time
+import threading
 from pyramid.compat import string_types
+from pform.cache import LRUCache
+from pform.concurrency import Blocking, iscoroutine, run_tasks
 from pform.interfaces import _, Invalid
 
+# validator class -> validator implements check()
+_checkers = {}
 
-class All(object):
-    """ Composite validator which succeeds if none of its
-    subvalidators raises an :class:`Invalid` exception"""
+# cost of validators without ``cost`` attribute
+DEFAULT_COST = 10
 
-    def __init__(self, *validators):
-        self.validators = list(validators)
+REGEX_CACHE_SIZE = 512
+
+_pattern_type = type(re.compile(''))
+_inline_flags_re = re.compile(r'^\(\?[aiLmsux]+\)')
+_backref_re = re.compile(r'\\[1-9]|\(\?P=')
+
+_marker = object()
+
+
+def overrides(cls, name, base):
+    """ Check if ``cls`` overrides method ``name`` closer than
+    method ``base`` """
+    for klass in cls.__mro__:
+        if base in klass.__dict__:
+            return False
+        if name in klass.__dict__:
+            return True
+
+    return False
+
+
+def check_validator(validator, field, value):
+    """ Run validator, return :class:`Invalid` error or ``None``.
+    Validators that implement ``check(field, value)`` are checked
+    without raising exceptions, other validators are called.
+
+    Coroutine and ``blocking`` validators return :class:`Pending`.
+    """
+    if getattr(validator, 'blocking', False):
+        return Pending(
+            [Blocking(lambda: _check(validator, field, value))],
+            _task_error)
+
+    return _check(validator, field, value)
+
+
+def _check(validator, field, value):
+    cls = type(validator)
+    checker = _checkers.get(cls)
+    if checker is None:
+        checker = _checkers[cls] = (
+            hasattr(cls, 'check') and not overrides(cls, '__call__', 'check'))
+
+    if checker:
+        result = validator.check(field, value)
+    else:
+        try:
+            result = validator(field, value)
+        except Invalid as e:
+            return e
+
+    if iscoroutine(result):
+        return Pending([result], _task_error)
+    if isinstance(result, (Invalid, Pending)):
+        return result
+
+
+def resolve(result, executor=None):
+    """ Resolve :class:`Pending` validation result, coroutines are
+    awaited on event loop in worker thread, blocking validators are
+    executed on ``executor``. Return error or ``None`` """
+    while isinstance(result, Pending):
+        result = result.set_results(run_tasks(result.tasks, executor))
+
+    return result
+
+
+def _task_error(results):
+    result = results[0]
+    if isinstance(result, (Invalid, Pending)):
+        return result
+    if isinstance(result, BaseException):
+        raise result
+
+
+class Pending(object):
+    """ Result of asynchronous validation. Fieldset runs ``tasks``
+    (coroutines or blocking calls) concurrently and passes their
+    results to ``resolve`` which returns :class:`Invalid` error,
+    ``None`` or another :class:`Pending`.
+
+    Coroutine validator returns or raises :class:`Invalid` error.
+    """
+
+    error = None
+
+    def __init__(self, tasks, resolve):
+        self.tasks = tasks
+        self.resolve = resolve
+
+    def set_results(self, results):
+        """ Resolve validation with results of tasks """
+        self.error = self.resolve(results)
+        return self.error
+
+    def close(self):
+        """ Close coroutines of validation which is not run """
+        for task in self.tasks:
+            if iscoroutine(task):
+                task.close()
+
+    @classmethod
+    def combine(cls, pendings, finish, errors=()):
+        """ Combine pending validations, ``finish`` receives list of
+        ``errors`` and resolved errors """
+        def resolve(results):
+            resolved = list(errors)
+            nested = []
+
+            idx = 0
+            for pending in pendings:
+                count = len(pending.tasks)
+                error = pending.set_results(results[idx:idx+count])
+                idx += count
+
+                if isinstance(error, Pending):
+                    nested.append(error)
+                elif error is not None:
+                    resolved.append(error)
+
+            if nested:
+                return cls.combine(nested, finish, resolved)
+            return finish(resolved)
+
+        return cls([task for pending in pendings
+                    for task in pending.tasks], resolve)
+
+
+class Validator(object):
+    """ Base validator class. Subclasses implement ``check`` which
+    returns :class:`Invalid` error or ``None``, calling validator
+    raises error.
+
+    ``cost``: Relative validation cost, used by :class:`All` for
+      validators ordering.
+
+    ``blocking``: Validator blocks on I/O, it is executed on thread
+      pool concurrently with other blocking validators.
+    """
+
+    cost = 1
+    blocking = False
+
+    def check(self, field, value):
+        raise NotImplementedError() # pragma: no cover
 
     def __call__(self, field, value):
-        msgs = []
-        for validator in self.validators:
-            try:
-                validator(field, value)
-            except Invalid as e:
-                msgs.append(str(e))
+        error = resolve(self.check(field, value))
+        if error is not None:
+            raise error
+
+
+class All(Validator):
+    """ Composite validator which succeeds if none of its
+    subvalidators raises an :class:`Invalid` exception
+
+    ``ordered``: Run validators in order of their cost, declared
+      with ``cost`` attribute or measured if ``measure`` is enabled.
+
+    ``fail_fast``: Stop on first failed validator.
+
+    ``measure``: Record validators timings, ``timings`` is mapping of
+      validator to ``(calls, total time)``. Once all validators are
+      measured, ordered validators are sorted by average time.
 
-        if msgs:
-            raise Invalid(msgs, field)
+    :class:`Regex` subvalidators are matched in one pass with combined
+    pattern, see :class:`RegexSet`.
 
+    .. code-block:: python
 
-class Function(object):
+      validator = All(
+          Function(username_is_available),
+          Length(min=3, max=30),
+          ordered=True, fail_fast=True)
+    """
+
+    def __init__(self, *validators, **kw):
+        self.validators = list(validators)
+        self.ordered = kw.pop('ordered', False)
+        self.fail_fast = kw.pop('fail_fast', False)
+        self.measure = kw.pop('measure', False)
+        if kw:
+            raise TypeError('Unknown arguments: %s' % ', '.join(kw))
+
+        self.timings = {}
+        self._lock = threading.Lock()
+        self._regexes = None
+
+    @property
+    def cost(self):
+        return sum(getattr(v, 'cost', DEFAULT_COST) for v in self.validators)
+
+    def get_validators(self):
+        """ Return validators in execution order """
+        if not self.ordered:
+            return self.validators
+
+        timings = self.timings
+        if self.measure and all(v in timings for v in self.validators):
+            def key(v):
+                calls, total = timings[v]
+                return total / calls
+        else:
+            def key(v):
+                return getattr(v, 'cost', DEFAULT_COST)
+
+        return sorted(self.validators, key=key)
+
+    def get_regexes(self):
+        """ Return mapping of :class:`Regex` subvalidators to
+        :class:`RegexSet` and pattern index, patterns with same flags
+        are combined. Return ``None`` if there is nothing to combine """
+        cached = self._regexes
+        if cached is None or cached[0] != self.validators:
+            groups = {}
+            for v in self.validators:
+                if _is_regex(v) and _combinable(v.match_object):
+                    groups.setdefault(v.match_object.flags, []).append(v)
+
+            regexes = {}
+            for validators in groups.values():
+                if len(validators) > 1:
+                    regexset = RegexSet([v.match_object for v in validators])
+                    for idx, v in enumerate(validators):
+                        regexes[v] = (regexset, idx)
+
+            cached = self._regexes = (list(self.validators), regexes or None)
+
+        return cached[1]
+
+    def check(self, field, value):
+        errors = []
+        pendings = []
+        regexes = None if self.measure else self.get_regexes()
+        matched = {}
+        for validator in self.get_validators():
+            if self.measure:
+                started = time.time()
+                error = check_validator(validator, field, value)
+                self.record(validator, time.time() - started)
+            elif regexes is not None and validator in regexes:
+                regexset, idx = regexes[validator]
+                result = matched.get(regexset)
+                if result is None:
+                    result = matched[regexset] = regexset.match(value)
+                if result[idx]:
+                    error = None
+                else:
+                    error = Invalid(validator.msg, field)
+            else:
+                error = check_validator(validator, field, value)
+
+            if isinstance(error, Pending):
+                pendings.append(error)
+            elif error is not None:
+                errors.append(error)
+                if self.fail_fast:
+                    break
+
+        if pendings and errors and self.fail_fast:
+            for pending in pendings:
+                pending.close()
+
+        elif pendings:
+            def finish(errors):
+                if errors:
+                    return AllInvalid(
+                        errors[:1] if self.fail_fast else errors, field)
+
+            return Pending.combine(pendings, finish, errors)
+
+        if errors:
+            return AllInvalid(errors, field)
+
+    def record(self, validator, duration):
+        """ Record validator timing """
+        with self._lock:
+            calls, total = self.timings.get(validator, (0, 0.0))
+            self.timings[validator] = (calls + 1, total + duration)
+
+
+class AllInvalid(Invalid):
+    """ :class:`All` validator error. ``msg`` is list of translated
+    messages of ``suberrors``, it is computed on first access. """
+
+    def __init__(self, errors, field):
+        self.suberrors = errors
+        super(AllInvalid, self).__init__(None, field)
+
+    @property
+    def msg(self):
+        if self._msg is None:
+            self._msg = [str(error) for error in self.suberrors]
+        return self._msg
+
+    @msg.setter
+    def msg(self, value):
+        self._msg = value
+
+
+class Memoize(Validator):
+    """ Validator wrapper which caches validation outcome, both
+    success and failure, keyed by value. Unhashable values are
+    not cached. Wrapped validator should depend on value only.
+
+    ``maxsize``: Maximum number of cached values.
+
+    ``ttl``: Cached outcome time-to-live in seconds.
+
+    ``key``: Function that computes cache key from value.
+
+    .. code-block:: python
+
+      validator = Memoize(
+          Function(username_is_available), maxsize=1000, ttl=60)
+    """
+
+    def __init__(self, validator, maxsize=1024, ttl=None, key=None):
+        self.validator = validator
+        self.key = key
+        self.cache = LRUCache(maxsize, ttl)
+
+    @property
+    def cost(self):
+        return getattr(self.validator, 'cost', DEFAULT_COST)
+
+    def _freeze(self, error):
+        if isinstance(error, AllInvalid):
+            return (AllInvalid,
+                    [self._freeze(err) for err in error.suberrors])
+        return (error.__class__, error.msg, error.mapping)
+
+    def _thaw(self, frozen, field):
+        if frozen[0] is AllInvalid:
+            return AllInvalid(
+                [self._thaw(err, field) for err in frozen[1]], field)
+        return frozen[0](frozen[1], field, frozen[2])
+
+    def check(self, field, value):
+        try:
+            key = value if self.key is None else self.key(value)
+            hash(key)
+        except TypeError:
+            return check_validator(self.validator, field, value)
+
+        frozen = self.cache.get(key, _marker)
+        if frozen is _marker:
+            error = check_validator(self.validator, field, value)
+            if isinstance(error, Pending):
+                return Pending.combine(
+                    [error], lambda errors: self._store(key, errors[0]
+                                                        if errors else None))
+
+            return self._store(key, error)
+
+        if frozen is not None:
+            return self._thaw(frozen, field)
+
+    def _store(self, key, error):
+        self.cache.set(
+            key, self._freeze(error) if error is not None else None)
+        return error
+
+    def invalidate(self, *values):
+        """ Drop cached outcome for values, drop all if values
+        are not specified """
+        if self.key is not None:
+            values = [self.key(value) for value in values]
+        self.cache.invalidate(*values)
+
+    def stats(self):
+        """ Return cache statistics """
+        return self.cache.stats()
+
+
+class Function(Validator):
     """ Validator which accepts a function and an optional message;
     the function is called with the ``value`` during validation.
 
@@ -48,23 +413,32 @@ class Function(object):
 
     The default value for the ``message`` when not provided via the
     constructor is ``Invalid value``.
+
+    If ``blocking`` is true, function is executed on thread pool
+    concurrently with other blocking validators of the form.
     """
 
-    def __init__(self, function, message=_('Invalid value')):
+    cost = DEFAULT_COST
+
+    def __init__(self, function, message=_('Invalid value'), cost=None,
+                 blocking=False):
         self.function = function
         self.message = message
+        self.blocking = blocking
+        if cost is not None:
+            self.cost = cost
 
-    def __call__(self, field, value):
+    def check(self, field, value):
         result = self.function(value)
 
         if not result:
-            raise Invalid(self.message, field)
+            return Invalid(self.message, field)
 
         if isinstance(result, string_types):
-            raise Invalid(result, field)
+            return Invalid(result, field)
 
 
-class Regex(object):
+class Regex(Validator):
     """ Regular expression validator.
 
         Initialize it with the string regular expression ``regex``
@@ -74,16 +448,20 @@ class Regex(object):
         not match expected pattern'.
 
         The ``regex`` argument may also be a pattern object (the
-        result of ``re.compile``) instead of a string.
+        result of ``re.compile``) instead of a string. String patterns
+        are compiled once and shared between validators,
+        see :func:`compile_regex`.
 
         When calling, if ``value`` matches the regular expression,
         validation succeeds; otherwise, :exc:`ptah.form.Invalid` is
         raised with the ``msg`` error message.
     """
 
+    cost = 2
+
     def __init__(self, regex, msg=None):
         if isinstance(regex, string_types):
-            self.match_object = re.compile(regex)
+            self.match_object = compile_regex(regex)
         else:
             self.match_object = regex
         if msg is None:
@@ -91,9 +469,12 @@ class Regex(object):
         else:
             self.msg = msg
 
-    def __call__(self, field, value):
+    def check(self, field, value):
         if self.match_object.match(value) is None:
-            raise Invalid(self.msg, field)
+            return Invalid(self.msg, field)
+
+
+EMAIL_RE = re.compile(r'(?i)^[A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,4}$')
 
 
 class Email(Regex):
@@ -106,11 +487,89 @@ class Email(Regex):
         if msg is None:
             msg = _("Invalid email address")
 
-        super(Email, self).__init__(
-            '(?i)^[A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,4}$', msg=msg)
+        super(Email, self).__init__(EMAIL_RE, msg=msg)
+
+
+_regex_cache = {}
+
+
+def compile_regex(pattern, flags=0):
+    """ Compile regular expression, compiled patterns are cached.
+    Cache is not shared with ``re`` module, so form patterns are not
+    evicted by other code. """
+    key = (pattern, flags)
+    compiled = _regex_cache.get(key)
+    if compiled is None:
+        if len(_regex_cache) >= REGEX_CACHE_SIZE:
+            _regex_cache.clear()
+        compiled = _regex_cache[key] = re.compile(pattern, flags)
+
+    return compiled
+
+
+def _is_regex(validator):
+    """ Check if validator is :class:`Regex` with compiled pattern
+    and default behaviour """
+    for klass in type(validator).__mro__:
+        if klass is Regex:
+            return isinstance(validator.match_object, _pattern_type)
+        if 'check' in klass.__dict__ or '__call__' in klass.__dict__:
+            return False
+
+    return False
+
+
+def _combinable(pattern):
+    source = pattern.pattern
+    return (isinstance(source, string_types) and
+            not pattern.flags & re.VERBOSE and
+            not pattern.groupindex and
+            _backref_re.search(source) is None)
+
 
+class RegexSet(object):
+    """ Matches value against several patterns in one pass. Each
+    pattern is wrapped into optional lookahead group, so combined
+    pattern always matches and group is set only if its pattern matches
+    at start of value, same as ``pattern.match(value)``.
 
-class Range(object):
+    Raises ``ValueError`` if patterns can not be combined, i.e. they
+    use different flags, verbose mode, named groups or backreferences.
+    """
+
+    def __init__(self, patterns):
+        flags = set(p.flags for p in patterns)
+        if len(flags) != 1:
+            raise ValueError('Patterns use different flags')
+        flags = flags.pop()
+
+        parts = []
+        self.groups = []
+        idx = 1
+        for pattern in patterns:
+            if not _combinable(pattern):
+                raise ValueError(
+                    'Pattern can not be combined: %r' % pattern.pattern)
+
+            # global flags are passed to combined pattern
+            source = _inline_flags_re.sub('', pattern.pattern)
+
+            parts.append('(?:(?=(%s))|)' % source)
+            self.groups.append(idx)
+            idx += 1 + pattern.groups
+
+        try:
+            self.match_object = re.compile(''.join(parts), flags)
+        except re.error as e:
+            raise ValueError(str(e))
+
+    def match(self, value):
+        """ Return list of match results, one for each pattern """
+        match = self.match_object.match(value)
+        return [match.group(idx) is not None for idx in self.groups]
+
+
+class Range(Validator):
     """ Validator which succeeds if the value it is passed is greater
     or equal to ``min`` and less than or equal to ``max``.  If ``min``
     is not specified, or is specified as ``None``, no lower bound
@@ -146,21 +605,21 @@ class Range(object):
         if max_err is not None:
             self.max_err = max_err
 
-    def __call__(self, field, value):
+    def check(self, field, value):
         if self.min is not None:
             if value < self.min:
                 min_err = _(self.min_err,
                             mapping={'val': value, 'min': self.min})
-                raise Invalid(min_err, field)
+                return Invalid(min_err, field)
 
         if self.max is not None:
             if value > self.max:
                 max_err = _(self.max_err,
                             mapping={'val': value, 'max': self.max})
-                raise Invalid(max_err, field)
+                return Invalid(max_err, field)
 
 
-class Length(object):
+class Length(Validator):
     """ Validator which succeeds if the value passed to it has a
     length between a minimum and maximum.  The value is most often a
     string."""
@@ -169,29 +628,77 @@ class Length(object):
         self.min = min
         self.max = max
 
-    def __call__(self, field, value):
+    def check(self, field, value):
         if self.min is not None:
             if len(value) < self.min:
                 min_err = _('Shorter than minimum length ${min}',
                             mapping={'min': self.min})
-                raise Invalid(min_err, field)
+                return Invalid(min_err, field)
 
         if self.max is not None:
             if len(value) > self.max:
                 max_err = _('Longer than maximum length ${max}',
                             mapping={'max': self.max})
-                raise Invalid(max_err, field)
+                return Invalid(max_err, field)
 
 
-class OneOf(object):
+class OneOf(Validator):
     """ Validator which succeeds if the value passed to it is one of
-    a fixed set of values """
+    a fixed set of values.
+
+    Hashable choices are indexed in frozenset, unhashable choices are
+    checked sequentially. Choices are formatted only when error message
+    is rendered, at most ``max_choices`` choices are listed.
+    """
+
+    max_choices = 20
 
-    def __init__(self, choices):
+    def __init__(self, choices, max_choices=None):
         self.choices = choices
+        if max_choices is not None:
+            self.max_choices = max_choices
 
-    def __call__(self, field, value):
-        if not value in self.choices:
-            choices = ', '.join(['%s' % x for x in self.choices])
+        index = []
+        self.unhashable = []
+        for choice in choices:
+            try:
+                hash(choice)
+            except TypeError:
+                self.unhashable.append(choice)
+            else:
+                index.append(choice)
+        self.index = frozenset(index)
+
+    def check(self, field, value):
+        try:
+            if value in self.index:
+                return
+            found = value in self.unhashable
+        except TypeError:
+            found = value in self.choices
+
+        if not found:
             err = _('"${val}" is not one of ${choices}')
-            raise Invalid(err, field, {'val': value, 'choices': choices})
+            return Invalid(err, field, {
+                'val': value,
+                'choices': _Choices(self.choices, self.max_choices)})
+
+
+class _Choices(object):
+    """ Choices of :class:`OneOf` error message, formatted on
+    conversion to string """
+
+    def __init__(self, choices, limit):
+        self.choices = choices
+        self.limit = limit
+
+    def __str__(self):
+        choices = list(self.choices)
+        if self.limit and len(choices) > self.limit:
+            return '%s, ...' % ', '.join(
+                ['%s' % x for x in choices[:self.limit]])
+
+        return ', '.join(['%s' % x for x in choices])
+
+    __unicode__ = __str__
+
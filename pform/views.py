@@ -0,0 +1,268 @@
+""" pform endpoints """
+from pyramid.response import Response
+from pyramid.httpexceptions import HTTPNotFound
+from pyramid.httpexceptions import HTTPForbidden
+from pyramid.exceptions import ConfigurationError
+from pyramid.httpexceptions import HTTPConflict
+from pyramid.httpexceptions import HTTPBadRequest
+
+from pform.field import Field
+from pform.fieldset import Fieldset
+from pform.composite import CompositeField
+from pform.form import FormWidgets
+from pform.jsonapi import batch_response, error_messages, json_schema
+from pform.jsonapi import BATCH_MAX_ITEMS
+from pform.directives import get_form_factory
+from pform.upload import UploadStaging, UPLOAD_TTL
+from pform.upload import get_upload_staging
+
+ROUTE_PREFIX = '/_pform'
+
+CSRF_HEADER = 'X-CSRF-Token'
+CSRF_PARAM = 'csrf_token'
+
+
+def find_field(fieldset, name):
+    """ Find field in bound fieldset by dotted name,
+    i.e. ``address.state`` """
+    item = fieldset
+    for part in name.split('.'):
+        if isinstance(item, CompositeField):
+            item = item.fields
+        if not isinstance(item, Fieldset) or part not in item:
+            raise KeyError(name)
+        item = item[part]
+
+    return item
+
+
+def select_field(fieldset, name):
+    """ Return copy of unbound fieldset that contains only field
+    ``name`` (dotted) and fields it depends on (``parent`` attribute).
+    Composite field is selected as whole. """
+    first, _, rest = name.partition('.')
+    if first not in fieldset:
+        raise KeyError(name)
+
+    item = fieldset[first]
+    if isinstance(item, Fieldset):
+        if not rest:
+            raise KeyError(name)
+        item = select_field(item, rest)
+    elif rest and not (isinstance(item, CompositeField) and
+                       rest in item.fields):
+        raise KeyError(name)
+
+    selected = [item]
+    while isinstance(item, Field) and getattr(item, 'parent', None) and \
+            item.parent in fieldset and fieldset[item.parent] not in selected:
+        item = fieldset[item.parent]
+        selected.insert(0, item)
+
+    return Fieldset(*selected, name=fieldset.name, flat=fieldset.flat)
+
+
+def create_form(request):
+    """ Create form registered with ``config.provide_form()``
+    directive, form name is taken from route match """
+    try:
+        factory = get_form_factory(request, request.matchdict['form'])
+    except KeyError:
+        raise HTTPNotFound()
+
+    form = factory(request.context, request)
+    form.params = request.params
+    return form
+
+
+def field_view(request):
+    """ Render single form field, field value and values of fields
+    it depends on are taken from request params """
+    form = create_form(request)
+    form.update_widgets()
+
+    try:
+        widget = find_field(
+            form.widgets.fieldset, request.matchdict['field'])
+    except KeyError:
+        raise HTTPNotFound()
+
+    return Response(widget.render())
+
+
+def validate_field_view(request):
+    """ Validate single form field. Only field and fields it depends on
+    are bound, values are taken from request params, form validation
+    is not performed. Return JSON with ``valid`` flag and ``errors``
+    mapping of dotted field name to list of error messages. """
+    form = create_form(request)
+    name = request.matchdict['field']
+
+    try:
+        fieldset = select_field(form.fields, name)
+    except KeyError:
+        raise HTTPNotFound()
+
+    fieldset = fieldset.bind(
+        request, form.form_content(), form.form_params(),
+        '%s%s' % (form.prefix, FormWidgets.prefix), form)
+    field = find_field(fieldset, name)
+
+    data, errors = fieldset.extract(
+        form.max_errors, form.max_concurrency)
+
+    # errors of composite subfields are indexed by dotted name
+    messages = {}
+    for err in [err for err in errors if err.field is field] or \
+            errors.get(name, ()):
+        error_messages(err, name, messages)
+
+    return Response(json_body={'field': name,
+                               'valid': not messages,
+                               'errors': messages})
+
+
+def schema_view(request):
+    """ Return JSON schema of registered form """
+    return Response(json_body=json_schema(create_form(request)))
+
+
+def batch_view(request):
+    """ Validate JSON array of objects with registered form fields,
+    return streamed JSON array of per item results. Number of items
+    is limited with ``pform.batch_max_items`` setting. """
+    form = create_form(request)
+
+    try:
+        items = request.json_body
+    except ValueError:
+        raise HTTPBadRequest('Request body is not valid JSON.')
+
+    if not isinstance(items, list):
+        raise HTTPBadRequest('Request body should be JSON array.')
+
+    settings = request.registry.settings or {}
+    return batch_response(
+        form.fields, items, request, form, max_items=int(settings.get(
+            'pform.batch_max_items', BATCH_MAX_ITEMS)))
+
+
+def _staging(request):
+    staging = get_upload_staging(request)
+    if staging is None:
+        raise HTTPNotFound()
+    return staging
+
+
+def _check_csrf(request, token=None):
+    """ Check csrf token of ``X-CSRF-Token`` header or ``token`` """
+    token = request.headers.get(CSRF_HEADER, token)
+    if token is None or token != request.session.get_csrf_token():
+        raise HTTPForbidden("Form authenticator is not found.")
+
+
+def _int_param(value):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise HTTPBadRequest()
+    if value < 0:
+        raise HTTPBadRequest()
+    return value
+
+
+def upload_create_view(request):
+    """ Start chunked upload, ``filename``, ``mimetype`` and total
+    ``size`` are taken from request params. Return upload metadata.
+    Csrf token is taken from ``X-CSRF-Token`` header or
+    ``csrf_token`` param. """
+    staging = _staging(request)
+    _check_csrf(request, request.params.get(CSRF_PARAM))
+
+    meta = staging.create(
+        request.params.get('filename', ''),
+        request.params.get('mimetype', ''),
+        _int_param(request.params.get('size')))
+
+    response = Response(json_body=meta, status=201)
+    response.headers['Upload-Offset'] = '0'
+    return response
+
+
+def upload_status_view(request):
+    """ Return upload metadata, ``offset`` is size of received data """
+    staging = _staging(request)
+
+    try:
+        meta = staging.get(request.matchdict['id'])
+    except KeyError:
+        raise HTTPNotFound()
+
+    response = Response(json_body=meta)
+    response.headers['Upload-Offset'] = str(meta['offset'])
+    return response
+
+
+def upload_chunk_view(request):
+    """ Append chunk to upload. Chunk offset is taken from
+    ``Upload-Offset`` header or ``offset`` param, offset should match
+    size of already received data otherwise ``409 Conflict``
+    is returned. Csrf token is taken from ``X-CSRF-Token`` header. """
+    staging = _staging(request)
+    _check_csrf(request)
+    offset = _int_param(request.headers.get(
+        'Upload-Offset', request.GET.get('offset')))
+
+    try:
+        meta = staging.append(
+            request.matchdict['id'], offset,
+            request.body_file, request.content_length)
+    except KeyError:
+        raise HTTPNotFound()
+    except ValueError as exc:
+        response = HTTPConflict()
+        response.headers['Upload-Offset'] = str(exc.args[0])
+        return response
+
+    response = Response(json_body=meta)
+    response.headers['Upload-Offset'] = str(meta['offset'])
+    return response
+
+
+def includeme(cfg):
+    settings = cfg.registry.settings or {}
+    prefix = settings.get('pform.route_prefix', ROUTE_PREFIX).rstrip('/')
+
+    cfg.add_route('pform:field', prefix + '/{form}/field/{field}')
+    cfg.add_view(field_view, route_name='pform:field')
+
+    cfg.add_route('pform:validate', prefix + '/{form}/validate/{field}')
+    cfg.add_view(validate_field_view, route_name='pform:validate')
+
+    cfg.add_route('pform:schema', prefix + '/{form}/schema')
+    cfg.add_view(schema_view, route_name='pform:schema')
+
+    cfg.add_route('pform:batch', prefix + '/{form}/batch')
+    cfg.add_view(batch_view, route_name='pform:batch', request_method='POST')
+
+    if settings.get('pform.upload_dir'):
+        if not settings.get('pform.upload_max_size'):
+            raise ConfigurationError(
+                "'pform.upload_max_size' setting is required.")
+
+        cfg.registry['pform:uploads'] = UploadStaging(
+            settings['pform.upload_dir'],
+            int(settings['pform.upload_max_size']),
+            int(settings.get('pform.upload_ttl', UPLOAD_TTL)))
+
+    permission = settings.get('pform.upload_permission')
+
+    cfg.add_route('pform:upload', prefix + '/upload')
+    cfg.add_route('pform:upload-chunk', prefix + '/upload/{id}')
+    cfg.add_view(upload_create_view, route_name='pform:upload',
+                 request_method='POST', permission=permission)
+    cfg.add_view(upload_status_view, route_name='pform:upload-chunk',
+                 request_method='GET', permission=permission)
+    cfg.add_view(upload_chunk_view, route_name='pform:upload-chunk',
+                 request_method=('PUT', 'PATCH', 'POST'),
+                 permission=permission)
@@ -1,6 +1,16 @@
+import unicodedata
 from zope.interface import implementer
-from pyramid.compat import string_types
-from pform.interfaces import ITerm, IVocabulary
+from pyramid.compat import string_types, text_type
+from translationstring import TranslationString
+from pform.cache import LRUCache, request_cache
+from pform.interfaces import ITerm, IVocabulary, get_request_localizer
+
+
+def collation_key(title):
+    """ Sort key for titles, compares titles in lower case
+    without accents """
+    title = unicodedata.normalize('NFKD', text_type(title))
+    return ''.join(c for c in title if not unicodedata.combining(c)).lower()
 
 
 @implementer(ITerm)
@@ -59,6 +69,7 @@ class Vocabulary(object):
         self.by_value = {}
         self.by_token = {}
         self._terms = terms
+        self._titles = {}
         for term in self._terms:
             if term.value in self.by_value:
                 raise ValueError(
@@ -96,6 +107,39 @@ class Vocabulary(object):
     def get_value(self, token):
         return self.get_term_bytoken(token).value
 
+    def get_titles(self, request=None, sort=False, key=None):
+        """ Return list of ``(term, title)`` tuples, ``TranslationString``
+        titles are translated with request localizer. Result is computed
+        once per locale.
+
+        ``sort``: Sort terms by translated title.
+
+        ``key``: Sort key function, by default titles are compared
+          in lower case without accents.
+        """
+        localizer = None
+        if getattr(request, 'registry', None) is not None:
+            localizer = get_request_localizer(request)
+
+        cache_key = (getattr(localizer, 'locale_name', None), sort, key)
+        titles = self._titles.get(cache_key)
+        if titles is None:
+            titles = []
+            for term in self._terms:
+                title = term.title if term.title is not None else term.token
+                if localizer is not None and \
+                        isinstance(title, TranslationString):
+                    title = localizer.translate(title)
+                titles.append((term, title))
+
+            if sort:
+                key = key or collation_key
+                titles.sort(key=lambda item: key(item[1]))
+
+            self._titles[cache_key] = titles
+
+        return titles
+
     def __iter__(self):
         return iter(self._terms)
 
@@ -104,3 +148,49 @@ class Vocabulary(object):
 
     def __getitem__(self, index):
         return self._terms[index]
+
+
+class VocabularyRegistry(LRUCache):
+    """ Request scoped vocabulary registry. Vocabulary factory is called
+    once for each factory and factory arguments, arguments are compared
+    by identity.
+
+    .. code-block:: python
+
+      registry = get_vocabulary_registry(request)
+      voc = registry.resolve(countries_factory, request)
+    """
+
+    def __init__(self):
+        super(VocabularyRegistry, self).__init__(maxsize=None)
+
+    def key(self, factory, *args):
+        """ Return registry key of ``factory(*args)`` vocabulary """
+        return (factory,) + tuple(id(arg) for arg in args)
+
+    def resolve(self, factory, *args):
+        """ Return vocabulary created by ``factory(*args)`` """
+        # keep references to arguments, so ids stay valid
+        return self.get_or_create(
+            self.key(factory, *args), lambda: (args, factory(*args)))[1]
+
+    def lookup(self, factory, *args):
+        """ Return registered vocabulary or ``None`` """
+        entry = self.get(self.key(factory, *args))
+        if entry is not None:
+            return entry[1]
+
+    def register(self, factory, vocabulary, *args):
+        """ Register ``vocabulary`` created by ``factory(*args)`` """
+        self.set(self.key(factory, *args), (args, vocabulary))
+
+    def forget(self, factory):
+        """ Drop vocabularies created by ``factory`` """
+        with self._lock:
+            self.invalidate(*[key for key in self._data if key[0] is factory])
+
+
+def get_vocabulary_registry(request):
+    """ Return request vocabulary registry, return ``None`` if request
+    can not hold registry. """
+    return request_cache(request, 'pform:vocabulary', VocabularyRegistry)